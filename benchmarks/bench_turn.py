@@ -0,0 +1,354 @@
+"""
+End-to-end latency benchmark of one agent turn, run entirely offline.
+
+Each turn goes through the same steps as a chat message in the web UI:
+
+    history   load the history window from the database (+ compaction)
+    codegen   agent run: stub model -> run_system_task -> streamed stub
+              Ollama answer, parsed into blocks as it streams
+    execute   run the approved blocks in the sandbox
+    diff      workspace change token before the turn, changes after it
+    persist   queue the turn's messages and flush them to SQLite
+
+`first_block` is the time from the start of codegen until the first parsed
+block reached the UI callback. The agent and summariser models are Pydantic
+AI FunctionModels, code generation is a StubOllama and, unless --docker is
+given, the sandbox is a FakeContainer whose processes run on the host
+(see benchmarks/fakes.py). Nothing touches the network.
+
+Latency is reported as p50/p95/p99 over the measured turns, after some
+warm-up turns. Memory is measured in a separate, shorter pass under
+tracemalloc (Python allocations of this process; kernel and shell run in
+child processes) plus the process's peak RSS.
+
+    python -m benchmarks.bench_turn
+    python -m benchmarks.bench_turn --turns 100 --token-delay 0.002
+    python -m benchmarks.bench_turn --check          # exit 1 on regression
+    python -m benchmarks.bench_turn --save-baseline  # after an intended change
+"""
+
+import os
+import sys
+
+# Ensure project root is in sys.path so `from src.X` imports work
+# regardless of how this script is invoked
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _project_root not in sys.path:
+    sys.path.insert(0, _project_root)
+
+import argparse
+import asyncio
+import datetime
+import json
+import resource
+import tempfile
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Dict, List, Optional
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+STAGES = ("history", "codegen", "first_block", "execute", "diff", "persist", "total")
+
+
+def _configure_environment(parallel: int):
+    """Provider and sandbox settings for the run, set before anything reads them."""
+    os.environ["PROVIDER"] = "ollama"
+    os.environ["IRONCLAW_PARALLEL_BLOCKS"] = str(parallel)
+    # Open Interpreter pulls in LiteLLM, which otherwise fetches its model price list
+    os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+    # A cache hit would skip codegen on every turn after the first
+    os.environ.pop("IRONCLAW_CODEGEN_CACHE", None)
+
+
+class TurnBench:
+    """Runs benchmark turns against one session.
+
+    Args:
+        root: Temporary directory for the database and workspaces.
+        token_delay: Seconds per streamed codegen token.
+        use_docker: Use the real container pool instead of FakePool.
+    """
+
+    def __init__(self, root: str, token_delay: float = 0.0, use_docker: bool = False):
+        from pydantic import TypeAdapter
+        from pydantic_ai.messages import ModelMessage
+        from src.agent.clients import get_clients
+        from src.agent.core import get_agent, get_summarizer
+        from src.agent.provider import get_provider_config
+        from src.agent.tools import sandbox
+        from src.database.manager import DatabaseManager
+        from benchmarks.fakes import FakePool, StubOllama, agent_model, stub_health, summarizer_model
+
+        self.session_id = "bench"
+        self.adapter = TypeAdapter(list[ModelMessage])
+        self.db = DatabaseManager(db_url=f"sqlite+aiosqlite:///{os.path.join(root, 'bench.db')}")
+        self.ollama = StubOllama(token_delay)
+        get_clients(get_provider_config())._ollama = self.ollama
+        stub_health(get_provider_config())
+
+        if use_docker:
+            self.pool = None
+        else:
+            self.pool = FakePool(os.path.join(root, "workspace"))
+            pool = self.pool
+            sandbox._sandbox_tools.factory = lambda session_id: sandbox.SandboxedTool(session_id, pool=pool)
+        self.workspace_path = sandbox.get_sandbox_tool(self.session_id).workspace_path
+        self._overrides = [
+            get_agent().override(model=agent_model()),
+            get_summarizer().override(model=summarizer_model()),
+        ]
+        self.turns = 0
+
+    async def __aenter__(self) -> "TurnBench":
+        for override in self._overrides:
+            override.__enter__()
+        await self.db.initialize_db()
+        await self.db.get_or_create_session(self.session_id)
+        return self
+
+    async def __aexit__(self, *exc):
+        from src.agent.tools.sandbox import release_sandbox_tool
+        for override in reversed(self._overrides):
+            override.__exit__(*exc)
+        release_sandbox_tool(self.session_id)
+        await self.db.close()
+
+    async def turn(self) -> Dict[str, float]:
+        """Run one turn. Returns the duration of each stage in milliseconds."""
+        from pydantic_ai.messages import ModelRequest, UserPromptPart
+        from src.agent.concurrency import OutputBridge, run_blocking
+        from src.agent.core import AgentDeps, CodeExecutionRequest, get_agent
+        from src.agent.history import compact_history, ensure_system_prompt, history_window_size
+        from src.agent.tools.sandbox import confirm_execution, get_pending_blocks
+        from src.agent.tools.workspace import get_workspace_changes, get_workspace_token
+
+        self.turns += 1
+        timings: Dict[str, float] = {}
+        clock = time.perf_counter
+        started = clock()
+
+        mark = clock()
+        history_dicts = await self.db.get_history_window(self.session_id, history_window_size())
+        history = ensure_system_prompt(self.adapter.validate_python(history_dicts)) if history_dicts else []
+        history = await compact_history(history, self.db, self.session_id)
+        timings["history"] = clock() - mark
+
+        mark = clock()
+        old_token = await run_blocking(get_workspace_token, self.workspace_path)
+        diff_time = clock() - mark
+
+        streamed = []
+        first_block = []
+
+        async def _on_token(token: str):
+            streamed.append(token)
+
+        async def _on_block(block):
+            if not first_block:
+                first_block.append(clock())
+
+        on_output = OutputBridge(_on_token)
+        on_block = OutputBridge(_on_block)
+        deps = AgentDeps(on_output=on_output, on_block=on_block, session_id=self.session_id)
+        mark = clock()
+        try:
+            result = await get_agent().run(
+                f"Write data file {self.turns} and total its squares",
+                message_history=history,
+                deps=deps,
+            )
+        finally:
+            await on_output.aclose()
+            await on_block.aclose()
+        timings["codegen"] = clock() - mark
+        timings["first_block"] = (first_block[0] if first_block else clock()) - mark
+
+        response = result.output
+        if not isinstance(response, CodeExecutionRequest):
+            blocks = get_pending_blocks(self.session_id)
+            if not blocks:
+                raise RuntimeError(f"no code was generated: {response!r}")
+
+        mark = clock()
+        await self.db.queue_messages(self.session_id, self.adapter.dump_python(result.new_messages(), mode="json"))
+        persist_time = clock() - mark
+
+        output = []
+
+        async def _emit(content: str):
+            output.append(content)
+
+        on_output = OutputBridge(_emit)
+        mark = clock()
+        try:
+            execution_result = await run_blocking(confirm_execution, on_output=on_output, session_id=self.session_id)
+        finally:
+            await on_output.aclose()
+        timings["execute"] = clock() - mark
+        # 200 rows whose squares sum to 200*201*401/6
+        if "200 2686700" not in execution_result:
+            raise RuntimeError(f"unexpected execution result:\n{execution_result}")
+
+        mark = clock()
+        changes = await run_blocking(get_workspace_changes, self.workspace_path, old_token)
+        timings["diff"] = diff_time + clock() - mark
+        if f"data_{self.ollama.calls}.csv" not in changes.added:
+            raise RuntimeError(f"workspace diff missed the new file: {changes}")
+
+        mark = clock()
+        exec_note = ModelRequest(parts=[
+            UserPromptPart(
+                content=f"[SYSTEM] Execution completed. Output: {execution_result[:1000]}",
+                timestamp=datetime.datetime.now(datetime.timezone.utc),
+            )
+        ])
+        await self.db.queue_messages(self.session_id, self.adapter.dump_python([exec_note], mode="json"))
+        await self.db.flush()
+        timings["persist"] = persist_time + clock() - mark
+
+        timings["total"] = clock() - started
+        return {stage: seconds * 1000 for stage, seconds in timings.items()}
+
+
+async def run_benchmark(
+    turns: int = 30,
+    warmup: int = 3,
+    memory_turns: int = 5,
+    token_delay: float = 0.0,
+    parallel: int = 1,
+    use_docker: bool = False,
+) -> dict:
+    """
+    Run the benchmark and return its result: per-stage latency summaries
+    (ms), memory figures (KiB), error count and run parameters.
+    """
+    from benchmarks.stats import environment, summarize
+
+    _configure_environment(parallel)
+    samples: Dict[str, List[float]] = defaultdict(list)
+    errors = 0
+    with tempfile.TemporaryDirectory(prefix="ironclaw-bench-") as root:
+        async with TurnBench(root, token_delay=token_delay, use_docker=use_docker) as bench:
+            for _ in range(warmup):
+                await bench.turn()
+            for _ in range(turns):
+                try:
+                    timings = await bench.turn()
+                except Exception as e:
+                    errors += 1
+                    print(f"[!] Turn {bench.turns} failed: {e}")
+                    continue
+                for stage, ms in timings.items():
+                    samples[stage].append(ms)
+
+            memory = {}
+            if memory_turns:
+                tracemalloc.start()
+                before, _ = tracemalloc.get_traced_memory()
+                for _ in range(memory_turns):
+                    await bench.turn()
+                after, peak = tracemalloc.get_traced_memory()
+                tracemalloc.stop()
+                memory = {
+                    "traced_peak_kib": peak / 1024,
+                    "growth_per_turn_kib": (after - before) / 1024 / memory_turns,
+                }
+            # ru_maxrss is KiB on Linux, bytes on macOS
+            rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+            memory["max_rss_kib"] = rss / 1024 if sys.platform == "darwin" else float(rss)
+
+    return {
+        "params": {
+            "turns": turns,
+            "warmup": warmup,
+            "memory_turns": memory_turns,
+            "token_delay": token_delay,
+            "parallel": parallel,
+            "backend": "docker" if use_docker else "fake",
+        },
+        "environment": environment(),
+        "stages": {stage: summarize(samples[stage]) for stage in STAGES if samples[stage]},
+        "memory": memory,
+        "errors": errors,
+    }
+
+
+def format_result(result: dict) -> str:
+    params = result["params"]
+    lines = [
+        f"IronClaw turn benchmark: {params['turns']} turns after {params['warmup']} warm-up, "
+        f"backend={params['backend']}, parallel={params['parallel']}, "
+        f"token_delay={params['token_delay']}s",
+        "",
+        f"{'stage (ms)':<14} {'p50':>9} {'p95':>9} {'p99':>9} {'mean':>9} {'max':>9}",
+    ]
+    for stage, stats in result["stages"].items():
+        lines.append(
+            f"{stage:<14} {stats['p50']:>9.2f} {stats['p95']:>9.2f} {stats['p99']:>9.2f} "
+            f"{stats['mean']:>9.2f} {stats['max']:>9.2f}"
+        )
+    if result["memory"]:
+        lines.append("")
+        for key, value in result["memory"].items():
+            lines.append(f"{key:<24} {value:>12.1f} KiB")
+    if result["errors"]:
+        lines.append(f"\n[!] {result['errors']} turn(s) failed")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    from benchmarks.stats import compare, format_comparison, load_baseline, save_baseline
+
+    parser = argparse.ArgumentParser(description="Offline end-to-end turn benchmark")
+    parser.add_argument("--turns", type=int, default=30, help="Measured turns")
+    parser.add_argument("--warmup", type=int, default=3, help="Unmeasured turns first")
+    parser.add_argument("--memory-turns", type=int, default=5, help="Turns in the tracemalloc pass (0 to skip)")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds per streamed codegen token")
+    parser.add_argument("--parallel", type=int, default=1, help="IRONCLAW_PARALLEL_BLOCKS for the run")
+    parser.add_argument("--docker", action="store_true", help="Use real Docker sandboxes instead of the fake")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="Baseline JSON file")
+    parser.add_argument("--save-baseline", action="store_true", help="Store this run as the baseline")
+    parser.add_argument("--check", action="store_true", help="Exit 1 if slower than the baseline")
+    parser.add_argument("--tolerance", type=float, default=1.25, help="Allowed ratio to the baseline")
+    parser.add_argument("--json", help="Also write the result to this file")
+    args = parser.parse_args(argv)
+
+    if not args.docker:
+        print("[*] Using the fake sandbox: generated code runs on this host, in a temporary directory")
+    result = asyncio.run(run_benchmark(
+        turns=args.turns,
+        warmup=args.warmup,
+        memory_turns=args.memory_turns,
+        token_delay=args.token_delay,
+        parallel=args.parallel,
+        use_docker=args.docker,
+    ))
+    print(format_result(result))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+
+    if args.save_baseline:
+        save_baseline(args.baseline, result)
+        print(f"\n[*] Baseline saved to {args.baseline}")
+        return 1 if result["errors"] else 0
+
+    baseline = load_baseline(args.baseline)
+    if baseline is None:
+        print(f"\n[*] No baseline at {args.baseline}; run with --save-baseline to create one")
+        return 1 if result["errors"] else 0
+    if baseline.get("params") != result["params"]:
+        print(f"\n[!] Baseline was recorded with different parameters: {baseline.get('params')}")
+    comparisons = compare(result, baseline, tolerance=args.tolerance)
+    print("\n" + format_comparison(comparisons))
+    regressed = [item.metric for item in comparisons if item.regressed]
+    if regressed:
+        print(f"\n[!] Slower than the baseline: {', '.join(regressed)}")
+    if args.check and (regressed or result["errors"]):
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,169 @@
+"""
+Headless stand-in for the parts of Chainlit that src/web_ui.py uses.
+
+install() registers it as the `chainlit` module, so web_ui can be imported
+and its handlers (on_chat_start, on_message, handle_code_approval) driven
+directly by many simulated users in one process. Each simulated user runs
+in its own asyncio task with its own user session (a context variable, as
+in Chainlit); everything the UI would show is recorded on that user's
+UserState instead of being sent to a browser.
+"""
+
+import contextvars
+import sys
+import time
+import types
+import uuid
+from typing import Any, Dict, List, Optional, Tuple
+
+
+class UserState:
+    """What one simulated user has seen.
+
+    Args:
+        identifier: Username, as returned by the auth callback.
+        approve: Answer to every approval prompt.
+    """
+
+    def __init__(self, identifier: str, approve: bool = True):
+        self.identifier = identifier
+        self.approve = approve
+        self.session: Dict[str, Any] = {"user": User(identifier=identifier)}
+        # (monotonic time, kind, content) of every UI update
+        self.events: List[Tuple[float, str, str]] = []
+
+    def record(self, kind: str, content: str = ""):
+        self.events.append((time.monotonic(), kind, content))
+
+    def first_event_after(self, since: float, kinds: Optional[Tuple[str, ...]] = None) -> Optional[float]:
+        for at, kind, _ in self.events:
+            if at >= since and (kinds is None or kind in kinds):
+                return at
+        return None
+
+    def messages_after(self, since: float) -> List[str]:
+        return [content for at, kind, content in self.events if at >= since and kind == "message"]
+
+
+_current_user: contextvars.ContextVar[UserState] = contextvars.ContextVar("chainlit_stub_user")
+
+
+def bind_user(state: UserState) -> contextvars.Token:
+    """Make state the current user for this task (and the threads it offloads to)."""
+    return _current_user.set(state)
+
+
+def _record(kind: str, content: str = ""):
+    state = _current_user.get(None)
+    if state is not None:
+        state.record(kind, content)
+
+
+class _UserSession:
+    def get(self, key: str, default: Any = None) -> Any:
+        return _current_user.get().session.get(key, default)
+
+    def set(self, key: str, value: Any):
+        _current_user.get().session[key] = value
+
+
+user_session = _UserSession()
+
+
+class User:
+    def __init__(self, identifier: str, metadata: Optional[dict] = None):
+        self.identifier = identifier
+        self.metadata = metadata or {}
+
+
+class Starter:
+    def __init__(self, label: str, message: str, icon: Optional[str] = None):
+        self.label = label
+        self.message = message
+        self.icon = icon
+
+
+class Action:
+    def __init__(self, name: str, label: str = "", payload: Optional[dict] = None):
+        self.name = name
+        self.label = label
+        self.payload = payload or {}
+
+
+class File:
+    def __init__(self, name: str, path: Optional[str] = None, content: Optional[bytes] = None, display: str = "inline"):
+        self.name = name
+        self.path = path
+        self.content = content
+        self.display = display
+
+
+class Message:
+    def __init__(self, content: str = "", elements: Optional[list] = None, parent_id: Optional[str] = None, **kwargs):
+        self.id = uuid.uuid4().hex
+        self.content = content
+        self.elements = elements or []
+        self.parent_id = parent_id
+
+    async def send(self) -> "Message":
+        _record("message", self.content)
+        return self
+
+    async def update(self):
+        _record("update", self.content)
+
+    async def stream_token(self, token: str):
+        self.content += token
+        _record("token", token)
+
+
+class Step:
+    def __init__(self, name: str = "", **kwargs):
+        self.id = uuid.uuid4().hex
+        self.name = name
+        self.output = ""
+
+    async def __aenter__(self) -> "Step":
+        _record("step", self.name)
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def update(self):
+        _record("update", self.name)
+
+    async def stream_token(self, token: str):
+        self.output += token
+        _record("token", token)
+
+
+class AskActionMessage:
+    def __init__(self, content: str = "", actions: Optional[List[Action]] = None, **kwargs):
+        self.content = content
+        self.actions = actions or []
+
+    async def send(self) -> Optional[dict]:
+        _record("ask", self.content)
+        state = _current_user.get()
+        # First action approves / falls back, the last one rejects / aborts
+        action = self.actions[0] if state.approve else self.actions[-1]
+        return {"name": action.name, "payload": action.payload}
+
+
+def _decorator(fn):
+    return fn
+
+
+password_auth_callback = _decorator
+set_starters = _decorator
+on_chat_start = _decorator
+on_chat_end = _decorator
+on_message = _decorator
+
+
+def install() -> types.ModuleType:
+    """Register this module as `chainlit` (before src.web_ui is imported)."""
+    module = sys.modules[__name__]
+    sys.modules["chainlit"] = module
+    return module
@@ -0,0 +1,313 @@
+"""
+Offline stand-ins for the LLMs and Docker, used by the benchmarks.
+
+- agent_model() / summarizer_model(): deterministic Pydantic AI FunctionModels
+  for the IronClaw agent and the history summariser. The agent calls
+  run_system_task once per turn, like a real model asked to do a task.
+- StubOllama: replaces the ollama client's generate(), streaming a canned
+  multi-block answer token by token; stub_health() makes the endpoint's
+  health monitor report it as up.
+- FakeContainer / FakePool: an in-process "container" whose exec sessions
+  are host processes speaking Docker's multiplexed stream protocol over a
+  socketpair, so PythonKernel, ShellSession and the rest of the sandbox run
+  unmodified. The code runs on the host, in the benchmark's temporary
+  workspace, with no isolation.
+"""
+
+import json
+import os
+import socket
+import struct
+import subprocess
+import sys
+import threading
+import time
+import uuid
+from types import SimpleNamespace
+from typing import TYPE_CHECKING, AsyncIterator, Dict, Iterator, List, Optional, Union
+
+from docker.utils.socket import STDERR, STDOUT
+from pydantic_ai.messages import ModelMessage, ModelResponse, TextPart, ToolCallPart, ToolReturnPart
+from pydantic_ai.models.function import AgentInfo, DeltaToolCall, DeltaToolCalls, FunctionModel
+
+from src.sandbox.kernel import discard_kernel
+from src.sandbox.shell import discard_shells
+
+if TYPE_CHECKING:
+    from src.agent.health import ProviderHealthMonitor
+
+# Written and read back by the two blocks of every canned answer
+_CODEGEN_ANSWER = """\
+```bash
+for i in $(seq 1 200); do echo "$i,$((i * i))"; done > data_{n}.csv
+wc -l data_{n}.csv
+```
+```python sequential
+import csv
+with open("data_{n}.csv") as f:
+    rows = [tuple(map(int, row)) for row in csv.reader(f)]
+print(len(rows), sum(square for _, square in rows))
+```
+"""
+
+
+def codegen_answer(n: int) -> str:
+    """The canned code-generation answer for turn n."""
+    return _CODEGEN_ANSWER.replace("{n}", str(n))
+
+
+def tokenize(text: str, size: int = 4) -> List[str]:
+    """Split text into small chunks, roughly the size of LLM tokens."""
+    return [text[i:i + size] for i in range(0, len(text), size)]
+
+
+def _last_request_text(messages: List[ModelMessage]) -> str:
+    for message in reversed(messages):
+        for part in getattr(message, "parts", []):
+            if part.part_kind == "user-prompt" and isinstance(part.content, str):
+                return part.content
+    return ""
+
+
+def _agent_reply(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+    # After the tool has run, answer in text; otherwise delegate the task to it
+    if any(isinstance(part, ToolReturnPart) for part in messages[-1].parts):
+        return ModelResponse(parts=[TextPart("Code is ready for approval.")])
+    task = _last_request_text(messages)
+    return ModelResponse(parts=[ToolCallPart("run_system_task", {"task": task})])
+
+
+async def _agent_stream(messages: List[ModelMessage], info: AgentInfo) -> AsyncIterator[Union[str, DeltaToolCalls]]:
+    # The same replies as _agent_reply, for run_stream()
+    for part in _agent_reply(messages, info).parts:
+        if isinstance(part, ToolCallPart):
+            yield {0: DeltaToolCall(name=part.tool_name, json_args=json.dumps(part.args))}
+        else:
+            for token in tokenize(part.content):
+                yield token
+
+
+def _summarizer_reply(messages: List[ModelMessage], info: AgentInfo) -> ModelResponse:
+    return ModelResponse(parts=[TextPart("Earlier turns generated and ran data scripts.")])
+
+
+def agent_model() -> FunctionModel:
+    return FunctionModel(_agent_reply, stream_function=_agent_stream, model_name="stub-agent")
+
+
+def summarizer_model() -> FunctionModel:
+    return FunctionModel(_summarizer_reply, model_name="stub-summarizer")
+
+
+class StubOllama:
+    """ollama.Client stand-in for code generation.
+
+    Args:
+        token_delay: Seconds to sleep before each streamed token, to model
+            generation speed (0 streams as fast as possible).
+    """
+
+    def __init__(self, token_delay: float = 0.0):
+        self.token_delay = token_delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def generate(self, model: str, prompt: str, stream: bool = False, **kwargs):
+        with self._lock:
+            self.calls += 1
+            n = self.calls
+        answer = codegen_answer(n)
+        if not stream:
+            return {"model": model, "response": answer, "done": True}
+        return self._stream(model, answer)
+
+    def _stream(self, model: str, answer: str) -> Iterator[dict]:
+        for token in tokenize(answer):
+            if self.token_delay:
+                time.sleep(self.token_delay)
+            yield {"model": model, "response": token, "done": False}
+        yield {"model": model, "response": "", "done": True}
+
+
+def stub_health(config) -> "ProviderHealthMonitor":
+    """Registers a health monitor for config's Ollama endpoint that always finds it up."""
+    from src.agent import health
+
+    models = [config.ollama_agent_model, config.ollama_codegen_model]
+    monitor = health.ProviderHealthMonitor(config.ollama_base_url, probe=lambda: (True, models, None))
+    health._monitors[config.ollama_base_url] = monitor
+    return monitor
+
+
+def _host_command(cmd: List[str]) -> List[str]:
+    if cmd and cmd[0] == "python3":
+        return [sys.executable] + list(cmd[1:])
+    return list(cmd)
+
+
+class _FakeExec:
+    """One exec session: a host process whose output is framed onto a socket."""
+
+    def __init__(self, cmd: List[str], cwd: str):
+        self.proc = subprocess.Popen(
+            _host_command(cmd), cwd=cwd,
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+        )
+        self.sock, self._peer = socket.socketpair()
+        self._send_lock = threading.Lock()
+        self._open_pipes = 2
+        for stream, pipe in ((STDOUT, self.proc.stdout), (STDERR, self.proc.stderr)):
+            threading.Thread(target=self._pump_output, args=(stream, pipe), daemon=True).start()
+        threading.Thread(target=self._pump_input, daemon=True).start()
+
+    def _pump_output(self, stream: int, pipe):
+        try:
+            while True:
+                data = os.read(pipe.fileno(), 65536)
+                if not data:
+                    break
+                # Header: stream type, three zero bytes, big-endian payload size
+                with self._send_lock:
+                    self._peer.sendall(struct.pack(">BxxxL", stream, len(data)) + data)
+        except OSError:
+            pass
+        finally:
+            with self._send_lock:
+                self._open_pipes -= 1
+                if self._open_pipes == 0:
+                    # Both streams drained: the reader sees EOF, as with docker
+                    try:
+                        self._peer.shutdown(socket.SHUT_WR)
+                    except OSError:
+                        pass
+
+    def _pump_input(self):
+        try:
+            while True:
+                data = self._peer.recv(65536)
+                if not data:
+                    break
+                self.proc.stdin.write(data)
+                self.proc.stdin.flush()
+        except (OSError, ValueError):
+            pass
+        finally:
+            try:
+                self.proc.stdin.close()
+            except OSError:
+                pass
+
+    def exit_code(self) -> Optional[int]:
+        return self.proc.poll()
+
+    def kill(self):
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+        self._peer.close()
+
+
+class _FakeExecAPI:
+    """The slice of docker's low-level APIClient that AttachedExec uses."""
+
+    def __init__(self, container: "FakeContainer"):
+        self.container = container
+        self._pending: Dict[str, List[str]] = {}
+        self._execs: Dict[str, _FakeExec] = {}
+        self._lock = threading.Lock()
+
+    def exec_create(self, container_id, cmd, **kwargs) -> dict:
+        exec_id = uuid.uuid4().hex
+        with self._lock:
+            self._pending[exec_id] = list(cmd)
+        return {"Id": exec_id}
+
+    def exec_start(self, exec_id, socket: bool = False, **kwargs):
+        with self._lock:
+            cmd = self._pending.pop(exec_id)
+        session = _FakeExec(cmd, cwd=self.container.workspace_path)
+        with self._lock:
+            self._execs[exec_id] = session
+        return session.sock
+
+    def exec_inspect(self, exec_id) -> dict:
+        session = self._execs.get(exec_id)
+        code = session.exit_code() if session else None
+        return {"ExitCode": code, "Running": code is None}
+
+    def close(self):
+        with self._lock:
+            sessions, self._execs = list(self._execs.values()), {}
+        for session in sessions:
+            session.kill()
+
+
+class FakeContainer:
+    """docker-py Container stand-in that runs exec sessions on the host.
+
+    Args:
+        workspace_path: Host directory used as the working directory of
+            every process, in place of the /workspace mount.
+    """
+
+    def __init__(self, workspace_path: str):
+        self.workspace_path = workspace_path
+        self.id = f"fake-{uuid.uuid4().hex[:12]}"
+        self.name = f"ironclaw-bench-{self.id[5:]}"
+        self.status = "running"
+        self.labels: Dict[str, str] = {}
+        self.client = SimpleNamespace(api=_FakeExecAPI(self))
+
+    def reload(self):
+        pass
+
+    def exec_run(self, cmd, **kwargs):
+        # Used to signal kernel and shell processes; pids are host pids here
+        proc = subprocess.run(_host_command(cmd), cwd=self.workspace_path, capture_output=True)
+        return SimpleNamespace(exit_code=proc.returncode, output=proc.stdout + proc.stderr)
+
+    def stop(self, timeout: int = 0):
+        self.client.api.close()
+        self.status = "exited"
+
+    def remove(self, force: bool = False):
+        self.stop()
+
+
+class FakePool:
+    """ContainerPool stand-in: every session leases its own FakeContainer.
+
+    Args:
+        workspace_root: Directory holding the per-session workspaces.
+    """
+
+    def __init__(self, workspace_root: str):
+        self.manager = SimpleNamespace(workspace_path=workspace_root, ensure_image=lambda: None)
+        self.size = 0
+        self.leases = 0  # containers handed out in total
+        self._leased: Dict[str, FakeContainer] = {}
+        self._lock = threading.Lock()
+
+    def lease(self, session_id: str, workspace_path: Optional[str] = None) -> FakeContainer:
+        with self._lock:
+            container = self._leased.get(session_id)
+            if container is None:
+                container = FakeContainer(workspace_path or self.manager.workspace_path)
+                self.leases += 1
+                self._leased[session_id] = container
+            return container
+
+    def release(self, session_id: str, recycle: bool = True):
+        with self._lock:
+            container = self._leased.pop(session_id, None)
+        if container is not None:
+            discard_kernel(container)
+            discard_shells(container)
+            container.stop()
+
+    def wait_until_warm(self, timeout: Optional[float] = None, count: Optional[int] = None) -> bool:
+        return True
+
+    def shutdown(self):
+        for session_id in list(self._leased):
+            self.release(session_id)
@@ -0,0 +1,332 @@
+"""
+Concurrent-user load generator for the web UI.
+
+Imports src/web_ui.py against a headless Chainlit stand-in
+(benchmarks/chainlit_stub.py) and drives on_chat_start, then on_message
+with approval (handle_code_approval), for N simulated users at once. The
+agent, Ollama and the sandbox are the offline stubs from benchmarks/fakes.py,
+so the numbers show the web UI's own overhead and how it scales, not model
+or Docker speed.
+
+For each concurrency level it reports:
+
+    throughput    completed turns per second
+    turn          on_message latency, approval and execution included
+    first token   time until the user sees the first streamed codegen token
+    loop lag      how late a 10 ms timer on the event loop fires; anything
+                  that blocks the loop shows up here for every user
+    pool wait     time blocking work waits for a worker thread
+                  (IRONCLAW_WORKER_THREADS)
+    errors        turns that failed, showed an error, or whose execution
+                  result or workspace was wrong
+
+With more users than IRONCLAW_MAX_SANDBOXES (default 8), idle sessions are
+evicted. Sessions with code waiting for approval are kept, so the live
+sandbox count can exceed the cap for a while (the "sandboxes" column).
+
+--regress reintroduces a known problem, to check that it would be caught:
+`blocking-loop` runs blocking work on the event loop instead of the worker
+pool, `shared-sandbox` gives every session the same SandboxedTool.
+
+    python -m benchmarks.load_webui
+    python -m benchmarks.load_webui --users 1,8,32 --messages 5 --token-delay 0.002
+    python -m benchmarks.load_webui --regress blocking-loop
+"""
+
+import os
+import sys
+
+# Ensure project root is in sys.path so `from src.X` imports work
+# regardless of how this script is invoked
+_project_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+if _project_root not in sys.path:
+    sys.path.insert(0, _project_root)
+
+import argparse
+import asyncio
+import glob
+import json
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+LAG_INTERVAL = 0.01  # seconds between event-loop lag probes
+REGRESSIONS = ("blocking-loop", "shared-sandbox")
+
+
+class LoopLagMonitor:
+    """Measures how late a periodic timer fires on the running event loop."""
+
+    def __init__(self, interval: float = LAG_INTERVAL):
+        self.interval = interval
+        self.samples: List[float] = []
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            scheduled = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.monotonic() - scheduled - self.interval) * 1000)
+
+    async def stop(self):
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+
+
+class TimedExecutor(ThreadPoolExecutor):
+    """Worker pool that records how long each job queued before it started."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.waits: List[float] = []
+
+    def submit(self, fn, /, *args, **kwargs):
+        queued = time.monotonic()
+
+        def timed(*args, **kwargs):
+            self.waits.append((time.monotonic() - queued) * 1000)
+            return fn(*args, **kwargs)
+
+        return super().submit(timed, *args, **kwargs)
+
+
+class LoadTest:
+    """The web UI wired to offline stubs, inside a temporary directory.
+
+    Args:
+        root: Working directory for the database and workspaces.
+        token_delay: Seconds per streamed codegen token.
+        workers: Size of the worker pool (default IRONCLAW_WORKER_THREADS).
+        regress: Optional name from REGRESSIONS to reintroduce.
+    """
+
+    def __init__(self, root: str, token_delay: float = 0.0, workers: Optional[int] = None, regress: Optional[str] = None):
+        os.chdir(root)  # web_ui keeps ./workspace and ./ironclaw.db relative to cwd
+        os.environ["PROVIDER"] = "ollama"
+        os.environ.setdefault("LITELLM_LOCAL_MODEL_COST_MAP", "True")
+        os.environ.pop("IRONCLAW_CODEGEN_CACHE", None)
+
+        from benchmarks import chainlit_stub
+        from benchmarks.fakes import FakePool, StubOllama, agent_model, stub_health, summarizer_model
+        from src.agent import concurrency
+        from src.agent.clients import get_clients
+        from src.agent.provider import get_provider_config
+        from src.agent.tools import sandbox
+
+        chainlit_stub.install()
+        self.cl = chainlit_stub
+        self.pool = FakePool(os.path.abspath("workspace"))
+        # Before web_ui is imported: it starts the sandbox warm-up at import
+        sandbox.get_pool = lambda: self.pool
+        if regress == "shared-sandbox":
+            shared = []
+
+            def factory(session_id):
+                if not shared:
+                    shared.append(sandbox.SandboxedTool("shared", pool=self.pool))
+                return shared[0]
+            sandbox._sandbox_tools.factory = factory
+        else:
+            sandbox._sandbox_tools.factory = lambda session_id: sandbox.SandboxedTool(session_id, pool=self.pool)
+
+        workers = workers or int(os.environ.get("IRONCLAW_WORKER_THREADS", concurrency._DEFAULT_WORKERS))
+        self.executor = TimedExecutor(max_workers=max(1, workers), thread_name_prefix="ironclaw-worker")
+        concurrency._executor = self.executor
+
+        config = get_provider_config()
+        self.ollama = StubOllama(token_delay)
+        get_clients(config)._ollama = self.ollama
+        stub_health(config)
+
+        from src import web_ui
+        from src.agent import core
+        self.web_ui = web_ui
+
+        if regress == "blocking-loop":
+            async def run_inline(fn, *args, **kwargs):
+                return fn(*args, **kwargs)
+            web_ui.run_blocking = run_inline
+            core.run_blocking = run_inline
+
+        self._overrides = [
+            core.get_agent().override(model=agent_model()),
+            core.get_summarizer().override(model=summarizer_model()),
+        ]
+        for override in self._overrides:
+            override.__enter__()
+
+    async def close(self):
+        for override in reversed(self._overrides):
+            override.__exit__(None, None, None)
+        await self.web_ui.db.close()
+        self.pool.shutdown()
+        self.executor.shutdown(wait=False)
+
+    def _workspace(self, username: str) -> str:
+        from src.agent.tools.workspace import session_workspace_path
+        return session_workspace_path(f"web-{username}")
+
+    async def user(self, username: str, messages: int, think_time: float, results: Dict[str, list]):
+        """One simulated user: start a chat, then send messages and approve the code."""
+        from src.agent.tools.sandbox import release_sandbox_tool
+
+        state = self.cl.UserState(username)
+        self.cl.bind_user(state)
+        started = time.monotonic()
+        try:
+            await self.web_ui.on_chat_start()
+        except Exception as e:
+            results["errors"].append(f"{username} chat start: {e}")
+            return
+        results["chat_start"].append((time.monotonic() - started) * 1000)
+
+        completed = 0
+        for n in range(messages):
+            if think_time and n:
+                await asyncio.sleep(think_time)
+            started = time.monotonic()
+            try:
+                await self.web_ui.on_message(self.cl.Message(content=f"Write data file {n} and total its squares"))
+            except Exception as e:
+                results["errors"].append(f"{username} turn {n}: {e}")
+                continue
+            finished = time.monotonic()
+
+            shown = state.messages_after(started)
+            problem = next((m.strip() for m in shown if m.lstrip().startswith("Error:")), None)
+            if problem is None and not any("**Execution Result:**" in m and "200 2686700" in m for m in shown):
+                problem = "no execution result"
+            if problem:
+                results["errors"].append(f"{username} turn {n}: {problem[:200]}")
+                continue
+            completed += 1
+            results["turn"].append((finished - started) * 1000)
+            first = state.first_event_after(started, kinds=("token",))
+            if first is not None:
+                results["first_token"].append((first - started) * 1000)
+
+        # Each session must only see its own files
+        found = len(glob.glob(os.path.join(self._workspace(username), "data_*.csv")))
+        if found != completed:
+            results["errors"].append(f"{username}: {found} data files in workspace after {completed} turns")
+        await self.web_ui.on_chat_end()
+        release_sandbox_tool(f"web-{username}")
+
+    async def run_level(self, users: int, messages: int, think_time: float) -> dict:
+        """Run `users` simulated users at once and summarise what they saw."""
+        from benchmarks.stats import summarize
+
+        results: Dict[str, list] = {"chat_start": [], "turn": [], "first_token": [], "errors": []}
+        monitor = LoopLagMonitor()
+        self.executor.waits.clear()
+        leases = self.pool.leases
+        prefix = f"u{users}-{time.monotonic_ns() % 100000}"
+
+        monitor.start()
+        started = time.monotonic()
+        await asyncio.gather(*(
+            asyncio.create_task(self.user(f"{prefix}-{i}", messages, think_time, results))
+            for i in range(users)
+        ))
+        wall = time.monotonic() - started
+        await monitor.stop()
+
+        attempted = users * messages
+        return {
+            "users": users,
+            "turns": len(results["turn"]),
+            "attempted": attempted,
+            "wall_s": wall,
+            "throughput": len(results["turn"]) / wall if wall else 0.0,
+            "error_rate": len(results["errors"]) / attempted if attempted else 0.0,
+            "errors": results["errors"],
+            "sandboxes": self.pool.leases - leases,
+            "chat_start_ms": summarize(results["chat_start"]),
+            "turn_ms": summarize(results["turn"]),
+            "first_token_ms": summarize(results["first_token"]),
+            "loop_lag_ms": summarize(monitor.samples),
+            "pool_wait_ms": summarize(list(self.executor.waits)),
+        }
+
+
+def format_levels(levels: List[dict]) -> str:
+    header = (
+        f"{'users':>5} {'turns':>6} {'err%':>6} {'turns/s':>8} "
+        f"{'turn p50':>9} {'p95':>8} {'p99':>8} {'1st tok p95':>11} "
+        f"{'lag p99':>8} {'lag max':>8} {'wait p95':>9} {'sandboxes':>9}"
+    )
+    lines = ["(latencies in ms)", header]
+    for level in levels:
+        turn = level["turn_ms"]
+        lines.append(
+            f"{level['users']:>5} {level['turns']:>6} {level['error_rate'] * 100:>5.1f}% {level['throughput']:>8.2f} "
+            f"{turn['p50']:>9.1f} {turn['p95']:>8.1f} {turn['p99']:>8.1f} {level['first_token_ms']['p95']:>11.1f} "
+            f"{level['loop_lag_ms']['p99']:>8.1f} {level['loop_lag_ms']['max']:>8.1f} "
+            f"{level['pool_wait_ms']['p95']:>9.1f} {level['sandboxes']:>9}"
+        )
+    for level in levels:
+        for error in level["errors"][:5]:
+            lines.append(f"[!] {level['users']} users: {error}")
+        if len(level["errors"]) > 5:
+            lines.append(f"[!] {level['users']} users: ... {len(level['errors']) - 5} more")
+    return "\n".join(lines)
+
+
+async def run_load(
+    users: List[int],
+    messages: int = 3,
+    think_time: float = 0.0,
+    token_delay: float = 0.0,
+    workers: Optional[int] = None,
+    regress: Optional[str] = None,
+) -> List[dict]:
+    """Run each concurrency level in turn against one web UI instance."""
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory(prefix="ironclaw-load-") as root:
+        load = LoadTest(root, token_delay=token_delay, workers=workers, regress=regress)
+        try:
+            # Unmeasured: pays for the first Open Interpreter import and DB setup
+            await load.run_level(1, 1, 0.0)
+            return [await load.run_level(count, messages, think_time) for count in users]
+        finally:
+            await load.close()
+            os.chdir(cwd)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Simulate concurrent web UI users against offline stubs")
+    parser.add_argument("--users", default="1,4,8", help="Comma-separated concurrency levels")
+    parser.add_argument("--messages", type=int, default=3, help="Messages per user")
+    parser.add_argument("--think-time", type=float, default=0.0, help="Seconds between a user's messages")
+    parser.add_argument("--token-delay", type=float, default=0.0, help="Seconds per streamed codegen token")
+    parser.add_argument("--workers", type=int, help="Worker threads (default IRONCLAW_WORKER_THREADS)")
+    parser.add_argument("--regress", choices=REGRESSIONS, help="Reintroduce a known regression")
+    parser.add_argument("--max-error-rate", type=float, default=0.0, help="Exit 1 above this error rate")
+    parser.add_argument("--json", help="Also write the results to this file")
+    args = parser.parse_args(argv)
+
+    print("[*] Using the fake sandbox: generated code runs on this host, in a temporary directory")
+    levels = asyncio.run(run_load(
+        [int(count) for count in args.users.split(",")],
+        messages=args.messages,
+        think_time=args.think_time,
+        token_delay=args.token_delay,
+        workers=args.workers,
+        regress=args.regress,
+    ))
+    print(format_levels(levels))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(levels, f, indent=2)
+    return 1 if any(level["error_rate"] > args.max_error_rate for level in levels) else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,126 @@
+"""
+Latency statistics and baseline comparison shared by the benchmarks.
+
+A baseline is a JSON file holding, per stage, the percentiles of an earlier
+run (milliseconds) plus memory figures (KiB). compare() reports each number
+against it and flags the ones that grew by more than a ratio *and* an
+absolute slack, so sub-millisecond jitter on fast stages is not reported
+as a regression.
+"""
+
+import json
+import math
+import os
+import platform
+import sys
+import time
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Sequence
+
+PERCENTILES = (50, 95, 99)
+
+
+def percentile(samples: Sequence[float], pct: float) -> float:
+    """Percentile by linear interpolation between closest ranks."""
+    if not samples:
+        return float("nan")
+    ordered = sorted(samples)
+    rank = (len(ordered) - 1) * pct / 100
+    low, high = math.floor(rank), math.ceil(rank)
+    return ordered[low] + (ordered[high] - ordered[low]) * (rank - low)
+
+
+def summarize(samples: Sequence[float]) -> Dict[str, float]:
+    """p50/p95/p99, mean, min, max and count of samples (in their own unit)."""
+    summary = {f"p{pct}": percentile(samples, pct) for pct in PERCENTILES}
+    summary.update(
+        mean=sum(samples) / len(samples) if samples else float("nan"),
+        min=min(samples, default=float("nan")),
+        max=max(samples, default=float("nan")),
+        n=len(samples),
+    )
+    return summary
+
+
+def environment() -> Dict[str, str]:
+    """Where a result was measured, stored next to it in the baseline."""
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "cpus": str(os.cpu_count()),
+        "recorded": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "argv": " ".join(sys.argv[1:]),
+    }
+
+
+def load_baseline(path: str) -> Optional[dict]:
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def save_baseline(path: str, result: dict):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(result, f, indent=2, sort_keys=True)
+        f.write("\n")
+
+
+@dataclass
+class Comparison:
+    metric: str
+    baseline: float
+    current: float
+    regressed: bool
+
+    @property
+    def ratio(self) -> float:
+        return self.current / self.baseline if self.baseline else float("inf")
+
+
+def compare(
+    current: dict,
+    baseline: dict,
+    tolerance: float = 1.25,
+    slack_ms: float = 5.0,
+    slack_kib: float = 1024.0,
+    keys: Sequence[str] = ("p50", "p95"),
+) -> List[Comparison]:
+    """
+    Compare a result against a baseline.
+
+    Args:
+        tolerance: Allowed ratio current / baseline before a number counts
+            as a regression.
+        slack_ms: Latency growth below this many milliseconds is never a
+            regression.
+        slack_kib: Same for memory, in KiB.
+        keys: Which percentiles are checked (p99 is reported but too noisy
+            over a few dozen turns to gate on).
+    """
+    results = []
+    for stage, stats in current.get("stages", {}).items():
+        old = baseline.get("stages", {}).get(stage)
+        if not old:
+            continue
+        for key in keys:
+            if key in stats and key in old:
+                grew = stats[key] - old[key]
+                regressed = stats[key] > old[key] * tolerance and grew > slack_ms
+                results.append(Comparison(f"{stage}.{key}", old[key], stats[key], regressed))
+    for key, value in current.get("memory", {}).items():
+        old = baseline.get("memory", {}).get(key)
+        if old is None:
+            continue
+        regressed = value > old * tolerance and value - old > slack_kib
+        results.append(Comparison(f"memory.{key}", old, value, regressed))
+    return results
+
+
+def format_comparison(comparisons: List[Comparison]) -> str:
+    lines = [f"{'metric':<28} {'baseline':>10} {'current':>10} {'ratio':>7}"]
+    for item in comparisons:
+        flag = "  REGRESSED" if item.regressed else ""
+        lines.append(f"{item.metric:<28} {item.baseline:>10.2f} {item.current:>10.2f} {item.ratio:>6.2f}x{flag}")
+    return "\n".join(lines)
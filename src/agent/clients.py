@@ -0,0 +1,102 @@
+"""
+Long-lived LLM provider clients.
+
+Building a client per request pays TCP/TLS setup every time, and the old
+Ollama path mutated the process-wide OLLAMA_HOST env var from request
+handlers. Instead, clients are created once per resolved ProviderConfig and
+reused: their underlying httpx pools keep connections alive between calls.
+
+The ollama and google-genai SDKs are imported on first use, so a process
+that never talks to a provider doesn't pay for loading them.
+
+Timeout (seconds):
+    IRONCLAW_LLM_TIMEOUT      code-generation calls (default 120)
+
+Health probes have their own client, owned by the endpoint's monitor in
+health.py.
+"""
+
+import dataclasses
+import os
+import threading
+from typing import TYPE_CHECKING, Dict, Optional
+
+if TYPE_CHECKING:
+    import ollama as ollama_lib
+    from google import genai
+    from src.agent.provider import ProviderConfig
+
+_DEFAULT_LLM_TIMEOUT = 120.0
+
+
+def _env_timeout(name: str, default: float) -> float:
+    return float(os.environ.get(name, default))
+
+
+class ProviderClients:
+    """Lazily-built, reusable clients for one ProviderConfig.
+
+    Args:
+        config: Resolved provider config the clients talk to.
+        timeout: Per-request timeout for code-generation calls, in seconds.
+    """
+
+    def __init__(self, config: "ProviderConfig", timeout: Optional[float] = None):
+        self.config = config
+        self.timeout = timeout if timeout is not None else _env_timeout("IRONCLAW_LLM_TIMEOUT", _DEFAULT_LLM_TIMEOUT)
+        self._lock = threading.Lock()
+        self._ollama: Optional["ollama_lib.Client"] = None
+        self._genai: Optional["genai.Client"] = None
+
+    @property
+    def ollama(self) -> "ollama_lib.Client":
+        """Synchronous Ollama client for streaming code generation."""
+        with self._lock:
+            if self._ollama is None:
+                import ollama as ollama_lib
+                self._ollama = ollama_lib.Client(host=self.config.ollama_base_url, timeout=self.timeout)
+            return self._ollama
+
+    @property
+    def genai(self) -> "genai.Client":
+        """Gemini client for non-Ollama code generation."""
+        with self._lock:
+            if self._genai is None:
+                from google import genai
+                self._genai = genai.Client(
+                    api_key=self.config.gemini_api_key,
+                    http_options=genai.types.HttpOptions(timeout=int(self.timeout * 1000)),
+                )
+            return self._genai
+
+    def close(self):
+        """Close connection pools."""
+        with self._lock:
+            if self._ollama is not None:
+                self._ollama._client.close()
+            self._ollama = None
+            self._genai = None
+
+
+_clients: Dict[tuple, ProviderClients] = {}
+_clients_lock = threading.Lock()
+
+
+def get_clients(config: "ProviderConfig") -> ProviderClients:
+    """Returns the shared clients for a resolved provider config."""
+    key = dataclasses.astuple(config)
+    with _clients_lock:
+        clients = _clients.get(key)
+        if clients is None:
+            clients = ProviderClients(config)
+            _clients[key] = clients
+        return clients
+
+
+def clear_clients():
+    """Drop every cached client (e.g. after credentials change)."""
+    with _clients_lock:
+        cached = list(_clients.values())
+        _clients.clear()
+    for clients in cached:
+        clients.close()
@@ -0,0 +1,84 @@
+"""
+Offloading blocking work from the asyncio event loop.
+
+Docker calls, LLM SDK calls and workspace disk I/O are synchronous. Async
+handlers (Chainlit, the agent's tools) run them on a bounded thread pool via
+run_blocking() so one long execution never stalls other users, and use
+OutputBridge to deliver streaming callbacks from those threads back onto the
+loop in order.
+"""
+
+import asyncio
+import contextvars
+import functools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Awaitable, Callable, Optional, TypeVar
+
+T = TypeVar("T")
+
+_DEFAULT_WORKERS = 16
+
+_executor: Optional[ThreadPoolExecutor] = None
+_executor_lock = threading.Lock()
+
+
+def get_executor() -> ThreadPoolExecutor:
+    """Process-wide pool for blocking work, sized by IRONCLAW_WORKER_THREADS (16)."""
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            workers = int(os.environ.get("IRONCLAW_WORKER_THREADS", _DEFAULT_WORKERS))
+            _executor = ThreadPoolExecutor(max_workers=max(1, workers), thread_name_prefix="ironclaw-worker")
+        return _executor
+
+
+async def run_blocking(fn: Callable[..., T], *args, **kwargs) -> T:
+    """Run a blocking callable on the worker pool and await its result.
+
+    The caller's contextvars are copied into the worker thread, so
+    context-bound state (e.g. the Chainlit session) stays visible there.
+    """
+    loop = asyncio.get_running_loop()
+    ctx = contextvars.copy_context()
+    call = functools.partial(ctx.run, fn, *args, **kwargs)
+    return await loop.run_in_executor(get_executor(), call)
+
+
+_DONE = object()
+
+
+class OutputBridge:
+    """Thread-safe on_output callback that forwards to an async sink on the loop.
+
+    Calls may come from any thread; the sink is awaited on the event loop one
+    item at a time, in call order. Must be created on the loop thread.
+
+    Args:
+        sink: Async callable receiving each output string.
+    """
+
+    def __init__(self, sink: Callable[[str], Awaitable[None]]):
+        self._sink = sink
+        self._loop = asyncio.get_running_loop()
+        self._queue: asyncio.Queue = asyncio.Queue()
+        self._task = self._loop.create_task(self._drain())
+
+    def __call__(self, content: str):
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, content)
+
+    async def _drain(self):
+        while True:
+            item = await self._queue.get()
+            if item is _DONE:
+                return
+            try:
+                await self._sink(item)
+            except Exception as e:
+                print(f"[!] Output callback failed: {e}")
+
+    async def aclose(self):
+        """Wait until everything emitted so far has reached the sink."""
+        self._loop.call_soon_threadsafe(self._queue.put_nowait, _DONE)
+        await self._task
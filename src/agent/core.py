@@ -1,75 +1,135 @@
-import os
+"""
+The IronClaw agent and its tools.
+
+Nothing provider-specific happens at import: the model and the agents are
+built on first use by get_agent() / get_summarizer(), from the provider
+config in effect at that moment, and cached per config. Startup therefore
+doesn't load model SDKs it never uses, and a fallback from Ollama to a
+cloud provider after the health check gets an agent for the new provider.
+"""
+
+import dataclasses
+import threading
 from dataclasses import dataclass
-from typing import Union, Optional, Callable
+from typing import Dict, Union, Optional, Callable
 from pydantic_ai import Agent, RunContext
-from pydantic_ai.providers.ollama import OllamaProvider
-from pydantic_ai.models.openai import OpenAIModel
-from src.agent.prompts import IRONCLAW_SYSTEM_PROMPT
-from src.agent.provider import get_provider_config
-from src.agent.tools.sandbox import (
-    run_system_task as _run_system_task,
-    confirm_execution as _confirm_execution,
-    CodeExecutionRequest
+from src.agent.prompts import IRONCLAW_SYSTEM_PROMPT, HISTORY_SUMMARY_PROMPT
+from src.agent.concurrency import run_blocking
+from src.agent.provider import ProviderConfig, get_provider_config
+from src.agent.timed_model import TimedModel
+from src.agent.tools.code_blocks import CodeBlock, CodeExecutionRequest
+from src.agent.tools.workspace import (
+    list_workspace_files as _list_workspace_files,
+    session_workspace_path,
 )
-from src.agent.tools.workspace import list_workspace_files as _list_workspace_files
-
-# Resolve provider config and select model
-_provider_config = get_provider_config()
 
-if _provider_config.provider == "ollama":
-    # Pydantic-ai uses OllamaProvider (OpenAI-compatible) for Ollama backends
-    # OllamaProvider passes base_url directly to AsyncOpenAI, which requires
-    # the /v1 path suffix to reach Ollama's OpenAI-compatible endpoint.
-    _ollama_base = _provider_config.ollama_base_url.rstrip("/")
-    _ollama_provider = OllamaProvider(base_url=f"{_ollama_base}/v1")
-    default_model = OpenAIModel(
-        _provider_config.ollama_agent_model,
-        provider=_ollama_provider,
-    )
-elif _provider_config.provider == "anthropic":
-    default_model = 'anthropic:claude-3-5-sonnet-latest'
-elif _provider_config.provider == "openai":
-    default_model = 'openai:gpt-4o'
-else:
+def build_model(config: Optional[ProviderConfig] = None):
+    """Pydantic AI model (or model name) for a provider config."""
+    config = config or get_provider_config()
+    if config.provider == "ollama":
+        from pydantic_ai.providers.ollama import OllamaProvider
+        from pydantic_ai.models.openai import OpenAIModel
+        # Pydantic-ai uses OllamaProvider (OpenAI-compatible) for Ollama backends
+        # OllamaProvider passes base_url directly to AsyncOpenAI, which requires
+        # the /v1 path suffix to reach Ollama's OpenAI-compatible endpoint.
+        ollama_base = config.ollama_base_url.rstrip("/")
+        return OpenAIModel(
+            config.ollama_agent_model,
+            provider=OllamaProvider(base_url=f"{ollama_base}/v1"),
+        )
+    if config.provider == "anthropic":
+        return 'anthropic:claude-3-5-sonnet-latest'
+    if config.provider == "openai":
+        return 'openai:gpt-4o'
     # "gemini" (default)
-    default_model = 'google-gla:gemini-2.5-flash'
+    return 'google-gla:gemini-2.5-flash'
 
 @dataclass
 class AgentDeps:
     on_output: Optional[Callable[[str], None]] = None
+    session_id: str = "default"
+    # Called with each generated code block as soon as it is complete
+    on_block: Optional[Callable[[CodeBlock], None]] = None
 
-# Define the agent with support for structured HITL requests
-ironclaw_agent = Agent(
-    default_model,
-    system_prompt=IRONCLAW_SYSTEM_PROMPT,
-    deps_type=AgentDeps,
-    output_type=Union[CodeExecutionRequest, str]
-)
-
-# Register the tools
-@ironclaw_agent.tool
-def run_system_task(ctx: RunContext[AgentDeps], task: str) -> Union[CodeExecutionRequest, str]:
+# Tools are async and push the blocking sandbox/LLM work onto the bounded
+# worker pool, so the event loop keeps serving other sessions meanwhile.
+async def run_system_task(ctx: RunContext[AgentDeps], task: str) -> Union[CodeExecutionRequest, str]:
     """
     Plans a natural language task in the sandboxed environment and generates code.
     Use this for any system operations. It will return a request for approval.
     """
     on_output = ctx.deps.on_output if ctx.deps else None
-    return _run_system_task(task, on_output=on_output)
+    on_block = ctx.deps.on_block if ctx.deps else None
+    session_id = ctx.deps.session_id if ctx.deps else "default"
+    # The sandbox (and docker with it) is imported on first use, not with the agent
+    from src.agent.tools.sandbox import run_system_task as _run_system_task
+    return await run_blocking(_run_system_task, task, on_output=on_output, session_id=session_id, on_block=on_block)
 
-@ironclaw_agent.tool
-def confirm_execution(ctx: RunContext[AgentDeps]) -> str:
+async def confirm_execution(ctx: RunContext[AgentDeps]) -> str:
     """
     Executes the pending code blocks that were previously generated and approved.
     """
     on_output = ctx.deps.on_output if ctx.deps else None
-    return _confirm_execution(on_output=on_output)
+    session_id = ctx.deps.session_id if ctx.deps else "default"
+    from src.agent.tools.sandbox import confirm_execution as _confirm_execution
+    return await run_blocking(_confirm_execution, on_output=on_output, session_id=session_id)
 
-@ironclaw_agent.tool_plain
-def list_workspace_files() -> str:
+async def list_workspace_files(ctx: RunContext[AgentDeps]) -> str:
     """
     Returns a list of all files in the current workspace.
     """
-    files = _list_workspace_files()
+    session_id = ctx.deps.session_id if ctx.deps else "default"
+    files = await run_blocking(_list_workspace_files, session_workspace_path(session_id))
     if not files:
         return "Workspace is empty."
     return f"Files in workspace: {', '.join(files)}"
+
+_agents: Dict[tuple, Agent] = {}
+_summarizers: Dict[tuple, Agent] = {}
+_agents_lock = threading.Lock()
+
+def get_agent() -> Agent:
+    """The IronClaw agent for the current provider config, built on first use."""
+    config = get_provider_config()
+    key = dataclasses.astuple(config)
+    with _agents_lock:
+        agent = _agents.get(key)
+        if agent is None:
+            # Define the agent with support for structured HITL requests
+            agent = Agent(
+                TimedModel(build_model(config), config.provider),
+                system_prompt=IRONCLAW_SYSTEM_PROMPT,
+                deps_type=AgentDeps,
+                output_type=Union[CodeExecutionRequest, str],
+                tools=[run_system_task, confirm_execution, list_workspace_files],
+            )
+            _agents[key] = agent
+        return agent
+
+def get_summarizer() -> Agent:
+    """Agent that summarises older turns when a session's history is compacted."""
+    config = get_provider_config()
+    key = dataclasses.astuple(config)
+    with _agents_lock:
+        agent = _summarizers.get(key)
+        if agent is None:
+            agent = Agent(
+                TimedModel(build_model(config), config.provider, phase="summarize"),
+                system_prompt=HISTORY_SUMMARY_PROMPT,
+                output_type=str,
+            )
+            _summarizers[key] = agent
+        return agent
+
+async def summarize_history(transcript: str) -> str:
+    """Summarise a transcript of older conversation turns."""
+    result = await get_summarizer().run(transcript)
+    return result.output
+
+def __getattr__(name: str):
+    # The agents used to be module globals built at import time
+    if name == "ironclaw_agent":
+        return get_agent()
+    if name == "history_summarizer":
+        return get_summarizer()
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
@@ -0,0 +1,248 @@
+"""
+Background health monitoring for Ollama endpoints.
+
+The startup check used to probe Ollama on every chat start and CLI start,
+blocking for up to IRONCLAW_HEALTH_TIMEOUT against an unreachable host, and
+was never consulted again: an outage mid-session surfaced as a slow
+exception out of code generation. Instead, one monitor per endpoint polls
+/api/tags on a daemon thread and caches the result (reachability and the
+pulled models), so starting a chat reads a cached status.
+
+Each monitor is also a circuit breaker. After IRONCLAW_HEALTH_FAILURES
+consecutive failures, from its own probes or reported by callers, the
+circuit opens: check() raises OllamaUnavailableError at once instead of
+letting the request wait for a TCP timeout, and the caller can offer the
+cloud fallback. While open, the endpoint is re-probed every few seconds and
+the circuit closes on the first success.
+
+Settings:
+    IRONCLAW_HEALTH_INTERVAL   seconds between probes while healthy (default 15)
+    IRONCLAW_HEALTH_FAILURES   consecutive failures that open the circuit (default 2)
+    IRONCLAW_HEALTH_TIMEOUT    seconds per probe (default 5)
+"""
+
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from src.agent.provider import OllamaUnavailableError, ProviderConfig
+
+_DEFAULT_INTERVAL = 15.0
+_DEFAULT_TIMEOUT = 5.0
+_DEFAULT_FAILURES = 2
+# Seconds between probes while the circuit is open
+_OPEN_RETRY = 2.0
+
+
+@dataclass
+class HealthStatus:
+    """Result of the latest probe of an endpoint.
+
+    Attributes:
+        reachable: True if the last probe got HTTP 200.
+        models: Pulled model names from the last successful probe.
+        checked_at: time.monotonic() of the last probe.
+        error: Why the last probe or reported call failed, if it did.
+        circuit_open: True while calls should fail fast.
+    """
+
+    reachable: bool
+    models: List[str] = field(default_factory=list)
+    checked_at: float = 0.0
+    error: Optional[str] = None
+    circuit_open: bool = False
+
+
+def probe_ollama(base_url: str, client: httpx.Client) -> Tuple[bool, List[str], Optional[str]]:
+    """GET /api/tags once. Returns (reachable, pulled_models, error)."""
+    try:
+        response = client.get(f"{base_url}/api/tags")
+    except httpx.HTTPError as e:
+        return False, [], f"{type(e).__name__}: {e}"
+    if response.status_code != 200:
+        return False, [], f"HTTP {response.status_code}"
+    models = [m["name"] for m in response.json().get("models", [])]
+    return True, models, None
+
+
+class ProviderHealthMonitor:
+    """Polls one Ollama endpoint in the background and guards calls to it.
+
+    Args:
+        base_url: Ollama base URL.
+        interval: Seconds between probes while healthy. Defaults to
+            IRONCLAW_HEALTH_INTERVAL.
+        failure_threshold: Consecutive failures that open the circuit.
+            Defaults to IRONCLAW_HEALTH_FAILURES.
+        timeout: Seconds per probe. Defaults to IRONCLAW_HEALTH_TIMEOUT.
+        probe: Callable returning (reachable, models, error); replaces the
+            HTTP probe (used by tests).
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        interval: Optional[float] = None,
+        failure_threshold: Optional[int] = None,
+        timeout: Optional[float] = None,
+        probe: Optional[Callable[[], Tuple[bool, List[str], Optional[str]]]] = None,
+    ):
+        self.base_url = base_url
+        self.interval = interval if interval is not None else float(
+            os.environ.get("IRONCLAW_HEALTH_INTERVAL", _DEFAULT_INTERVAL)
+        )
+        self.failure_threshold = max(1, failure_threshold if failure_threshold is not None else int(
+            os.environ.get("IRONCLAW_HEALTH_FAILURES", _DEFAULT_FAILURES)
+        ))
+        self.timeout = timeout if timeout is not None else float(
+            os.environ.get("IRONCLAW_HEALTH_TIMEOUT", _DEFAULT_TIMEOUT)
+        )
+        self._probe = probe
+        self._client: Optional[httpx.Client] = None
+        self._lock = threading.Lock()
+        self._status: Optional[HealthStatus] = None
+        self._failures = 0
+        self._checked = threading.Event()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @property
+    def status(self) -> Optional[HealthStatus]:
+        """The cached status, or None before the first probe has finished."""
+        return self._status
+
+    def start(self) -> "ProviderHealthMonitor":
+        """Starts the polling thread, if it isn't running yet."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._stop.clear()
+                self._thread = threading.Thread(
+                    target=self._run, name=f"ironclaw-health {self.base_url}", daemon=True
+                )
+                self._thread.start()
+        return self
+
+    def _run(self):
+        while not self._stop.is_set():
+            status = self.refresh()
+            wait = _OPEN_RETRY if status.circuit_open else self.interval
+            self._wake.wait(min(wait, self.interval))
+            self._wake.clear()
+
+    def refresh(self) -> HealthStatus:
+        """Probes the endpoint now and updates the cached status."""
+        if self._probe is not None:
+            reachable, models, error = self._probe()
+        else:
+            if self._client is None:
+                self._client = httpx.Client(timeout=self.timeout)
+            reachable, models, error = probe_ollama(self.base_url, self._client)
+        with self._lock:
+            if reachable:
+                self._failures = 0
+            else:
+                self._failures += 1
+                # Keep the last known models: they're still pulled
+                models = self._status.models if self._status else []
+            self._status = HealthStatus(
+                reachable=reachable,
+                models=models,
+                checked_at=time.monotonic(),
+                error=error,
+                circuit_open=self._failures >= self.failure_threshold,
+            )
+            status = self._status
+        self._checked.set()
+        return status
+
+    def wait(self, timeout: Optional[float] = None) -> HealthStatus:
+        """
+        The cached status, waiting for the first probe if there is none yet.
+
+        Returns:
+            The status; unreachable if the first probe didn't finish in time.
+        """
+        self.start()
+        if not self._checked.wait(timeout):
+            return HealthStatus(reachable=False, error="health check still running")
+        return self._status
+
+    def record_failure(self, error: BaseException):
+        """Counts a failed call to the endpoint towards opening the circuit."""
+        with self._lock:
+            self._failures += 1
+            previous = self._status or HealthStatus(reachable=False)
+            self._status = HealthStatus(
+                reachable=False,
+                models=previous.models,
+                checked_at=time.monotonic(),
+                error=f"{type(error).__name__}: {error}",
+                circuit_open=self._failures >= self.failure_threshold,
+            )
+            opened = self._status.circuit_open
+        self._checked.set()
+        if opened:
+            # Start re-probing at the faster open-circuit pace right away
+            self._wake.set()
+
+    def record_success(self):
+        """A successful call proves the endpoint is up; closes the circuit."""
+        with self._lock:
+            if self._failures == 0:
+                return
+            self._failures = 0
+            previous = self._status or HealthStatus(reachable=True)
+            self._status = HealthStatus(
+                reachable=True, models=previous.models, checked_at=time.monotonic()
+            )
+
+    def check(self):
+        """
+        Fails fast while the circuit is open.
+
+        Raises:
+            OllamaUnavailableError: The endpoint failed its recent probes or calls.
+        """
+        status = self._status
+        if status is not None and status.circuit_open:
+            raise OllamaUnavailableError(
+                f"Ollama at {self.base_url} is unavailable ({status.error or 'not responding'}); "
+                "not waiting for it to time out"
+            )
+
+    def stop(self):
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.timeout + 1)
+        if self._client is not None:
+            self._client.close()
+            self._client = None
+
+
+_monitors: Dict[str, ProviderHealthMonitor] = {}
+_monitors_lock = threading.Lock()
+
+
+def get_health_monitor(config: ProviderConfig) -> ProviderHealthMonitor:
+    """The running monitor for config's Ollama endpoint, started on first use."""
+    with _monitors_lock:
+        monitor = _monitors.get(config.ollama_base_url)
+        if monitor is None:
+            monitor = ProviderHealthMonitor(config.ollama_base_url)
+            _monitors[config.ollama_base_url] = monitor
+    return monitor.start()
+
+
+def stop_health_monitors():
+    """Stop and drop every monitor."""
+    with _monitors_lock:
+        monitors = list(_monitors.values())
+        _monitors.clear()
+    for monitor in monitors:
+        monitor.stop()
@@ -0,0 +1,246 @@
+"""
+Bounding the conversation history sent to the model.
+
+Long-lived sessions (e.g. `web-<username>`) accumulate history forever. Two
+stages keep the prompt roughly constant in size:
+
+- Windowing: only the most recent IRONCLAW_HISTORY_WINDOW messages (default
+  200, 0 = no limit) are loaded at startup and kept in memory between turns.
+- Compaction: once history passes IRONCLAW_COMPACT_MESSAGES messages (default
+  120) or roughly IRONCLAW_COMPACT_TOKENS tokens (default 24000), everything
+  but the last IRONCLAW_COMPACT_KEEP messages (default 20) is summarised into
+  one synthetic message. The summary is persisted and the originals archived.
+
+Windows and compaction cut points always fall on a user turn, so tool calls
+and their returns are never split, and the system prompt is carried over.
+"""
+
+import dataclasses
+import os
+from typing import Awaitable, Callable, List, Optional
+
+from pydantic import TypeAdapter
+from pydantic_ai.messages import (
+    ModelMessage,
+    ModelRequest,
+    ModelResponse,
+    RetryPromptPart,
+    SystemPromptPart,
+    TextPart,
+    ToolCallPart,
+    ToolReturnPart,
+    UserPromptPart,
+)
+
+from src.agent.prompts import IRONCLAW_SYSTEM_PROMPT
+
+_DEFAULT_WINDOW = 200
+_DEFAULT_COMPACT_MESSAGES = 120
+_DEFAULT_COMPACT_TOKENS = 24000
+_DEFAULT_COMPACT_KEEP = 20
+
+SUMMARY_PREFIX = "[CONVERSATION SUMMARY]"
+
+# Longest excerpt of a single part included in the summariser's transcript
+_TRANSCRIPT_PART_CHARS = 2000
+
+_adapter = TypeAdapter(list[ModelMessage])
+
+
+def history_window_size() -> Optional[int]:
+    """Max messages to keep in a session's working history, or None for unlimited."""
+    size = int(os.environ.get("IRONCLAW_HISTORY_WINDOW", _DEFAULT_WINDOW))
+    return size if size > 0 else None
+
+
+def is_turn_start(message: ModelMessage) -> bool:
+    """True for a request that carries a user prompt and no tool results."""
+    if not isinstance(message, ModelRequest):
+        return False
+    has_prompt = any(isinstance(part, UserPromptPart) for part in message.parts)
+    has_reply = any(isinstance(part, (ToolReturnPart, RetryPromptPart)) for part in message.parts)
+    return has_prompt and not has_reply
+
+
+def _system_parts(messages: List[ModelMessage]) -> List[SystemPromptPart]:
+    if messages and isinstance(messages[0], ModelRequest):
+        return [part for part in messages[0].parts if isinstance(part, SystemPromptPart)]
+    return []
+
+
+def _with_system_parts(messages: List[ModelMessage], parts: List[SystemPromptPart]) -> List[ModelMessage]:
+    """Prepend system prompt parts to the first request unless it already has some."""
+    if not parts or not messages or _system_parts(messages) or not isinstance(messages[0], ModelRequest):
+        return messages
+    first = dataclasses.replace(messages[0], parts=list(parts) + list(messages[0].parts))
+    return [first] + messages[1:]
+
+
+def ensure_system_prompt(messages: List[ModelMessage], system_prompt: str = IRONCLAW_SYSTEM_PROMPT) -> List[ModelMessage]:
+    """
+    Pydantic AI only adds the agent's system prompt when the history is
+    empty; history loaded as a window or from a summary needs it restored.
+    """
+    return _with_system_parts(list(messages), [SystemPromptPart(content=system_prompt)])
+
+
+def window_messages(messages: List[ModelMessage], max_messages: Optional[int]) -> List[ModelMessage]:
+    """
+    Returns the tail of `messages` holding at most `max_messages`, trimmed
+    forward to the first turn start. If no turn starts inside the tail, the
+    window is widened back to the start of the current turn instead.
+    """
+    if not max_messages or len(messages) <= max_messages:
+        return list(messages)
+    start = len(messages) - max_messages
+    for index in range(start, len(messages)):
+        if is_turn_start(messages[index]):
+            return _with_system_parts(list(messages[index:]), _system_parts(messages))
+    for index in range(start - 1, 0, -1):
+        if is_turn_start(messages[index]):
+            return _with_system_parts(list(messages[index:]), _system_parts(messages))
+    return list(messages)
+
+
+def _part_text(part) -> str:
+    if isinstance(part, ToolCallPart):
+        return f"{part.tool_name}({part.args_as_json_str()})"
+    content = getattr(part, "content", "")
+    return content if isinstance(content, str) else str(content)
+
+
+def estimate_tokens(messages: List[ModelMessage]) -> int:
+    """Rough token count (characters / 4) of the message contents."""
+    chars = sum(len(_part_text(part)) for message in messages for part in message.parts)
+    return chars // 4
+
+
+def render_transcript(messages: List[ModelMessage]) -> str:
+    """Plain-text transcript of messages for the summariser."""
+    lines = []
+    for message in messages:
+        for part in message.parts:
+            if isinstance(part, SystemPromptPart):
+                continue
+            text = _part_text(part)
+            if len(text) > _TRANSCRIPT_PART_CHARS:
+                text = text[:_TRANSCRIPT_PART_CHARS] + " [...]"
+            if isinstance(part, UserPromptPart):
+                label = "Summary so far" if text.startswith(SUMMARY_PREFIX) else "User"
+            elif isinstance(part, TextPart):
+                label = "Assistant"
+            elif isinstance(part, ToolCallPart):
+                label = "Tool call"
+            elif isinstance(part, (ToolReturnPart, RetryPromptPart)):
+                label = "Tool result"
+            else:
+                continue
+            lines.append(f"{label}: {text}")
+    return "\n".join(lines)
+
+
+def summary_message(summary: str) -> ModelRequest:
+    """Synthetic request carrying a summary of compacted history."""
+    return ModelRequest(parts=[UserPromptPart(content=f"{SUMMARY_PREFIX} Earlier conversation, summarised:\n{summary}")])
+
+
+@dataclasses.dataclass
+class CompactionResult:
+    history: List[ModelMessage]   # summary message followed by the kept tail
+    summary: ModelRequest         # the synthetic summary message, without system prompt
+    kept: int                     # messages kept verbatim after the summary
+    compacted: int                # messages folded into the summary
+
+
+class HistoryCompactor:
+    """Folds older turns into a rolling summary when history grows too large.
+
+    Args:
+        summarize: Async callable turning a transcript into summary text.
+        max_messages: Compact above this many messages. Defaults to
+            IRONCLAW_COMPACT_MESSAGES (120); 0 disables the count threshold.
+        max_tokens: Compact above this many estimated tokens. Defaults to
+            IRONCLAW_COMPACT_TOKENS (24000); 0 disables the size threshold.
+        keep_last: Recent messages kept verbatim. Defaults to
+            IRONCLAW_COMPACT_KEEP (20).
+    """
+
+    def __init__(
+        self,
+        summarize: Callable[[str], Awaitable[str]],
+        max_messages: Optional[int] = None,
+        max_tokens: Optional[int] = None,
+        keep_last: Optional[int] = None,
+    ):
+        self.summarize = summarize
+        if max_messages is None:
+            max_messages = int(os.environ.get("IRONCLAW_COMPACT_MESSAGES", _DEFAULT_COMPACT_MESSAGES))
+        if max_tokens is None:
+            max_tokens = int(os.environ.get("IRONCLAW_COMPACT_TOKENS", _DEFAULT_COMPACT_TOKENS))
+        if keep_last is None:
+            keep_last = int(os.environ.get("IRONCLAW_COMPACT_KEEP", _DEFAULT_COMPACT_KEEP))
+        self.max_messages = max_messages
+        self.max_tokens = max_tokens
+        self.keep_last = max(1, keep_last)
+
+    def should_compact(self, messages: List[ModelMessage]) -> bool:
+        if self.max_messages > 0 and len(messages) > self.max_messages:
+            return True
+        return self.max_tokens > 0 and estimate_tokens(messages) > self.max_tokens
+
+    async def compact(self, messages: List[ModelMessage]) -> Optional[CompactionResult]:
+        """Summarise all but the recent tail. Returns None if nothing needs doing."""
+        if not self.should_compact(messages):
+            return None
+        kept = window_messages(messages, self.keep_last)
+        # window_messages may have added system parts to the first kept message
+        kept_count = len(kept)
+        older = list(messages[:len(messages) - kept_count])
+        if not older:
+            return None  # a single turn longer than the thresholds; nothing to fold
+
+        text = await self.summarize(render_transcript(older))
+        summary = summary_message(text.strip())
+        tail = list(messages[len(messages) - kept_count:])
+        history = _with_system_parts([summary] + tail, _system_parts(messages))
+        return CompactionResult(history=history, summary=summary, kept=kept_count, compacted=len(older))
+
+
+_compactor: Optional[HistoryCompactor] = None
+
+
+def get_compactor() -> HistoryCompactor:
+    """Shared compactor using the agent's summariser model."""
+    global _compactor
+    if _compactor is None:
+        # Imported lazily: core loads pydantic_ai's Agent, which history
+        # doesn't need until the first compaction
+        from src.agent.core import summarize_history
+        _compactor = HistoryCompactor(summarize_history)
+    return _compactor
+
+
+async def compact_history(
+    history: List[ModelMessage],
+    db,
+    session_id: str,
+    compactor: Optional[HistoryCompactor] = None,
+) -> List[ModelMessage]:
+    """
+    Compacts history if it is over threshold, persisting the summary and
+    archiving the summarised rows. On failure the history is returned as is.
+    """
+    compactor = compactor or get_compactor()
+    if not compactor.should_compact(history):
+        return history
+    try:
+        result = await compactor.compact(history)
+        if result is None:
+            return history
+        summary_dict = _adapter.dump_python([result.summary], mode='json')[0]
+        await db.save_summary(session_id, summary_dict, keep_last=result.kept)
+    except Exception as e:
+        print(f"[!] History compaction failed: {e}")
+        return history
+    print(f"[*] Compacted {result.compacted} older messages into a summary.")
+    return result.history
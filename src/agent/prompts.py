@@ -34,3 +34,17 @@ For ANY task that involves the operating system, shell commands, files, processe
 | 2    | Return the resulting `CodeExecutionRequest` object directly |
 | 3    | After user approval, call `confirm_execution()` |
 """
+
+HISTORY_SUMMARY_PROMPT = """
+You compress the earlier part of a conversation between a user and IronClaw, a
+sandboxed system assistant, so the conversation can continue without it.
+
+Write a concise summary (at most ~300 words) that preserves:
+- what the user asked for and any preferences or constraints they stated,
+- files in /workspace that were created, uploaded, or changed, by full path,
+- commands or code that were run and their important results or errors,
+- tasks that are still open or awaiting approval.
+
+If the transcript begins with an earlier summary, fold it in. Do not invent
+details, do not address the user, and output only the summary text.
+"""
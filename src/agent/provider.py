@@ -9,7 +9,6 @@ import os
 from dataclasses import dataclass
 from typing import Optional
 
-import httpx
 
 VALID_PROVIDERS = {"ollama", "gemini", "anthropic", "openai"}
 
@@ -87,30 +86,32 @@ class OllamaUnavailableError(Exception):
 
 
 async def check_ollama_health(config: ProviderConfig) -> tuple[bool, list[str]]:
-    """Ping Ollama /api/tags endpoint to verify reachability and list pulled models.
+    """Report Ollama reachability and pulled models from the endpoint's health monitor.
+
+    The monitor (see health.py) probes /api/tags in the background, so this
+    returns its cached status at once; only the very first call for an
+    endpoint waits for the first probe.
 
     Args:
         config: Resolved ProviderConfig (ollama_base_url used for the endpoint).
 
     Returns:
         (reachable, pulled_models) where:
-        - reachable: True if HTTP 200 was received.
+        - reachable: True if the last probe received HTTP 200.
         - pulled_models: list of model name strings from /api/tags response,
-          empty list if unreachable.
+          empty list if never reachable.
 
     Does NOT raise — callers decide what to do with the result.
     """
-    url = f"{config.ollama_base_url}/api/tags"
-    try:
-        async with httpx.AsyncClient(timeout=5.0) as client:
-            response = await client.get(url)
-            if response.status_code == 200:
-                data = response.json()
-                models = [m["name"] for m in data.get("models", [])]
-                return True, models
-            return False, []
-    except (httpx.ConnectError, httpx.TimeoutException, httpx.RequestError):
-        return False, []
+    # Imported here: both modules depend on ProviderConfig from this module
+    from src.agent.concurrency import run_blocking
+    from src.agent.health import get_health_monitor
+
+    monitor = get_health_monitor(config)
+    status = monitor.status
+    if status is None:
+        status = await run_blocking(monitor.wait, monitor.timeout + 1)
+    return status.reachable, status.models
 
 
 def get_missing_models(config: ProviderConfig, pulled_models: list[str]) -> list[str]:
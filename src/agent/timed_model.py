@@ -0,0 +1,59 @@
+"""
+Pydantic AI model wrapper that times every model call.
+
+Each request, streamed or not, runs inside a metrics span (by default
+"agent_model"), labelled with the provider and model, so the agent's own
+LLM calls are measured separately from code generation and tool work.
+"""
+
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
+
+from pydantic_ai.models import Model, infer_model
+from pydantic_ai.models.wrapper import WrapperModel
+
+from src.telemetry.metrics import span
+
+
+class TimedModel(WrapperModel):
+    """Times the calls of a wrapped model.
+
+    The wrapped model is resolved on first use, like a model name passed to
+    Agent, so building the agent still needs no API key.
+
+    Args:
+        model: Model instance or model name ("provider:model").
+        provider: Provider label for the metrics.
+        model_label: Model label for the metrics. Defaults to the name part
+            of a model name.
+        phase: Span name for the calls.
+    """
+
+    def __init__(self, model: Any, provider: str, model_label: Optional[str] = None, phase: str = "agent_model"):
+        Model.__init__(self)
+        self.phase = phase
+        self._wrapped: Optional[Model] = model if isinstance(model, Model) else None
+        self._model = model
+        self.provider_label = provider
+        if model_label is None:
+            model_label = model.split(":", 1)[-1] if isinstance(model, str) else model.model_name
+        self.model_label = model_label
+
+    @property
+    def wrapped(self) -> Model:
+        if self._wrapped is None:
+            self._wrapped = infer_model(self._model)
+        return self._wrapped
+
+    async def request(self, messages, model_settings, model_request_parameters):
+        with span(self.phase, self.provider_label, self.model_label, stream=False):
+            return await self.wrapped.request(messages, model_settings, model_request_parameters)
+
+    @asynccontextmanager
+    async def request_stream(self, messages, model_settings, model_request_parameters, run_context=None) -> AsyncIterator[Any]:
+        # The span covers the whole stream, until the caller stops reading it
+        with span(self.phase, self.provider_label, self.model_label, stream=True):
+            async with self.wrapped.request_stream(
+                messages, model_settings, model_request_parameters, run_context
+            ) as response_stream:
+                yield response_stream
@@ -0,0 +1,107 @@
+"""
+Concurrent execution of approved code blocks.
+
+By default the blocks of a task run one after another. With
+IRONCLAW_PARALLEL_BLOCKS above 1, up to that many run at once, each on its
+own execution slot (a separate Python kernel worker and bash session in the
+same container). Slot 0 is the session's own kernel and shell; the others
+share the workspace files and start from the session's cwd and environment
+as they were when the blocks were approved, but not its variables.
+
+A block marked `sequential` waits for every earlier block to finish and
+then runs on slot 0, so a block that needs earlier results sees them.
+Results always come back in block order.
+"""
+
+import heapq
+import os
+import threading
+from concurrent.futures import FIRST_COMPLETED, Future, ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Sequence, Tuple, TypeVar
+
+T = TypeVar("T")
+
+_DEFAULT_PARALLEL = 1
+
+
+def parallel_blocks_limit() -> int:
+    """Max code blocks run at once (IRONCLAW_PARALLEL_BLOCKS, default 1 = sequential)."""
+    return max(1, int(os.environ.get("IRONCLAW_PARALLEL_BLOCKS", _DEFAULT_PARALLEL)))
+
+
+def run_blocks(
+    sequential: Sequence[bool],
+    execute: Callable[[int, int], T],
+    max_parallel: int,
+) -> List[T]:
+    """
+    Runs execute(index, slot) for every block, at most max_parallel at a time.
+
+    Args:
+        sequential: Per block, True if it must wait for all earlier blocks.
+        execute: Runs one block on the given slot (0 <= slot < max_parallel)
+            and returns its result. Called from worker threads.
+        max_parallel: Concurrency limit; 1 runs everything in order on slot 0.
+
+    Returns:
+        The results, in block order. If a block raises, no further blocks
+        are started and the first exception is re-raised once the running
+        ones have finished.
+    """
+    count = len(sequential)
+    if max_parallel <= 1 or count <= 1:
+        return [execute(index, 0) for index in range(count)]
+
+    results: List[Optional[T]] = [None] * count
+    free = list(range(min(max_parallel, count)))
+    running: Dict[Future, Tuple[int, int]] = {}
+    errors: List[BaseException] = []
+
+    def collect(done):
+        for future in done:
+            index, slot = running.pop(future)
+            heapq.heappush(free, slot)
+            try:
+                results[index] = future.result()
+            except BaseException as e:
+                errors.append(e)
+
+    with ThreadPoolExecutor(max_workers=len(free), thread_name_prefix="ironclaw-block") as pool:
+        for index in range(count):
+            if sequential[index] and running:
+                collect(wait(running).done)
+            while not free:
+                collect(wait(running, return_when=FIRST_COMPLETED).done)
+            if errors:
+                break
+            slot = heapq.heappop(free)
+            running[pool.submit(execute, index, slot)] = (index, slot)
+        if running:
+            collect(wait(running).done)
+
+    if errors:
+        raise errors[0]
+    return results
+
+
+def tag_output(on_output: Callable[[str], None], label: str, lock: threading.Lock) -> Callable[[str], None]:
+    """
+    Wraps an on_output callback so every line of a block's output starts
+    with `label`. Blocks running at once share `lock`, so their chunks
+    reach on_output one at a time.
+    """
+    at_line_start = True
+
+    def emit(content: str):
+        nonlocal at_line_start
+        if not content:
+            return
+        lines = content.splitlines(keepends=True)
+        tagged = []
+        for line in lines:
+            tagged.append(f"{label} {line}" if at_line_start else line)
+            at_line_start = line.endswith("\n")
+        with lock:
+            on_output("".join(tagged))
+
+    return emit
@@ -0,0 +1,135 @@
+"""
+Code blocks in generated text, parsed as the text streams in.
+
+FenceParser takes the code generator's output token by token and emits each
+```lang ... ``` block as soon as its closing fence arrives, so the UI can
+show it (and the sandbox can start the matching runtime) while later blocks
+are still being generated. Fences split across tokens are handled: the
+parser only re-examines its buffer when a new token brings a backtick, and
+it yields exactly the blocks a regex over the finished text would.
+"""
+
+import json
+import re
+from typing import Callable, List, Optional
+
+from pydantic import BaseModel, model_validator
+
+
+class CodeBlock(BaseModel):
+    code: str
+    language: str
+    # With parallel execution on, wait for every earlier block before running
+    sequential: bool = False
+
+
+class CodeExecutionRequest(BaseModel):
+    status: str = "PENDING_APPROVAL"
+    blocks: List[CodeBlock]
+    reasoning: str = ""
+    cached: bool = False
+
+    @model_validator(mode='before')
+    @classmethod
+    def _coerce_blocks_string(cls, values):
+        """Small Ollama models sometimes JSON-encode `blocks` as a string.
+        Decode it back to a list so validation doesn't fail."""
+        if isinstance(values, dict) and isinstance(values.get('blocks'), str):
+            try:
+                values['blocks'] = json.loads(values['blocks'])
+            except (json.JSONDecodeError, ValueError):
+                pass
+        return values
+
+
+_FENCE = re.compile(r"```(\w+)?([^\n`]*)\n(.*?)```", re.DOTALL)
+
+
+def normalize_language(lang: Optional[str]) -> str:
+    """Map fence language identifiers to what Open Interpreter's computer understands."""
+    lang = lang or "shell"
+    if lang in ("sh", "bash", "shell", "zsh"):
+        return "shell"
+    if lang in ("py", "python"):
+        return "python"
+    return lang
+
+
+class FenceParser:
+    """Incremental parser for fenced code blocks.
+
+    A `sequential` word after the language (```python sequential) marks a
+    block that depends on the ones before it.
+
+    Args:
+        on_block: Called with each block as soon as it is complete.
+    """
+
+    def __init__(self, on_block: Optional[Callable[[CodeBlock], None]] = None):
+        self.on_block = on_block
+        self.blocks: List[CodeBlock] = []
+        self._parts: List[str] = []
+        self._pending = ""  # text after the last complete block
+        self._closed = False
+
+    @property
+    def text(self) -> str:
+        """Everything fed so far."""
+        return "".join(self._parts)
+
+    def feed(self, token: str) -> List[CodeBlock]:
+        """Add a token. Returns the blocks it completed (usually none)."""
+        if not token:
+            return []
+        self._parts.append(token)
+        self._pending += token
+        # A block can only be completed by a closing fence, which needs a backtick
+        if "`" not in token:
+            return []
+        found = []
+        while True:
+            match = _FENCE.search(self._pending)
+            if match is None:
+                break
+            self._pending = self._pending[match.end():]
+            block = self._block(match)
+            if block is not None:
+                found.append(block)
+        return found
+
+    def _block(self, match) -> Optional[CodeBlock]:
+        code = match.group(3).strip()
+        if not code:
+            return None
+        block = CodeBlock(
+            code=code,
+            language=normalize_language(match.group(1)),
+            sequential="sequential" in match.group(2).split(),
+        )
+        self.blocks.append(block)
+        if self.on_block:
+            self.on_block(block)
+        return block
+
+    def close(self) -> List[CodeBlock]:
+        """Finish parsing and return every block.
+
+        If the text had no fenced blocks at all, the whole of it is treated
+        as one shell block (and passed to on_block).
+        """
+        if not self._closed:
+            self._closed = True
+            text = self.text
+            if not self.blocks and text.strip():
+                block = CodeBlock(code=text.strip(), language="shell")
+                self.blocks.append(block)
+                if self.on_block:
+                    self.on_block(block)
+        return list(self.blocks)
+
+
+def parse_code_blocks(text: str) -> List[CodeBlock]:
+    """All fenced code blocks in a finished response."""
+    parser = FenceParser()
+    parser.feed(text)
+    return parser.close()
@@ -0,0 +1,195 @@
+"""
+Opt-in cache of generated code for repeated system tasks.
+
+run_system_task() pays a full code-generation round trip even when the same
+task ("show disk usage") was asked a minute ago. When enabled, the parsed
+code blocks are cached under a key built from the normalised task text, the
+provider/model that generated them and a fingerprint of the workspace's files
+(path, size and mtime of each, nested ones included, so tasks referring to
+files regenerate when the files change). Cached blocks are only ever
+proposals: they go through human approval like fresh ones.
+
+Configuration:
+    IRONCLAW_CODEGEN_CACHE       set to 1 to enable (default off)
+    IRONCLAW_CODEGEN_CACHE_SIZE  in-memory LRU capacity (default 256)
+    IRONCLAW_CODEGEN_CACHE_TTL   entry lifetime in seconds (default 86400)
+    IRONCLAW_CODEGEN_CACHE_DB    optional SQLite file for a persistent tier
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Tuple
+
+from src.agent.tools.workspace_index import get_workspace_index
+
+_DEFAULT_SIZE = 256
+_DEFAULT_TTL = 86400.0  # seconds
+
+_TRUTHY = {"1", "true", "yes", "on"}
+
+
+def normalize_task(task: str) -> str:
+    """Case-fold, collapse whitespace and drop trailing punctuation."""
+    text = re.sub(r"\s+", " ", task.strip().casefold())
+    return text.rstrip(" .!?")
+
+
+def workspace_fingerprint(workspace_path: str) -> str:
+    """
+    Digest of every file in a workspace by relative path, size and
+    mtime_ns. Read from the workspace index, so it costs no directory walk.
+    """
+    digest = hashlib.sha1()
+    for path, entry in sorted(get_workspace_index(workspace_path).snapshot().items()):
+        digest.update(f"{path}\0{entry.size}\0{entry.mtime_ns}\n".encode("utf-8", "surrogateescape"))
+    return digest.hexdigest()[:16]
+
+
+def make_key(task: str, provider: str, model: str, fingerprint: str) -> str:
+    raw = "\n".join((normalize_task(task), provider, model, fingerprint))
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class CodegenCache:
+    """LRU + TTL cache of generated code blocks with an optional SQLite tier.
+
+    Values are lists of plain dicts (``{"code": ..., "language": ...}``) so
+    they serialise to the disk tier unchanged.
+
+    Args:
+        max_entries: In-memory capacity; least recently used entries go first.
+        ttl: Seconds an entry stays valid. 0 disables expiry.
+        db_path: SQLite file backing the cache across restarts. Memory-only
+            when None.
+        clock: Wall-clock time source (overridable for tests).
+    """
+
+    def __init__(
+        self,
+        max_entries: int = _DEFAULT_SIZE,
+        ttl: float = _DEFAULT_TTL,
+        db_path: Optional[str] = None,
+        clock: Callable[[], float] = time.time,
+    ):
+        self.max_entries = max(1, max_entries)
+        self.ttl = ttl
+        self.clock = clock
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries: "OrderedDict[str, Tuple[float, List[dict]]]" = OrderedDict()  # oldest first
+        self._lock = threading.Lock()
+        self._db: Optional[sqlite3.Connection] = None
+        if db_path:
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS codegen_cache "
+                "(key TEXT PRIMARY KEY, blocks TEXT NOT NULL, created REAL NOT NULL)"
+            )
+            if self.ttl > 0:
+                self._db.execute("DELETE FROM codegen_cache WHERE created < ?", (self.clock() - self.ttl,))
+            self._db.commit()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def _expired(self, created: float) -> bool:
+        return self.ttl > 0 and self.clock() - created > self.ttl
+
+    def get(self, key: str) -> Optional[List[dict]]:
+        """Returns the cached blocks for key, or None on a miss."""
+        with self._lock:
+            item = self._entries.get(key)
+            if item is not None and self._expired(item[0]):
+                del self._entries[key]
+                item = None
+            if item is None and self._db is not None:
+                item = self._load(key)
+                if item is not None:
+                    self._remember(key, item)
+            if item is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return [dict(block) for block in item[1]]
+
+    def put(self, key: str, blocks: List[dict]):
+        """Caches blocks under key, evicting the least recently used entry if full."""
+        item = (self.clock(), [dict(block) for block in blocks])
+        with self._lock:
+            self._remember(key, item)
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO codegen_cache (key, blocks, created) VALUES (?, ?, ?)",
+                    (key, json.dumps(item[1]), item[0]),
+                )
+                self._db.commit()
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM codegen_cache")
+                self._db.commit()
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+            }
+
+    def close(self):
+        with self._lock:
+            if self._db is not None:
+                self._db.close()
+                self._db = None
+
+    def _remember(self, key: str, item: Tuple[float, List[dict]]):
+        """Insert into the memory tier. Caller holds the lock."""
+        self._entries[key] = item
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self.evictions += 1
+
+    def _load(self, key: str) -> Optional[Tuple[float, List[dict]]]:
+        """Read key from the disk tier, dropping it if expired. Caller holds the lock."""
+        row = self._db.execute("SELECT blocks, created FROM codegen_cache WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            return None
+        blocks, created = row
+        if self._expired(created):
+            self._db.execute("DELETE FROM codegen_cache WHERE key = ?", (key,))
+            self._db.commit()
+            return None
+        return created, json.loads(blocks)
+
+
+_cache: Optional[CodegenCache] = None
+_cache_lock = threading.Lock()
+
+
+def get_codegen_cache() -> Optional[CodegenCache]:
+    """Process-wide cache, or None unless IRONCLAW_CODEGEN_CACHE is enabled."""
+    global _cache
+    if os.environ.get("IRONCLAW_CODEGEN_CACHE", "").strip().lower() not in _TRUTHY:
+        return None
+    with _cache_lock:
+        if _cache is None:
+            _cache = CodegenCache(
+                max_entries=int(os.environ.get("IRONCLAW_CODEGEN_CACHE_SIZE", _DEFAULT_SIZE)),
+                ttl=float(os.environ.get("IRONCLAW_CODEGEN_CACHE_TTL", _DEFAULT_TTL)),
+                db_path=os.environ.get("IRONCLAW_CODEGEN_CACHE_DB") or None,
+            )
+        return _cache
@@ -1,65 +1,101 @@
 import os
-import re
-import json
-from typing import List, Union, Optional, Callable
-from pydantic import BaseModel, model_validator
-from google import genai
-import ollama as ollama_lib
-from interpreter import interpreter
-from src.sandbox.manager import SandboxManager
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Dict, List, Tuple, Union, Optional, Callable
+from src.sandbox.pool import ContainerPool, get_pool
+from src.sandbox.registry import SessionRegistry
 from src.sandbox.languages import DockerPython, DockerShell
-from src.agent.provider import get_provider_config, OllamaUnavailableError
-
-class CodeBlock(BaseModel):
-    code: str
-    language: str
-
-class CodeExecutionRequest(BaseModel):
-    status: str = "PENDING_APPROVAL"
-    blocks: List[CodeBlock]
-    reasoning: str = ""
-
-    @model_validator(mode='before')
-    @classmethod
-    def _coerce_blocks_string(cls, values):
-        """Small Ollama models sometimes JSON-encode `blocks` as a string.
-        Decode it back to a list so validation doesn't fail."""
-        if isinstance(values, dict) and isinstance(values.get('blocks'), str):
-            try:
-                values['blocks'] = json.loads(values['blocks'])
-            except (json.JSONDecodeError, ValueError):
-                pass
-        return values
+from src.sandbox.kernel import get_kernel
+from src.sandbox.shell import get_shell
+from src.sandbox.capture import SPILL_SUFFIX, OutputCapture, prune_spills
+from src.sandbox.warmup import Warmup
+from src.telemetry.metrics import StreamMeter, span
+from src.agent.provider import ProviderConfig, get_provider_config, OllamaUnavailableError
+from src.agent.clients import get_clients
+from src.agent.health import get_health_monitor
+from src.agent.tools.code_blocks import CodeBlock, CodeExecutionRequest, FenceParser, parse_code_blocks
+from src.agent.tools.block_runner import parallel_blocks_limit, run_blocks, tag_output
+from src.agent.tools.codegen_cache import get_codegen_cache, make_key, workspace_fingerprint
+from src.agent.tools.workspace import session_workspace_path, stop_workspace_tracking
+from src.agent.tools.workspace_index import OUTPUTS_DIR
+
+# Model used for code generation on every non-Ollama provider
+GEMINI_CODEGEN_MODEL = "gemini-2.5-flash"
 
 class SandboxedTool:
-    def __init__(self):
-        self.manager = SandboxManager()
-        self.container = self.manager.get_or_create_container()
+    def __init__(self, session_id: str = "default", pool: Optional[ContainerPool] = None):
+        self.session_id = session_id
+        self.pool = pool or get_pool()
+        self.manager = self.pool.manager
+        # Each session gets its own workspace subdirectory, mounted at /workspace
+        self.workspace_path = session_workspace_path(session_id, root=self.manager.workspace_path)
+        # Lease a pre-started container from the warm pool
+        self.container = self.pool.lease(session_id, workspace_path=self.workspace_path)
+        self._active = 0
+        self._active_lock = threading.Lock()
         
         # Create language classes (not instances) with container baked in
         container = self.container
         
         class BoundDockerPython(DockerPython):
             def __init__(self):
-                super().__init__(container)
+                super().__init__(container, session_id)
 
         class BoundDockerShell(DockerShell):
             def __init__(self):
-                super().__init__(container)
+                super().__init__(container, session_id)
 
-        interpreter.computer.languages = [BoundDockerPython, BoundDockerShell]
-        # OI used as execution engine only — LLM config not needed
+        # One interpreter per session so languages stay bound to this
+        # session's container. OI used as execution engine only — LLM
+        # config not needed. Imported here: loading it takes seconds.
+        from interpreter import OpenInterpreter
+        self.interpreter = OpenInterpreter()
+        self.interpreter.computer.languages = [BoundDockerPython, BoundDockerShell]
 
         # Configure interpreter behavior
         # auto_run=True so OI's own HITL loop doesn't interfere when
         # confirm_execution() calls interpreter.computer.run() directly.
         # Our HITL is enforced at the Pydantic AI layer via CodeExecutionRequest.
-        interpreter.auto_run = True
-        interpreter.offline = True
-        interpreter.safe_mode = False
+        self.interpreter.auto_run = True
+        self.interpreter.offline = True
+        self.interpreter.safe_mode = False
         
         # To store the last generated blocks for confirmation
         self.pending_blocks: List[CodeBlock] = []
+        # Language instances for parallel-execution slots
+        self._slot_languages = {}
+
+    def restart_kernel(self):
+        """Restart the persistent Python kernel in the sandbox container."""
+        get_kernel(self.container).restart()
+        for slot in {slot for _, slot in self._slot_languages if slot}:
+            get_kernel(self.container, slot).restart()
+
+    def release(self):
+        """Return this session's container to the pool and stop watching its workspace."""
+        stop_workspace_tracking(self.workspace_path)
+        self.pool.release(self.session_id)
+
+    @property
+    def busy(self) -> bool:
+        """
+        True while a task is being planned or executed, or its code is
+        waiting for approval (blocks eviction). Evicting a session with
+        pending blocks would lose them before the user can approve.
+        """
+        return self._active > 0 or bool(self.pending_blocks)
+
+    @contextmanager
+    def in_use(self):
+        with self._active_lock:
+            self._active += 1
+        try:
+            yield self
+        finally:
+            with self._active_lock:
+                self._active -= 1
 
     def _parse_code_blocks(self, text: str) -> List[CodeBlock]:
         """Extract fenced code blocks from LLM response text.
@@ -67,39 +103,101 @@ class SandboxedTool:
         Parses ```lang\\n...\\n``` fences, normalises language identifiers to
         what Open Interpreter's computer understands ("shell" or "python"), and
         falls back to treating the whole response as shell if no fences found.
+        A `sequential` word after the language (```python sequential) marks a
+        block that depends on the ones before it.
         """
-        code_blocks: List[CodeBlock] = []
-        pattern = re.compile(r"```(\w+)?\n(.*?)```", re.DOTALL)
-        for match in pattern.finditer(text):
-            lang = match.group(1) or "shell"
-            code = match.group(2).strip()
-            # Normalise language identifiers to what OI's computer understands
-            if lang in ("sh", "bash", "shell", "zsh"):
-                lang = "shell"
-            elif lang in ("py", "python"):
-                lang = "python"
-            if code:
-                code_blocks.append(CodeBlock(code=code, language=lang))
-
-        # Fallback: no fences found — treat entire response as shell code
-        if not code_blocks and text.strip():
-            code_blocks.append(CodeBlock(code=text.strip(), language="shell"))
-
-        return code_blocks
+        return parse_code_blocks(text)
+
+    def prewarm(self, language: str):
+        """Start the runtime for a language in the background, ahead of execution."""
+        if language == "python":
+            runtime = get_kernel(self.container)
+        elif language == "shell":
+            runtime = get_shell(self.container, self.session_id)
+        else:
+            return
+
+        def start():
+            try:
+                runtime.start()
+            except Exception as e:
+                print(f"[!] Could not prewarm {language} runtime: {e}")
+
+        threading.Thread(target=start, name=f"ironclaw-prewarm-{language}", daemon=True).start()
 
     def run_system_task(
         self,
         task: str,
         on_output: Optional[Callable[[str], None]] = None,
+        on_block: Optional[Callable[[CodeBlock], None]] = None,
     ) -> Union[CodeExecutionRequest, str]:
         """
         Generates code for a natural language task but does NOT execute it.
         Routes to Ollama (streaming) or Gemini based on provider config.
-        Returns a CodeExecutionRequest for human approval.
+        Returns a CodeExecutionRequest for human approval. With
+        IRONCLAW_CODEGEN_CACHE enabled, a previously generated answer for the
+        same task, model and workspace listing is proposed instead.
+
+        Each code block is passed to on_block as soon as its closing fence
+        has streamed in, and the runtime for its language is started then,
+        while later blocks are still being generated.
         """
+        config = get_provider_config()
+        # Every non-Ollama provider generates code with Gemini
+        if config.provider == "ollama":
+            provider, model = "ollama", config.ollama_codegen_model
+        else:
+            provider, model = "gemini", GEMINI_CODEGEN_MODEL
+        with span("codegen", provider, model) as timing:
+            result = self._generate(task, config, provider, model, on_output, on_block)
+            timing.set(
+                cached=getattr(result, "cached", False),
+                blocks=len(result.blocks) if isinstance(result, CodeExecutionRequest) else 0,
+            )
+        return result
+
+    def _generate(
+        self,
+        task: str,
+        config: ProviderConfig,
+        provider: str,
+        model: str,
+        on_output: Optional[Callable[[str], None]],
+        on_block: Optional[Callable[[CodeBlock], None]],
+    ) -> Union[CodeExecutionRequest, str]:
         self.pending_blocks = []
+        prewarmed = set()
 
-        config = get_provider_config()
+        def block_ready(block: CodeBlock):
+            if block.language not in prewarmed:
+                prewarmed.add(block.language)
+                self.prewarm(block.language)
+            if on_block:
+                try:
+                    on_block(block)
+                except Exception as e:
+                    print(f"[!] Code block callback failed: {e}")
+
+        parser = FenceParser(on_block=block_ready)
+        reasoning = f"To accomplish: {task}"
+
+        cache = get_codegen_cache()
+        cache_key = None
+        if cache is not None:
+            cache_key = make_key(task, config.provider, model, workspace_fingerprint(self.workspace_path))
+            cached = cache.get(cache_key)
+            if cached:
+                code_blocks = [CodeBlock(**block) for block in cached]
+                if on_output:
+                    on_output("".join(
+                        f"```{b.language}{' sequential' if b.sequential else ''}\n{b.code}\n```\n"
+                        for b in code_blocks
+                    ))
+                for block in code_blocks:
+                    block_ready(block)
+                # Still only a proposal: it goes through approval like fresh code
+                self.pending_blocks = code_blocks
+                return CodeExecutionRequest(blocks=code_blocks, reasoning=reasoning, cached=True)
 
         prompt = (
             f"Generate shell or Python code to accomplish the following task:\n\n"
@@ -107,89 +205,294 @@ class SandboxedTool:
             "Return ONLY the code blocks with proper language fences "
             "(e.g. ```python or ```bash), no explanations before or after."
         )
+        if parallel_blocks_limit() > 1:
+            prompt += (
+                "\nSeparate code blocks may run at the same time. If a block needs "
+                "files or results from earlier blocks, write `sequential` after its "
+                "language (e.g. ```python sequential)."
+            )
 
+        clients = get_clients(config)
         if config.provider == "ollama":
             # Ollama branch: stream tokens progressively through on_output callback
-            os.environ["OLLAMA_HOST"] = config.ollama_base_url
+            meter = StreamMeter(provider, model)
+            health = get_health_monitor(config)
+            # Raises at once while Ollama is known to be down
+            health.check()
             try:
-                stream = ollama_lib.generate(
+                stream = clients.ollama.generate(
                     model=config.ollama_codegen_model,
                     prompt=prompt,
                     stream=True,
                 )
-                text = ""
                 for chunk in stream:
                     token = chunk.get("response", "")
-                    text += token
+                    meter.token(token)
                     if on_output:
                         on_output(token)
+                    parser.feed(token)
+                    if chunk.get("done"):
+                        # Ollama's last chunk reports the token count and generation time
+                        meter.finish(chunk.get("eval_count"), chunk.get("eval_duration"))
+                        meter = None
             except Exception as e:
+                health.record_failure(e)
                 raise OllamaUnavailableError(
                     f"Ollama connection failed during code generation: {e}\n"
                     f"Check that Ollama is running at {config.ollama_base_url}"
                 ) from e
+            health.record_success()
+            if meter is not None:
+                meter.finish()
         else:
             # Gemini branch (handles "gemini", "anthropic", "openai" — existing behaviour)
-            api_key = os.environ.get("GEMINI_API_KEY")
-            client = genai.Client(api_key=api_key)
-            response = client.models.generate_content(
-                model="gemini-2.5-flash",
+            response = clients.genai.models.generate_content(
+                model=GEMINI_CODEGEN_MODEL,
                 contents=prompt,
             )
-            text = response.text or ""
+            parser.feed(response.text or "")
 
-        code_blocks = self._parse_code_blocks(text)
+        code_blocks = parser.close()
 
         if not code_blocks:
             return "No code was generated for this task."
 
+        if cache_key is not None:
+            cache.put(cache_key, [block.model_dump() for block in code_blocks])
+
         self.pending_blocks = code_blocks
-        reasoning = f"To accomplish: {task}"
         return CodeExecutionRequest(
             blocks=code_blocks,
             reasoning=reasoning,
         )
 
-    def confirm_execution(self, on_output: Optional[Callable[[str], None]] = None) -> str:
-        """
-        Executes the pending code blocks after human approval.
+    def _slot_language(self, language: str, slot: int):
+        """Language instance running in a parallel-execution slot's own session.
+
+        Slot 0 is the session's own kernel and shell.
         """
-        if not self.pending_blocks:
-            return "No pending code to execute."
-        
-        results = []
-        for block in self.pending_blocks:
+        key = (language, slot)
+        instance = self._slot_languages.get(key)
+        if instance is None:
+            cls = DockerPython if language == "python" else DockerShell
+            session_id = f"{self.session_id}#{slot}" if slot else self.session_id
+            instance = cls(self.container, session_id, slot=slot)
+            self._slot_languages[key] = instance
+        return instance
+
+    def _new_capture(self, run_id: str, index: int) -> OutputCapture:
+        """Capture for one block; overflow spills to .outputs/ in the workspace."""
+        name = f"{run_id}-{index + 1}{SPILL_SUFFIX}"
+        return OutputCapture(
+            spill_path=os.path.join(self.workspace_path, OUTPUTS_DIR, name),
+            spill_name=f"/workspace/{OUTPUTS_DIR}/{name}",
+        )
+
+    def _run_block(
+        self,
+        block: CodeBlock,
+        capture: OutputCapture,
+        slot: int = 0,
+        on_output: Optional[Callable[[str], None]] = None,
+        label: str = "",
+    ) -> str:
+        with span("block_exec", language=block.language, slot=slot) as timing:
+            result, exit_code = self._execute_block(block, capture, slot, on_output, label)
+            timing.set(exit_code=exit_code, output_bytes=capture.total_bytes)
+        return result
+
+    def _execute_block(
+        self,
+        block: CodeBlock,
+        capture: OutputCapture,
+        slot: int,
+        on_output: Optional[Callable[[str], None]],
+        label: str,
+    ) -> Tuple[str, Optional[int]]:
+        if slot == 0:
             # Execute each block using the interpreter's computer
-            # This ensures it uses the configured Docker languages
-            output = interpreter.computer.run(block.language, block.code)
-            
-            # Format output
-            result_str = ""
+            # This ensures it uses the configured Docker languages.
+            # stream=True so output reaches on_output while the block runs.
+            output = self.interpreter.computer.run(block.language, block.code, stream=True)
+        else:
+            output = self._slot_language(block.language, slot).run(block.code)
+
+        # Format output. Only a bounded head and tail are kept; the rest
+        # is streamed to on_output and, if large, to the spill file.
+        exit_code = None
+        with capture:
             for chunk in output:
-                if chunk.get("type") == "console":
+                if chunk.get("type") != "console":
+                    continue
+                if chunk.get("format") == "exit_code":
+                    exit_code = chunk.get("content")
+                elif chunk.get("format", "output") == "output":
                     content = chunk.get("content", "")
-                    result_str += content
+                    capture.write(content)
                     if on_output and content:
                         on_output(content)
-            
-            results.append(f"--- Output ({block.language}) ---\n{result_str}")
-        
+
+        name = f"Output {label}" if label else "Output"
+        details = [block.language]
+        if slot:
+            details.append(f"slot {slot}")
+        if exit_code is not None:
+            details.append(f"exit code {exit_code}")
+        header = f"--- {name} ({', '.join(details)}) ---"
+        return f"{header}\n{capture.summary()}", exit_code
+
+    def confirm_execution(
+        self,
+        on_output: Optional[Callable[[str], None]] = None,
+        max_parallel: Optional[int] = None,
+    ) -> str:
+        """
+        Executes the pending code blocks after human approval.
+
+        Each block's result holds at most the head and tail of its output
+        (see OutputCapture); output beyond that is saved under
+        /workspace/.outputs/ and the result says where. The oldest saved
+        outputs are pruned first (see prune_spills).
+
+        With max_parallel (default IRONCLAW_PARALLEL_BLOCKS) above 1,
+        independent blocks run concurrently and each line of streamed output
+        is tagged with its block number, e.g. `[#2]`. Blocks on slots above 0
+        start in the session's current cwd and environment (not its Python
+        variables), and their result header names the slot. Results are
+        still returned in block order.
+        """
+        if not self.pending_blocks:
+            return "No pending code to execute."
+
+        blocks = self.pending_blocks
+        if max_parallel is None:
+            max_parallel = parallel_blocks_limit()
+        run_id = f"{time.strftime('%Y%m%d-%H%M%S')}-{uuid.uuid4().hex[:6]}"
+        # Make room for this run's spill files before creating its captures
+        prune_spills(os.path.join(self.workspace_path, OUTPUTS_DIR))
+
+        if max_parallel <= 1 or len(blocks) <= 1:
+            results = [
+                self._run_block(block, self._new_capture(run_id, index), on_output=on_output)
+                for index, block in enumerate(blocks)
+            ]
+        else:
+            lock = threading.Lock()
+            # Only python and shell have slot sessions; anything else runs alone on slot 0
+            sequential = [
+                block.sequential or block.language not in ("python", "shell")
+                for block in blocks
+            ]
+            # Slots above 0 start from the session's cwd and environment as
+            # they are now, before any of these blocks has run
+            states = {
+                language: self._slot_language(language, 0).get_state()
+                for language in {b.language for b, seq in zip(blocks, sequential) if not seq}
+            }
+
+            def execute(index: int, slot: int) -> str:
+                block = blocks[index]
+                label = f"[#{index + 1}]"
+                if slot:
+                    self._slot_language(block.language, slot).set_state(states[block.language])
+                emit = tag_output(on_output, label, lock) if on_output else None
+                capture = self._new_capture(run_id, index)
+                return self._run_block(block, capture, slot, on_output=emit, label=label)
+
+            results = run_blocks(sequential, execute, max_parallel)
+
         self.pending_blocks = [] # Clear after execution
         return "\n".join(results)
 
-# Instance to be used
-_sandbox_tool = None
+# Live sandboxes, one per session. Idle ones are released after
+# IRONCLAW_SANDBOX_IDLE_TTL seconds; at most IRONCLAW_MAX_SANDBOXES live at once.
+_sandbox_tools: SessionRegistry[SandboxedTool] = SessionRegistry(
+    factory=SandboxedTool,
+    on_evict=lambda tool: tool.release(),
+)
+
+_DEFAULT_WARMUP_TIMEOUT = 600.0  # seconds; covers a first image build
+
+# Startup warm-ups: None warms the container pool, a session id that
+# session's own sandbox and runtimes
+_warmups: Dict[Optional[str], Warmup] = {}
+_warmups_lock = threading.Lock()
+
+def _warm_sandbox(session_id: Optional[str]):
+    pool = get_pool()
+    pool.manager.ensure_image()
+    if session_id is None:
+        timeout = float(os.environ.get("IRONCLAW_WARMUP_TIMEOUT", _DEFAULT_WARMUP_TIMEOUT))
+        if pool.size and not pool.wait_until_warm(timeout=timeout, count=1):
+            raise TimeoutError(f"no sandbox container started within {timeout:.0f}s")
+        return
+    # Not get_sandbox_tool(): that would wait on this very warm-up
+    tool = _sandbox_tools.get(session_id)
+    get_kernel(tool.container).start()
+    get_shell(tool.container, session_id).start()
+
+def start_sandbox_warmup(session_id: Optional[str] = None) -> Warmup:
+    """
+    Starts warming the sandbox in the background, or returns the warm-up
+    already under way. With a session id, that session's container, Python
+    kernel and shell are started; without, the shared container pool.
+    """
+    with _warmups_lock:
+        warmup = _warmups.get(session_id)
+        if warmup is None:
+            name = "sandbox warm-up" if session_id is None else f"sandbox warm-up for {session_id}"
+            warmup = Warmup(lambda: _warm_sandbox(session_id), name=name)
+            _warmups[session_id] = warmup
+    return warmup.start()
+
+def sandbox_status(session_id: Optional[str] = None) -> str:
+    """Human-readable readiness of the sandbox warm-up."""
+    warmup = _warmups.get(session_id)
+    return f"Sandbox: {warmup.describe() if warmup else 'starts on first use'}"
+
+def _wait_for_warmup(session_id: str):
+    """A request arriving mid-warm-up waits for it rather than racing it."""
+    for key in (None, session_id):
+        warmup = _warmups.get(key)
+        if warmup is not None and warmup.in_flight:
+            warmup.wait()
+
+def get_sandbox_tool(session_id: str = "default") -> SandboxedTool:
+    _wait_for_warmup(session_id)
+    return _sandbox_tools.get(session_id)
+
+def get_pending_blocks(session_id: str = "default") -> List[CodeBlock]:
+    """Blocks awaiting approval for a session, without starting a sandbox for it."""
+    tool = _sandbox_tools.peek(session_id)
+    return tool.pending_blocks if tool else []
+
+def discard_pending_blocks(session_id: str = "default"):
+    """Drop a session's unapproved blocks (e.g. after rejection) so its sandbox can be evicted again."""
+    tool = _sandbox_tools.peek(session_id)
+    if tool is not None:
+        tool.pending_blocks = []
 
-def get_sandbox_tool():
-    global _sandbox_tool
-    if _sandbox_tool is None:
-        _sandbox_tool = SandboxedTool()
-    return _sandbox_tool
+def release_sandbox_tool(session_id: str = "default") -> bool:
+    """Release a session's sandbox now instead of waiting for idle eviction."""
+    return _sandbox_tools.remove(session_id)
 
-def run_system_task(task: str, on_output: Optional[Callable[[str], None]] = None) -> Union[CodeExecutionRequest, str]:
+def run_system_task(
+    task: str,
+    on_output: Optional[Callable[[str], None]] = None,
+    session_id: str = "default",
+    on_block: Optional[Callable[[CodeBlock], None]] = None,
+) -> Union[CodeExecutionRequest, str]:
     """Plan a system task and request approval for code execution."""
-    return get_sandbox_tool().run_system_task(task, on_output=on_output)
+    tool = get_sandbox_tool(session_id)
+    with tool.in_use():
+        return tool.run_system_task(task, on_output=on_output, on_block=on_block)
 
-def confirm_execution(on_output: Optional[Callable[[str], None]] = None) -> str:
+def confirm_execution(
+    on_output: Optional[Callable[[str], None]] = None,
+    session_id: str = "default",
+    max_parallel: Optional[int] = None,
+) -> str:
     """Execute the previously planned and approved system task."""
-    return get_sandbox_tool().confirm_execution(on_output=on_output)
+    tool = get_sandbox_tool(session_id)
+    with tool.in_use():
+        return tool.confirm_execution(on_output=on_output, max_parallel=max_parallel)
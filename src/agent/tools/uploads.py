@@ -0,0 +1,272 @@
+"""
+Content-addressed storage for uploaded files.
+
+Uploads are streamed in chunks into a blob store (IRONCLAW_BLOB_DIR, default
+`workspace/.blobs`) under their SHA-256, while the checksum is computed on
+the fly. When the upload's temporary file is already on the blob store's
+filesystem it is reflinked or, failing that, hardlinked into the store
+instead of copied. A hardlinked blob shares its inode with the uploader's
+temporary file, so the store doesn't make it read-only.
+
+Each workspace gets its own copy of the blob, never a hardlink: sandbox code
+runs as the workspace owner and could make a linked file writable again,
+editing the blob and every other session's copy in place. Where the
+filesystem supports it (btrfs, XFS) the copy is a reflink, which shares
+disk blocks copy-on-write, so uploading the same file again, or into several
+sessions, costs no extra disk space. Elsewhere (e.g. ext4) it is a plain
+copy: each upload is stored twice, once in the store and once per workspace
+it is placed in. Set IRONCLAW_UPLOAD_LINK=0 to always make plain copies.
+"""
+
+import hashlib
+import os
+import shutil
+import stat
+import threading
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, Optional, Tuple
+
+from src.agent.tools.workspace import WORKSPACE_ROOT
+
+_CHUNK = 1024 * 1024
+_READ_ONLY = stat.S_IRUSR | stat.S_IRGRP | stat.S_IROTH
+_GC_MIN_AGE = 3600.0  # seconds an unused blob is kept
+# ioctl(2) request cloning one file's extents into another (linux/fs.h)
+_FICLONE = 0x40049409
+
+# Called with (bytes_done, total_bytes or None) as data is stored
+ProgressCallback = Callable[[int, Optional[int]], None]
+
+
+@dataclass
+class UploadResult:
+    name: str            # file name inside the workspace
+    path: str            # host path of the workspace file
+    sha256: str
+    size: int
+    deduplicated: bool   # content was already in the blob store
+    cloned: bool         # reflinked to the blob (False: plain copy)
+
+
+class BlobStore:
+    """Directory of files named by their SHA-256; read-only unless hardlinked
+    from an upload.
+
+    Args:
+        root: Store directory. Defaults to IRONCLAW_BLOB_DIR or
+            `<workspace root>/.blobs`, on the same filesystem as the
+            workspaces so blobs can be reflinked into them.
+    """
+
+    def __init__(self, root: Optional[str] = None):
+        root = root or os.environ.get("IRONCLAW_BLOB_DIR") or os.path.join(WORKSPACE_ROOT, ".blobs")
+        self.root = os.path.abspath(root)
+        self._tmp = os.path.join(self.root, "tmp")
+        os.makedirs(self._tmp, exist_ok=True)
+        # Guards blobs against collect_garbage() while they're stored or placed
+        self._lock = threading.Lock()
+        self._in_use: Dict[str, int] = {}
+
+    def blob_path(self, digest: str) -> str:
+        return os.path.join(self.root, digest[:2], digest)
+
+    def _touch(self, digest: str) -> bool:
+        """Mark an existing blob as used now. Returns False if there is none."""
+        with self._lock:
+            try:
+                os.utime(self.blob_path(digest))
+            except FileNotFoundError:
+                return False
+            return True
+
+    def _commit(self, tmp_path: str, digest: str, owned: bool = True) -> bool:
+        """Move a finished temp file into place. Returns True if the blob already existed.
+
+        owned is False for a hardlink to someone else's file, whose mode
+        isn't the store's to change.
+        """
+        target = self.blob_path(digest)
+        if self._touch(digest):
+            os.remove(tmp_path)
+            return True
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        if owned:
+            os.chmod(tmp_path, _READ_ONLY)
+        with self._lock:
+            os.replace(tmp_path, target)
+            # A linked upload keeps its source's mtime; collect_garbage() goes by it
+            os.utime(target)
+        return False
+
+    def _tmp_path(self) -> str:
+        return os.path.join(self._tmp, uuid.uuid4().hex)
+
+    def ingest_path(self, source: str, progress: Optional[ProgressCallback] = None) -> Tuple[str, int, bool]:
+        """Store a file by content.
+
+        Returns:
+            (sha256, size, existed) where existed means no new blob was written.
+        """
+        total = os.path.getsize(source)
+        if os.stat(source).st_dev == os.stat(self.root).st_dev:
+            # Same filesystem: hash in place and link instead of copying
+            digest = hashlib.sha256()
+            done = 0
+            with open(source, "rb") as f:
+                while chunk := f.read(_CHUNK):
+                    digest.update(chunk)
+                    done += len(chunk)
+                    if progress:
+                        progress(done, total)
+            sha = digest.hexdigest()
+            if self._touch(sha):
+                return sha, done, True
+            tmp_path = self._tmp_path()
+            owned = _reflink(source, tmp_path)
+            if not owned:
+                try:
+                    os.link(source, tmp_path)
+                except OSError:
+                    shutil.copyfile(source, tmp_path)
+                    owned = True
+            return sha, done, self._commit(tmp_path, sha, owned=owned)
+
+        with open(source, "rb") as f:
+            return self._ingest_stream(f.read, total, progress)
+
+    def ingest_bytes(self, data: bytes, progress: Optional[ProgressCallback] = None) -> Tuple[str, int, bool]:
+        """Store in-memory content. Returns (sha256, size, existed)."""
+        view = memoryview(data)
+        offset = 0
+
+        def read(n: int) -> bytes:
+            nonlocal offset
+            chunk = view[offset:offset + n]
+            offset += len(chunk)
+            return bytes(chunk)
+
+        return self._ingest_stream(read, len(data), progress)
+
+    def _ingest_stream(self, read, total: Optional[int], progress: Optional[ProgressCallback]) -> Tuple[str, int, bool]:
+        digest = hashlib.sha256()
+        done = 0
+        tmp_path = self._tmp_path()
+        try:
+            with open(tmp_path, "wb") as out:
+                while chunk := read(_CHUNK):
+                    digest.update(chunk)
+                    out.write(chunk)
+                    done += len(chunk)
+                    if progress:
+                        progress(done, total)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        sha = digest.hexdigest()
+        return sha, done, self._commit(tmp_path, sha)
+
+    def place(self, digest: str, target: str, clone: bool = True) -> bool:
+        """Put a private, writable copy of a blob at target, replacing any
+        existing file atomically.
+
+        Returns True if the copy is a reflink, False if the data was copied.
+        """
+        blob = self.blob_path(digest)
+        tmp_target = os.path.join(os.path.dirname(target), f".{os.path.basename(target)}.{uuid.uuid4().hex}.part")
+        with self._lock:
+            self._in_use[digest] = self._in_use.get(digest, 0) + 1
+        try:
+            cloned = clone and _reflink(blob, tmp_target)
+            if not cloned:
+                shutil.copyfile(blob, tmp_target)
+            os.replace(tmp_target, target)
+        finally:
+            with self._lock:
+                self._in_use[digest] -= 1
+                if not self._in_use[digest]:
+                    del self._in_use[digest]
+                # Marks the blob as used for collect_garbage()
+                if os.path.exists(blob):
+                    os.utime(blob)
+        return cloned
+
+    def collect_garbage(self, min_age: float = _GC_MIN_AGE) -> int:
+        """
+        Delete blobs not stored or placed for min_age seconds. Blobs being
+        placed are skipped. Returns how many were removed.
+        """
+        removed = 0
+        cutoff = time.time() - min_age
+        for dirpath, dirnames, filenames in os.walk(self.root):
+            if dirpath == self._tmp:
+                dirnames[:] = []
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                with self._lock:
+                    if name in self._in_use:
+                        continue
+                    try:
+                        if os.stat(path).st_mtime < cutoff:
+                            os.remove(path)
+                            removed += 1
+                    except FileNotFoundError:
+                        continue
+        return removed
+
+
+def _reflink(source: str, target: str) -> bool:
+    """Clone source to a new file at target sharing its blocks. False if unsupported."""
+    try:
+        import fcntl  # not on Windows
+        with open(source, "rb") as src, open(target, "wb") as dst:
+            fcntl.ioctl(dst.fileno(), _FICLONE, src.fileno())
+        return True
+    except (ImportError, OSError):
+        if os.path.exists(target):
+            os.remove(target)
+        return False
+
+
+def store_upload(
+    store: BlobStore,
+    workspace_path: str,
+    name: str,
+    source_path: Optional[str] = None,
+    content: Optional[bytes] = None,
+    progress: Optional[ProgressCallback] = None,
+) -> UploadResult:
+    """Stream one upload into the blob store and place it in the workspace.
+
+    Args:
+        name: File name; any directory part is dropped.
+        source_path: Temporary file holding the upload, if on disk.
+        content: Upload bytes, when not on disk.
+    """
+    name = os.path.basename(name)
+    if source_path and os.path.exists(source_path):
+        sha, size, existed = store.ingest_path(source_path, progress)
+    elif content is not None:
+        sha, size, existed = store.ingest_bytes(content, progress)
+    else:
+        raise ValueError(f"Upload {name!r} has no content")
+    target = os.path.join(workspace_path, name)
+    clone = os.environ.get("IRONCLAW_UPLOAD_LINK", "1").strip().lower() not in ("0", "false", "no", "off")
+    cloned = store.place(sha, target, clone=clone)
+    return UploadResult(name=name, path=target, sha256=sha, size=size, deduplicated=existed, cloned=cloned)
+
+
+_store: Optional[BlobStore] = None
+_store_lock = threading.Lock()
+
+
+def get_blob_store() -> BlobStore:
+    """Process-wide blob store. Sweeps unreferenced blobs in the background once."""
+    global _store
+    with _store_lock:
+        if _store is None:
+            _store = BlobStore()
+            threading.Thread(target=_store.collect_garbage, name="ironclaw-blob-gc", daemon=True).start()
+        return _store
@@ -1,39 +1,72 @@
+import hashlib
 import os
+import re
 from typing import List, Dict, Set
+from src.agent.tools.workspace_index import get_workspace_index
+from src.agent.tools.workspace_diff import WorkspaceChanges, close_workspace_differ, get_workspace_differ
+from src.telemetry.metrics import span
 
-def list_workspace_files() -> List[str]:
+WORKSPACE_ROOT = "./workspace"
+
+def session_workspace_path(session_id: str, root: str = WORKSPACE_ROOT) -> str:
+    """
+    Returns the workspace subdirectory for a session, creating it if needed.
+    Session ids that aren't safe directory names are sanitised and suffixed
+    with a short hash so distinct ids never share a directory.
+    """
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", session_id).lstrip(".") or "session"
+    if safe != session_id:
+        safe = f"{safe}-{hashlib.sha1(session_id.encode('utf-8')).hexdigest()[:8]}"
+    path = os.path.join(root, safe)
+    os.makedirs(path, exist_ok=True)
+    return path
+
+def list_workspace_files(workspace_path: str = WORKSPACE_ROOT) -> List[str]:
     """
-    Returns a list of all files in the ./workspace directory.
+    Returns the relative paths of all files in the workspace, including
+    subdirectories, from the workspace index.
     If the directory does not exist, it creates it and returns an empty list.
     """
-    workspace_path = "./workspace"
-    if not os.path.exists(workspace_path):
-        os.makedirs(workspace_path)
-        return []
-    
-    # List all files (not directories)
-    files = [f for f in os.listdir(workspace_path) if os.path.isfile(os.path.join(workspace_path, f))]
-    return files
-
-def get_workspace_snapshot() -> Dict[str, float]:
-    """
-    Returns a dictionary of filenames and their modification times in the ./workspace directory.
-    """
-    workspace_path = "./workspace"
-    if not os.path.exists(workspace_path):
-        os.makedirs(workspace_path)
-        return {}
-    
-    snapshot = {}
-    for f in os.listdir(workspace_path):
-        path = os.path.join(workspace_path, f)
-        if os.path.isfile(path):
-            snapshot[f] = os.path.getmtime(path)
-    return snapshot
+    return get_workspace_index(workspace_path).files()
+
+def get_workspace_token(workspace_path: str = WORKSPACE_ROOT) -> int:
+    """
+    Returns a change token for the workspace; pass it to
+    get_workspace_changes() later to learn what changed in between.
+    """
+    with span("workspace_snapshot"):
+        return get_workspace_differ(workspace_path).baseline()
+
+def get_workspace_changes(workspace_path: str, token: int) -> WorkspaceChanges:
+    """
+    Returns the files added, modified, deleted and renamed since `token`.
+    Only files whose stat changed are examined, and their content is
+    compared by hash, so touched-but-identical files are not reported.
+    """
+    with span("workspace_diff"):
+        return get_workspace_differ(workspace_path).diff(token)
+
+def stop_workspace_tracking(workspace_path: str) -> bool:
+    """
+    Releases the workspace's index (its inotify instance and thread) and
+    differ. They are rebuilt on next use.
+    """
+    return close_workspace_differ(workspace_path)
+
+def get_workspace_snapshot(workspace_path: str = WORKSPACE_ROOT) -> Dict[str, float]:
+    """
+    Returns a dictionary of file paths and their modification times in the workspace directory.
+    """
+    with span("workspace_snapshot"):
+        return {
+            path: entry.mtime_ns / 1e9
+            for path, entry in get_workspace_index(workspace_path).snapshot().items()
+        }
 
 def get_workspace_diff(old_snapshot: Dict[str, float], new_snapshot: Dict[str, float]) -> Set[str]:
     """
     Returns a set of files that were added or modified between two snapshots.
+    Compares mtimes only; prefer get_workspace_changes().
     """
     diff = set()
     for f, mtime in new_snapshot.items():
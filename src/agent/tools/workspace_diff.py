@@ -0,0 +1,192 @@
+"""
+Content-aware workspace diffs.
+
+The workspace index reports files whose stat signature changed. That alone
+misreports: `touch` looks like a modification, and deletions or renames are
+not told apart from new files. WorkspaceDiffer classifies those candidates as
+added, modified, deleted or renamed by comparing blake2b content hashes.
+
+Only files whose signature changed are hashed: the new content of every
+added or modified file is hashed when a diff is taken, and cached per path
+against the stat signature (size, mtime_ns, inode, ctime_ns), so the next
+diff knows what that file held. A file with no cached hash (one that was
+already in the workspace and hasn't changed since tracking started) falls
+back to the signature: it counts as modified if its size, mtime or inode
+changed, so a `touch` of such a file is reported once. Files over
+IRONCLAW_HASH_MAX_BYTES (default 64 MiB) are never hashed and are compared
+by signature alone.
+"""
+
+import hashlib
+import os
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from src.agent.tools.workspace_index import FileEntry, WorkspaceIndex, close_workspace_index, get_workspace_index
+
+_DEFAULT_MAX_BYTES = 64 * 1024 * 1024
+_CHUNK = 1024 * 1024
+
+
+def hash_file(path: str) -> str:
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        while chunk := f.read(_CHUNK):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+@dataclass
+class WorkspaceChanges:
+    added: List[str] = field(default_factory=list)
+    modified: List[str] = field(default_factory=list)
+    deleted: List[str] = field(default_factory=list)
+    renamed: List[Tuple[str, str]] = field(default_factory=list)  # (old, new)
+
+    def __bool__(self) -> bool:
+        return bool(self.added or self.modified or self.deleted or self.renamed)
+
+    @property
+    def changed_files(self) -> List[str]:
+        """Paths that now hold new or different content (added, modified, rename targets)."""
+        return sorted(self.added + self.modified + [new for _, new in self.renamed])
+
+
+class WorkspaceDiffer:
+    """Classifies workspace index changes using cached content hashes.
+
+    Args:
+        index: WorkspaceIndex for the workspace.
+        max_hash_bytes: Files larger than this are compared by stat
+            signature only. Defaults to IRONCLAW_HASH_MAX_BYTES (64 MiB).
+    """
+
+    def __init__(self, index: WorkspaceIndex, max_hash_bytes: Optional[int] = None):
+        self.index = index
+        if max_hash_bytes is None:
+            max_hash_bytes = int(os.environ.get("IRONCLAW_HASH_MAX_BYTES", _DEFAULT_MAX_BYTES))
+        self.max_hash_bytes = max_hash_bytes
+        self._hashes: Dict[str, Tuple[FileEntry, str]] = {}
+        self._lock = threading.Lock()
+
+    def cached_digest(self, path: str, entry: FileEntry) -> Optional[str]:
+        """Hash of path's content when it had `entry`, if that was ever computed."""
+        with self._lock:
+            cached = self._hashes.get(path)
+        return cached[1] if cached and cached[0] == entry else None
+
+    def digest(self, path: str, entry: FileEntry) -> Optional[str]:
+        """Content hash for path at `entry`, computing it if needed.
+
+        Returns None for files over the size limit, or if the file changed
+        or vanished while being read.
+        """
+        cached = self.cached_digest(path, entry)
+        if cached is not None:
+            return cached
+        if entry.size > self.max_hash_bytes:
+            return None
+        full = os.path.join(self.index.root, path)
+        try:
+            value = hash_file(full)
+            if FileEntry.from_stat(os.stat(full, follow_symlinks=False)) != entry:
+                return None
+        except OSError:
+            return None
+        with self._lock:
+            self._hashes[path] = (entry, value)
+        return value
+
+    def baseline(self) -> int:
+        """Token for a later diff(). Reads no file content."""
+        return self.index.token()
+
+    def diff(self, token: int) -> WorkspaceChanges:
+        """Real changes since `token` (from index.token() or baseline())."""
+        _, pairs = self.index.changes_between(token)
+        changes = WorkspaceChanges()
+        added: Dict[str, FileEntry] = {}
+        deleted: Dict[str, FileEntry] = {}
+        old_digests: Dict[str, Optional[str]] = {}
+
+        for path, (before, after) in pairs.items():
+            if before is not None:
+                old_digests[path] = self.cached_digest(path, before)
+            if before is None and after is not None:
+                added[path] = after
+                # Hashed now so a later diff knows what it held
+                self.digest(path, after)
+            elif before is not None and after is None:
+                deleted[path] = before
+            elif before is not None and after is not None:
+                old = old_digests[path]
+                new = self.digest(path, after)
+                if old is None or new is None:
+                    # Content before the change was never hashed (or is too
+                    # big to hash): trust the signature unless only ctime
+                    # moved (chmod, rename back)
+                    if before[:3] != after[:3]:
+                        changes.modified.append(path)
+                elif old != new:
+                    changes.modified.append(path)
+
+        # Pair deletions with additions: same inode first (a plain rename;
+        # inodes get reused, so a known old digest must still match), then
+        # same content (copy + delete, or a move across filesystems)
+        by_inode = {entry.inode: path for path, entry in added.items()}
+        for old_path, before in list(deleted.items()):
+            new_path = by_inode.pop(before.inode, None)
+            if new_path is None:
+                continue
+            old = old_digests.get(old_path)
+            if old is None or old == self.digest(new_path, added[new_path]):
+                changes.renamed.append((old_path, new_path))
+                del added[new_path], deleted[old_path]
+        if deleted and added:
+            by_digest: Dict[str, str] = {}
+            for path, entry in added.items():
+                value = self.digest(path, entry)
+                if value is not None:
+                    by_digest.setdefault(value, path)
+            for old_path in list(deleted):
+                old = old_digests.get(old_path)
+                new_path = by_digest.pop(old, None) if old is not None else None
+                if new_path is not None:
+                    changes.renamed.append((old_path, new_path))
+                    del added[new_path], deleted[old_path]
+
+        with self._lock:
+            for path in deleted:
+                self._hashes.pop(path, None)
+            for old_path, _ in changes.renamed:
+                self._hashes.pop(old_path, None)
+
+        changes.added = sorted(added)
+        changes.modified.sort()
+        changes.deleted = sorted(deleted)
+        changes.renamed.sort()
+        return changes
+
+
+_differs: Dict[str, WorkspaceDiffer] = {}
+_differs_lock = threading.Lock()
+
+
+def get_workspace_differ(root: str) -> WorkspaceDiffer:
+    """Shared differ for a workspace directory."""
+    index = get_workspace_index(root)
+    with _differs_lock:
+        differ = _differs.get(index.root)
+        if differ is None or differ.index is not index:
+            differ = WorkspaceDiffer(index)
+            _differs[index.root] = differ
+        return differ
+
+
+def close_workspace_differ(root: str) -> bool:
+    """Forget a workspace's differ and stop its index. Returns False if it had no index."""
+    key = os.path.abspath(root)
+    with _differs_lock:
+        _differs.pop(key, None)
+    return close_workspace_index(key)
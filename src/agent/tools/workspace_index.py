@@ -0,0 +1,464 @@
+"""
+Event-driven index of a workspace directory tree.
+
+Snapshotting a workspace with listdir+stat before and after every turn costs
+O(files) syscalls and misses subdirectories. A WorkspaceIndex instead keeps
+(size, mtime_ns, inode, ctime_ns) for every file under the workspace,
+recursively, and is kept current by inotify on Linux. Every change is
+appended to a log under a monotonically increasing token, so "what changed
+since token T" costs O(changes). Changes are reported by stat signature;
+workspace_diff decides which of them changed content. A periodic full
+rescan (IRONCLAW_WORKSPACE_RESCAN seconds, default 30) catches anything
+inotify cannot see, e.g. bind mounts on Docker Desktop, and is the only
+mechanism where inotify is unavailable.
+"""
+
+import ctypes
+import ctypes.util
+import errno
+import os
+import select
+import stat
+import struct
+import sys
+import threading
+import time
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+_DEFAULT_RESCAN_INTERVAL = 30.0  # seconds
+_DEFAULT_MAX_LOG = 100_000
+
+# Where execution output beyond the head/tail kept in results is spilled
+# (see OutputCapture). Those logs are not workspace content: the index
+# skips this top-level directory, so they never show up in listings or diffs.
+OUTPUTS_DIR = ".outputs"
+
+# inotify(7) constants
+IN_MODIFY = 0x00000002
+IN_ATTRIB = 0x00000004
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_FROM = 0x00000040
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_DELETE = 0x00000200
+IN_DELETE_SELF = 0x00000400
+IN_MOVE_SELF = 0x00000800
+IN_Q_OVERFLOW = 0x00004000
+IN_IGNORED = 0x00008000
+IN_ONLYDIR = 0x01000000
+IN_ISDIR = 0x40000000
+IN_NONBLOCK = os.O_NONBLOCK
+IN_CLOEXEC = getattr(os, "O_CLOEXEC", 0o2000000)
+
+_WATCH_MASK = (
+    IN_MODIFY | IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO
+    | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF | IN_ONLYDIR
+)
+_EVENT_HEADER = struct.Struct("iIII")  # wd, mask, cookie, len
+
+
+class FileEntry(NamedTuple):
+    size: int
+    mtime_ns: int
+    inode: int
+    # Changes on every write, even one that restores mtime afterwards
+    ctime_ns: int = 0
+
+    @classmethod
+    def from_stat(cls, st: os.stat_result) -> "FileEntry":
+        return cls(st.st_size, st.st_mtime_ns, st.st_ino, st.st_ctime_ns)
+
+
+class _Inotify:
+    """Minimal ctypes binding to the Linux inotify API."""
+
+    def __init__(self):
+        libc = ctypes.CDLL(ctypes.util.find_library("c") or "libc.so.6", use_errno=True)
+        self._libc = libc
+        self.fd = libc.inotify_init1(IN_NONBLOCK | IN_CLOEXEC)
+        if self.fd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err))
+
+    def add_watch(self, path: str) -> int:
+        wd = self._libc.inotify_add_watch(self.fd, os.fsencode(path), _WATCH_MASK)
+        if wd < 0:
+            err = ctypes.get_errno()
+            raise OSError(err, os.strerror(err), path)
+        return wd
+
+    def rm_watch(self, wd: int):
+        self._libc.inotify_rm_watch(self.fd, wd)
+
+    def read(self) -> List[Tuple[int, int, str]]:
+        """All queued events as (wd, mask, name), without blocking."""
+        events = []
+        while True:
+            try:
+                data = os.read(self.fd, 64 * 1024)
+            except BlockingIOError:
+                return events
+            offset = 0
+            while offset < len(data):
+                wd, mask, _, length = _EVENT_HEADER.unpack_from(data, offset)
+                offset += _EVENT_HEADER.size
+                name = data[offset:offset + length].rstrip(b"\0")
+                offset += length
+                events.append((wd, mask, os.fsdecode(name)))
+
+    def close(self):
+        os.close(self.fd)
+
+
+def _join(rel_dir: str, name: str) -> str:
+    return f"{rel_dir}/{name}" if rel_dir else name
+
+
+class WorkspaceIndex:
+    """Recursive file index for one workspace directory.
+
+    Paths are relative to the root and use "/" separators.
+
+    Args:
+        root: Directory to index.
+        rescan_interval: Seconds between full fallback rescans. Defaults to
+            IRONCLAW_WORKSPACE_RESCAN (30).
+        use_inotify: Force inotify on or off. Defaults to on where available.
+        max_log: Changes retained for changes_since(); older tokens get a
+            full listing instead.
+        exclude: Top-level directory names left out of the index.
+            Defaults to OUTPUTS_DIR.
+    """
+
+    def __init__(
+        self,
+        root: str,
+        rescan_interval: Optional[float] = None,
+        use_inotify: Optional[bool] = None,
+        max_log: int = _DEFAULT_MAX_LOG,
+        exclude: Optional[Set[str]] = None,
+    ):
+        self.root = os.path.abspath(root)
+        self.exclude = frozenset({OUTPUTS_DIR} if exclude is None else exclude)
+        if rescan_interval is None:
+            rescan_interval = float(os.environ.get("IRONCLAW_WORKSPACE_RESCAN", _DEFAULT_RESCAN_INTERVAL))
+        self.rescan_interval = rescan_interval
+        self.max_log = max_log
+        self._entries: Dict[str, FileEntry] = {}
+        # (path, entry before the change) for each token after _log_base
+        self._log: List[Tuple[str, Optional[FileEntry]]] = []
+        self._log_base = 0
+        self._lock = threading.RLock()
+        self._inotify: Optional[_Inotify] = None
+        if use_inotify is None:
+            use_inotify = sys.platform.startswith("linux")
+        if use_inotify:
+            try:
+                self._inotify = _Inotify()
+            except (OSError, AttributeError) as e:
+                print(f"[!] inotify unavailable ({e}); workspace index will poll")
+        self._wd_to_dir: Dict[int, str] = {}
+        self._dir_to_wd: Dict[str, int] = {}
+        self._root_lost = False
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        # close() writes to this pipe so the thread doesn't sit out its poll timeout
+        self._wake_r: Optional[int] = None
+        self._wake_w: Optional[int] = None
+        self._last_rescan = 0.0
+
+        with self._lock:
+            self._rewatch()
+
+    @property
+    def watching(self) -> bool:
+        """True while changes arrive via inotify rather than rescans."""
+        return self._inotify is not None and not self._root_lost
+
+    # -- queries ---------------------------------------------------------
+
+    def token(self) -> int:
+        """Current change token. Pass it to changes_since() later."""
+        with self._lock:
+            self._sync()
+            return self._log_base + len(self._log)
+
+    def files(self) -> List[str]:
+        """Sorted relative paths of every file in the workspace."""
+        with self._lock:
+            self._sync()
+            return sorted(self._entries)
+
+    def get(self, path: str) -> Optional[FileEntry]:
+        with self._lock:
+            self._sync()
+            return self._entries.get(path)
+
+    def snapshot(self) -> Dict[str, FileEntry]:
+        with self._lock:
+            self._sync()
+            return dict(self._entries)
+
+    def changes_since(self, token: int) -> Tuple[int, Dict[str, Optional[FileEntry]]]:
+        """Paths whose entry differs from what it was at `token`.
+
+        Returns:
+            (new_token, changes) mapping each path to its current entry, or
+            None if it was deleted. If `token` is older than the retained
+            log, every current file is reported.
+        """
+        current, changes = self.changes_between(token)
+        return current, {path: after for path, (_, after) in changes.items()}
+
+    def changes_between(
+        self, token: int
+    ) -> Tuple[int, Dict[str, Tuple[Optional[FileEntry], Optional[FileEntry]]]]:
+        """Like changes_since(), but maps each path to (entry at token, entry now).
+
+        If `token` is older than the retained log, every current file is
+        reported with an unknown (None) previous entry.
+        """
+        with self._lock:
+            self._sync()
+            current = self._log_base + len(self._log)
+            if token < self._log_base:
+                return current, {path: (None, entry) for path, entry in self._entries.items()}
+            before: Dict[str, Optional[FileEntry]] = {}
+            for path, previous in self._log[token - self._log_base:]:
+                before.setdefault(path, previous)
+            return current, {
+                path: (previous, self._entries.get(path))
+                for path, previous in before.items()
+                if self._entries.get(path) != previous
+            }
+
+    def sync(self) -> int:
+        """Apply pending events now (or rescan when not watching). Returns the token."""
+        return self.token()
+
+    def rescan(self):
+        """Full walk of the tree, reconciling the index with disk."""
+        with self._lock:
+            self._rescan()
+
+    # -- lifecycle -------------------------------------------------------
+
+    def start(self):
+        """Start the background thread that applies events and periodic rescans."""
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._wake_r, self._wake_w = os.pipe()
+            self._thread = threading.Thread(target=self._run, name="ironclaw-workspace-index", daemon=True)
+            self._thread.start()
+
+    def close(self):
+        self._stopped.set()
+        with self._lock:
+            if self._wake_w is not None:
+                os.write(self._wake_w, b"\0")
+        if self._thread is not None:
+            self._thread.join(timeout=5)
+        with self._lock:
+            if self._wake_w is not None:
+                os.close(self._wake_r)
+                os.close(self._wake_w)
+                self._wake_r = self._wake_w = None
+            if self._inotify is not None:
+                self._inotify.close()
+                self._inotify = None
+            self._wd_to_dir.clear()
+            self._dir_to_wd.clear()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            timeout = 1.0
+            if self._inotify is not None and not self._root_lost:
+                poller = select.poll()
+                poller.register(self._inotify.fd, select.POLLIN)
+                poller.register(self._wake_r, select.POLLIN)
+                ready = poller.poll(timeout * 1000)
+                if self._stopped.is_set():
+                    return
+                if ready:
+                    with self._lock:
+                        self._drain()
+            else:
+                self._stopped.wait(timeout)
+            if time.monotonic() - self._last_rescan >= self.rescan_interval:
+                with self._lock:
+                    if self._root_lost:
+                        self._rewatch()
+                    else:
+                        self._rescan()
+
+    # -- internals (caller holds the lock) --------------------------------
+
+    def _sync(self):
+        if self._inotify is None:
+            self._rescan()
+        elif self._root_lost:
+            self._rewatch()
+        else:
+            self._drain()
+
+    def _record(self, path: str, entry: Optional[FileEntry]):
+        previous = self._entries.get(path)
+        if previous == entry:
+            return
+        if entry is None:
+            del self._entries[path]
+        else:
+            self._entries[path] = entry
+        self._log.append((path, previous))
+        if len(self._log) > self.max_log:
+            drop = len(self._log) // 2
+            del self._log[:drop]
+            self._log_base += drop
+
+    def _walk(self, rel_dir: str, files: Dict[str, FileEntry], dirs: List[str]):
+        """Collect files and directories under rel_dir, recursively."""
+        dirs.append(rel_dir)
+        try:
+            with os.scandir(os.path.join(self.root, rel_dir)) as it:
+                for item in it:
+                    if not rel_dir and item.name in self.exclude:
+                        continue
+                    rel = _join(rel_dir, item.name)
+                    try:
+                        if item.is_dir(follow_symlinks=False):
+                            self._walk(rel, files, dirs)
+                        elif item.is_file(follow_symlinks=False):
+                            files[rel] = FileEntry.from_stat(item.stat(follow_symlinks=False))
+                    except FileNotFoundError:
+                        continue
+        except (FileNotFoundError, NotADirectoryError, PermissionError):
+            pass
+
+    def _remove_prefix(self, rel_dir: str):
+        prefix = rel_dir + "/"
+        for path in [p for p in self._entries if p.startswith(prefix)]:
+            self._record(path, None)
+        for sub in [d for d in self._dir_to_wd if d == rel_dir or d.startswith(prefix)]:
+            wd = self._dir_to_wd.pop(sub)
+            self._wd_to_dir.pop(wd, None)
+            if self._inotify is not None:
+                self._inotify.rm_watch(wd)
+
+    def _add_tree(self, rel_dir: str):
+        """Watch and index a directory that appeared (created or moved in)."""
+        files: Dict[str, FileEntry] = {}
+        dirs: List[str] = []
+        self._walk(rel_dir, files, dirs)
+        self._watch(dirs)
+        for path, entry in files.items():
+            self._record(path, entry)
+
+    def _watch(self, dirs: List[str]):
+        if self._inotify is None:
+            return
+        for rel_dir in dirs:
+            if rel_dir in self._dir_to_wd:
+                continue
+            try:
+                wd = self._inotify.add_watch(os.path.join(self.root, rel_dir))
+            except OSError as e:
+                if e.errno in (errno.ENOENT, errno.ENOTDIR):
+                    continue
+                raise
+            self._wd_to_dir[wd] = rel_dir
+            self._dir_to_wd[rel_dir] = wd
+
+    def _rescan(self):
+        files: Dict[str, FileEntry] = {}
+        dirs: List[str] = []
+        self._walk("", files, dirs)
+        self._watch(dirs)
+        for path in [p for p in self._entries if p not in files]:
+            self._record(path, None)
+        for path, entry in files.items():
+            self._record(path, entry)
+        self._last_rescan = time.monotonic()
+
+    def _rewatch(self):
+        """Drop every watch and rebuild from scratch (root replaced, or overflow)."""
+        if self._inotify is not None:
+            for wd in list(self._wd_to_dir):
+                self._inotify.rm_watch(wd)
+            self._inotify.read()  # discard events for the old watches
+        self._wd_to_dir.clear()
+        self._dir_to_wd.clear()
+        self._root_lost = not os.path.isdir(self.root)
+        self._rescan()
+
+    def _drain(self):
+        events = self._inotify.read()
+        if not events:
+            return
+        dirty: Set[str] = set()
+        for wd, mask, name in events:
+            if mask & IN_Q_OVERFLOW:
+                self._rewatch()
+                return
+            rel_dir = self._wd_to_dir.get(wd)
+            if rel_dir is None:
+                continue  # watch already removed
+            if rel_dir == "" and mask & (IN_DELETE_SELF | IN_MOVE_SELF | IN_IGNORED):
+                # The workspace directory itself was replaced (e.g. a pool
+                # slot renamed over it); start over on the new directory.
+                self._rewatch()
+                return
+            if mask & IN_IGNORED:
+                self._wd_to_dir.pop(wd, None)
+                if self._dir_to_wd.get(rel_dir) == wd:
+                    del self._dir_to_wd[rel_dir]
+                continue
+            if not name:
+                continue
+            if not rel_dir and name in self.exclude:
+                continue
+            path = _join(rel_dir, name)
+            if mask & IN_ISDIR:
+                if mask & (IN_DELETE | IN_MOVED_FROM):
+                    self._remove_prefix(path)
+                elif mask & (IN_CREATE | IN_MOVED_TO):
+                    self._add_tree(path)
+                continue
+            dirty.add(path)
+        for path in dirty:
+            try:
+                st = os.stat(os.path.join(self.root, path), follow_symlinks=False)
+            except (FileNotFoundError, NotADirectoryError):
+                self._record(path, None)
+                continue
+            if stat.S_ISREG(st.st_mode):
+                self._record(path, FileEntry.from_stat(st))
+            elif not stat.S_ISDIR(st.st_mode):
+                self._record(path, None)  # replaced by a symlink or special file
+
+
+_indexes: Dict[str, WorkspaceIndex] = {}
+_indexes_lock = threading.Lock()
+
+
+def get_workspace_index(root: str) -> WorkspaceIndex:
+    """Shared, started index for a workspace directory."""
+    key = os.path.abspath(root)
+    with _indexes_lock:
+        index = _indexes.get(key)
+        if index is None:
+            os.makedirs(key, exist_ok=True)
+            index = WorkspaceIndex(key)
+            index.start()
+            _indexes[key] = index
+        return index
+
+
+def close_workspace_index(root: str) -> bool:
+    """Stop and forget the index for a workspace. Returns False if there was none."""
+    with _indexes_lock:
+        index = _indexes.pop(os.path.abspath(root), None)
+    if index is None:
+        return False
+    index.close()
+    return True
@@ -1,67 +1,452 @@
-from typing import List, Optional
+import asyncio
+import os
+import uuid
+from typing import Dict, List, Optional, Tuple
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
-from sqlalchemy import select
+from sqlalchemy import event, insert, select, update, inspect, text
+from sqlalchemy.dialects import postgresql, sqlite
 from src.database.models import Base, ChatSession, ChatMessage
+from src.telemetry.metrics import span
 from datetime import datetime, timezone
 
+# Applied to every new SQLite connection. WAL lets readers proceed while a
+# write is in flight; NORMAL sync is durable across app crashes in WAL mode.
+_SQLITE_PRAGMAS = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",
+    "PRAGMA busy_timeout=5000",
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA cache_size=-16000",  # KiB
+)
+
+# Dialects whose INSERT supports ON CONFLICT ... RETURNING, which session
+# creation and sequence allocation rely on
+_UPSERT_INSERTS = {
+    "sqlite": sqlite.insert,
+    "postgresql": postgresql.insert,
+}
+
+def _apply_sqlite_pragmas(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    for pragma in _SQLITE_PRAGMAS:
+        cursor.execute(pragma)
+    cursor.close()
+
+SUMMARY_ROLE = "summary"
+
+# Parts that answer something the model asked for; a history window must
+# not start on them or the model sees a reply without its tool call.
+_REPLY_PART_KINDS = {"tool-return", "retry-prompt"}
+
+def is_turn_start(message: dict) -> bool:
+    """
+    True if a serialised ModelMessage opens a new conversational turn: a
+    request carrying a user prompt and no tool results.
+    """
+    if message.get("kind") != "request":
+        return False
+    kinds = {part.get("part_kind") for part in message.get("parts", [])}
+    return "user-prompt" in kinds and not kinds & _REPLY_PART_KINDS
+
+_DEFAULT_FLUSH_INTERVAL = 0.05  # seconds
+_DEFAULT_MAX_PENDING = 1000
+_MAX_BATCH = 500
+_WRITE_ATTEMPTS = 3
+
+class PersistenceError(Exception):
+    """Raised when queued chat messages could not be written to the database."""
+    pass
+
 class DatabaseManager:
-    def __init__(self, db_url: str = "sqlite+aiosqlite:///ironclaw.db"):
+    """
+    Async chat persistence.
+
+    queue_messages() is write-behind: batches are handed to a single writer
+    task that commits everything queued within IRONCLAW_DB_FLUSH_INTERVAL
+    seconds (default 0.05) in one transaction. Batches are written in the
+    order they were queued, so each session's history stays ordered. Once
+    IRONCLAW_DB_MAX_PENDING batches (default 1000) are waiting, callers
+    block until the writer catches up. Every read, and close(), flushes
+    the queue first.
+
+    A batch that still fails after a few retries is not dropped, which
+    would leave a gap in the session's history: it and everything queued
+    after it are held back, in order. Each flush() retries them and raises
+    PersistenceError while they still can't be written.
+
+    SQLite (the default) and PostgreSQL are supported: creating sessions
+    and allocating message sequence numbers use INSERT ... ON CONFLICT
+    ... RETURNING. Other databases are rejected with ValueError.
+    """
+
+    def __init__(
+        self,
+        db_url: str = "sqlite+aiosqlite:///ironclaw.db",
+        flush_interval: Optional[float] = None,
+        max_pending: Optional[int] = None,
+    ):
         self.engine = create_async_engine(db_url)
+        self._upsert = _UPSERT_INSERTS.get(self.engine.dialect.name)
+        if self._upsert is None:
+            raise ValueError(
+                f"Unsupported database {self.engine.dialect.name!r}; "
+                f"use one of: {', '.join(sorted(_UPSERT_INSERTS))}"
+            )
+        if self.engine.dialect.name == "sqlite":
+            event.listen(self.engine.sync_engine, "connect", _apply_sqlite_pragmas)
         self.async_session = async_sessionmaker(self.engine, expire_on_commit=False)
+        if flush_interval is None:
+            flush_interval = float(os.environ.get("IRONCLAW_DB_FLUSH_INTERVAL", _DEFAULT_FLUSH_INTERVAL))
+        if max_pending is None:
+            max_pending = int(os.environ.get("IRONCLAW_DB_MAX_PENDING", _DEFAULT_MAX_PENDING))
+        self.flush_interval = flush_interval
+        self.max_pending = max(1, max_pending)
+        self._queue: Optional[asyncio.Queue] = None
+        self._writer: Optional[asyncio.Task] = None
+        # Batches held back after a failed write, oldest first
+        self._backlog: List[Tuple[str, List[dict]]] = []
+        self._backlog_lock = asyncio.Lock()
 
     async def initialize_db(self):
         async with self.engine.begin() as conn:
             await conn.run_sync(Base.metadata.create_all)
+            await conn.run_sync(self._migrate)
+
+    @staticmethod
+    def _migrate(conn):
+        """Bring databases created by older versions up to the current schema."""
+        inspector = inspect(conn)
+        columns = {c["name"] for c in inspector.get_columns("chat_messages")}
+        if "archived" not in columns:
+            conn.execute(text("ALTER TABLE chat_messages ADD COLUMN archived BOOLEAN NOT NULL DEFAULT FALSE"))
+        if "seq" not in columns:
+            # Ids were assigned in insertion order, so they are a valid
+            # per-session sequence for existing rows
+            conn.execute(text("ALTER TABLE chat_messages ADD COLUMN seq INTEGER"))
+            conn.execute(text("UPDATE chat_messages SET seq = id"))
+        if "last_seq" not in {c["name"] for c in inspector.get_columns("chat_sessions")}:
+            conn.execute(text("ALTER TABLE chat_sessions ADD COLUMN last_seq INTEGER NOT NULL DEFAULT 0"))
+            conn.execute(text(
+                "UPDATE chat_sessions SET last_seq = "
+                "(SELECT COALESCE(MAX(seq), 0) FROM chat_messages WHERE chat_messages.session_id = chat_sessions.id)"
+            ))
+            # Messages saved without a session row still need a counter
+            conn.execute(text(
+                "INSERT INTO chat_sessions (id, last_seq) "
+                "SELECT session_id, MAX(seq) FROM chat_messages "
+                "WHERE session_id NOT IN (SELECT id FROM chat_sessions) GROUP BY session_id"
+            ))
+        for index in ChatMessage.__table__.indexes:
+            index.create(conn, checkfirst=True)
 
     async def get_or_create_session(self, session_id: Optional[str] = None) -> str:
         """
         Retrieves an existing session or creates a new one.
         Returns the session ID.
         """
+        session_id = session_id or str(uuid.uuid4())
         async with self.async_session() as session:
-            if session_id:
-                result = await session.execute(select(ChatSession).where(ChatSession.id == session_id))
-                chat_session = result.scalar_one_or_none()
-                if chat_session:
-                    return chat_session.id
-            
-            # Create new session
-            new_session = ChatSession(id=session_id) if session_id else ChatSession()
-            session.add(new_session)
+            await session.execute(
+                self._upsert(ChatSession)
+                .values(id=session_id, created_at=datetime.now(timezone.utc), last_seq=0)
+                .on_conflict_do_nothing(index_elements=[ChatSession.id])
+            )
             await session.commit()
-            await session.refresh(new_session)
-            return new_session.id
+        return session_id
+
+    async def _allocate_seq(self, session: AsyncSession, session_id: str, count: int) -> int:
+        """
+        Reserves `count` sequence numbers for a session (creating the session
+        row if needed) in one statement. Returns the first reserved number.
+        """
+        result = await session.execute(
+            self._upsert(ChatSession)
+            .values(id=session_id, created_at=datetime.now(timezone.utc), last_seq=count)
+            .on_conflict_do_update(
+                index_elements=[ChatSession.id],
+                set_={"last_seq": ChatSession.last_seq + count},
+            )
+            .returning(ChatSession.last_seq)
+        )
+        return result.scalar_one() - count + 1
 
     async def save_messages(self, session_id: str, messages: List[dict]):
         """
-        Saves a list of messages (as dicts) to the database.
+        Saves a list of messages (as dicts) to the database in one batch,
+        after anything already queued.
+        """
+        if not messages:
+            return
+        await self.flush()
+        await self._write_batch([(session_id, messages)])
+
+    async def queue_messages(self, session_id: str, messages: List[dict]):
+        """
+        Schedules messages to be saved by the background writer and returns
+        without waiting for the write, unless the queue is full.
+        """
+        if not messages:
+            return
+        self._ensure_writer()
+        await self._queue.put((session_id, list(messages)))
+
+    async def flush(self):
         """
+        Waits until every queued message has been written.
+
+        Raises:
+            PersistenceError: Messages held back after a failed write still
+                can't be written.
+        """
+        if self._queue is not None and self._writer is not None and not self._writer.done():
+            await self._queue.join()
+        if self._backlog:
+            await self._write_backlog()
+
+    async def _write_backlog(self):
+        async with self._backlog_lock:
+            while self._backlog:
+                count = min(len(self._backlog), _MAX_BATCH)
+                try:
+                    await self._write_batch(self._backlog[:count])
+                except Exception as e:
+                    pending = sum(len(messages) for _, messages in self._backlog)
+                    raise PersistenceError(f"{pending} chat messages are not saved yet: {e}") from e
+                # The writer only appends, so the written batches are still first
+                del self._backlog[:count]
+
+    def _ensure_writer(self):
+        if self._writer is not None and not self._writer.done():
+            return
+        self._queue = asyncio.Queue(maxsize=self.max_pending)
+        self._writer = asyncio.get_running_loop().create_task(self._write_loop())
+
+    async def _write_loop(self):
+        while True:
+            batch = [await self._queue.get()]
+            if self.flush_interval > 0:
+                # Let concurrent sessions' writes join this transaction
+                await asyncio.sleep(self.flush_interval)
+            while len(batch) < _MAX_BATCH and not self._queue.empty():
+                batch.append(self._queue.get_nowait())
+            try:
+                if self._backlog:
+                    # Stay behind the held-back batches; flush() writes them
+                    self._backlog.extend(batch)
+                    continue
+                for attempt in range(_WRITE_ATTEMPTS):
+                    try:
+                        await self._write_batch(batch)
+                        break
+                    except Exception:
+                        if attempt == _WRITE_ATTEMPTS - 1:
+                            self._backlog.extend(batch)
+                        else:
+                            await asyncio.sleep(0.1 * 2 ** attempt)
+            finally:
+                for _ in batch:
+                    self._queue.task_done()
+
+    async def _write_batch(self, batch: List[Tuple[str, List[dict]]]):
+        """Writes (session_id, messages) pairs, in order, in one transaction."""
+        with span("save_messages", messages=sum(len(messages) for _, messages in batch)):
+            await self._insert_batch(batch)
+
+    async def _insert_batch(self, batch: List[Tuple[str, List[dict]]]):
+        by_session: Dict[str, List[dict]] = {}
+        for session_id, messages in batch:
+            by_session.setdefault(session_id, []).extend(messages)
+        now = datetime.now(timezone.utc)
         async with self.async_session() as session:
-            for msg_data in messages:
-                # Pydantic AI ModelMessage uses 'kind' (request/response)
-                # but we'll map it to role for consistency or use kind if role is missing
-                role = msg_data.get('role', msg_data.get('kind', 'unknown'))
-                db_msg = ChatMessage(
-                    session_id=session_id,
-                    role=role,
-                    content=msg_data,
-                    timestamp=datetime.now(timezone.utc)
+            rows = []
+            for session_id, messages in by_session.items():
+                first_seq = await self._allocate_seq(session, session_id, len(messages))
+                rows.extend(
+                    {
+                        "session_id": session_id,
+                        "seq": first_seq + offset,
+                        # Pydantic AI ModelMessage uses 'kind' (request/response)
+                        # but we'll map it to role for consistency or use kind if role is missing
+                        "role": msg_data.get('role', msg_data.get('kind', 'unknown')),
+                        "content": msg_data,
+                        "timestamp": now,
+                        "archived": False,
+                    }
+                    for offset, msg_data in enumerate(messages)
                 )
-                session.add(db_msg)
+            await session.execute(insert(ChatMessage), rows)
             await session.commit()
 
-    async def get_messages(self, session_id: str) -> List[dict]:
+    async def get_messages(
+        self,
+        session_id: str,
+        limit: Optional[int] = None,
+        before_seq: Optional[int] = None,
+        after_seq: Optional[int] = None,
+        include_archived: bool = False,
+    ) -> List[dict]:
+        """
+        Retrieves messages for a session in chronological order. Messages
+        archived by compaction and summary rows are left out.
+
+        Args:
+            limit: Return only the newest `limit` matching messages.
+            before_seq: Keyset cursor; only messages earlier than this seq.
+            after_seq: Checkpoint; only messages saved after this seq.
+            include_archived: Also return messages folded into a summary.
+        """
+        rows = await self._fetch_rows(session_id, limit, before_seq, after_seq, include_archived)
+        return [content for _, content in rows]
+
+    async def get_message_page(
+        self, session_id: str, limit: int, before_seq: Optional[int] = None
+    ) -> Tuple[List[dict], Optional[int]]:
         """
-        Retrieves all messages for a session in chronological order.
+        Returns one page of history, newest first by page, oldest first within it.
+        The returned cursor is passed as `before_seq` to fetch the next older
+        page; it is None once the start of the session is reached. Pages
+        cover the full record, including messages archived by compaction.
         """
+        rows = await self._fetch_rows(session_id, limit, before_seq, None, include_archived=True)
+        cursor = rows[0][0] if len(rows) == limit else None
+        return [content for _, content in rows], cursor
+
+    async def get_history_window(self, session_id: str, max_messages: Optional[int]) -> List[dict]:
+        """
+        Returns roughly the last `max_messages` messages, starting on a turn
+        boundary so no tool return is separated from its tool call. The
+        session's current summary, if it has been compacted, comes first.
+
+        The window is trimmed forward to the first turn start inside it. If a
+        single turn is longer than the window, older pages are read until its
+        start is found, so the result can exceed `max_messages`.
+        """
+        summary = await self.get_summary(session_id)
+        window = await self._window(session_id, max_messages)
+        return [summary] + window if summary else window
+
+    async def _window(self, session_id: str, max_messages: Optional[int]) -> List[dict]:
+        if not max_messages or max_messages <= 0:
+            return await self.get_messages(session_id)
+
+        rows = await self._fetch_rows(session_id, max_messages, None, None)
+        if len(rows) < max_messages:
+            # Whole session fits; it starts wherever the session started
+            return [content for _, content in rows]
+        for index, (_, content) in enumerate(rows):
+            if is_turn_start(content):
+                return [content for _, content in rows[index:]]
+        # The window opens mid-turn: walk back to where that turn started
+        while True:
+            older = await self._fetch_rows(session_id, max_messages, rows[0][0], None)
+            if not older:
+                return [content for _, content in rows]
+            rows = older + rows
+            for index in range(len(older) - 1, -1, -1):
+                if is_turn_start(rows[index][1]):
+                    return [content for _, content in rows[index:]]
+
+    async def get_summary(self, session_id: str) -> Optional[dict]:
+        """The live summary of a session's compacted history, if any."""
+        await self.flush()
         async with self.async_session() as session:
             result = await session.execute(
-                select(ChatMessage)
-                .where(ChatMessage.session_id == session_id)
-                .order_by(ChatMessage.timestamp)
+                select(ChatMessage.content)
+                .where(
+                    ChatMessage.session_id == session_id,
+                    ChatMessage.role == SUMMARY_ROLE,
+                    ChatMessage.archived.is_(False),
+                )
+                .order_by(ChatMessage.seq.desc())
+                .limit(1)
+            )
+            return result.scalar_one_or_none()
+
+    async def save_summary(self, session_id: str, summary: dict, keep_last: int):
+        """
+        Stores a new summary for a session and archives every live message
+        except the newest `keep_last`, plus any previous summary, in one
+        transaction.
+        """
+        await self.flush()
+        async with self.async_session() as session:
+            first_seq = await self._allocate_seq(session, session_id, 1)
+            kept = await session.execute(
+                select(ChatMessage.id)
+                .where(
+                    ChatMessage.session_id == session_id,
+                    ChatMessage.role != SUMMARY_ROLE,
+                    ChatMessage.archived.is_(False),
+                )
+                .order_by(ChatMessage.seq.desc())
+                .limit(keep_last)
             )
-            messages = result.scalars().all()
-            return [msg.content for msg in messages]
+            kept_ids = [row.id for row in kept]
+            archive = update(ChatMessage).where(
+                ChatMessage.session_id == session_id,
+                ChatMessage.archived.is_(False),
+            )
+            if kept_ids:
+                archive = archive.where(ChatMessage.id.notin_(kept_ids))
+            await session.execute(archive.values(archived=True))
+            session.add(ChatMessage(
+                session_id=session_id,
+                seq=first_seq,
+                role=SUMMARY_ROLE,
+                content=summary,
+                timestamp=datetime.now(timezone.utc),
+            ))
+            await session.commit()
+
+    async def latest_seq(self, session_id: str) -> int:
+        """Seq of the newest message in a session, usable as an `after_seq` checkpoint."""
+        await self.flush()
+        async with self.async_session() as session:
+            result = await session.execute(select(ChatSession.last_seq).where(ChatSession.id == session_id))
+            return result.scalar_one_or_none() or 0
+
+    async def _fetch_rows(
+        self,
+        session_id: str,
+        limit: Optional[int],
+        before_seq: Optional[int],
+        after_seq: Optional[int],
+        include_archived: bool = False,
+    ) -> List[Tuple[int, dict]]:
+        """(seq, content) rows in chronological order, keyset-filtered on seq."""
+        await self.flush()
+        query = select(ChatMessage.seq, ChatMessage.content).where(
+            ChatMessage.session_id == session_id,
+            ChatMessage.role != SUMMARY_ROLE,
+        )
+        if not include_archived:
+            query = query.where(ChatMessage.archived.is_(False))
+        if before_seq is not None:
+            query = query.where(ChatMessage.seq < before_seq)
+        if after_seq is not None:
+            query = query.where(ChatMessage.seq > after_seq)
+        if limit is not None:
+            # Newest `limit` rows, flipped back to chronological order below
+            query = query.order_by(ChatMessage.seq.desc()).limit(limit)
+        else:
+            query = query.order_by(ChatMessage.seq)
+        async with self.async_session() as session:
+            result = await session.execute(query)
+            rows = [(row.seq, row.content) for row in result]
+        if limit is not None:
+            rows.reverse()
+        return rows
 
     async def close(self):
-        await self.engine.dispose()
+        """Flushes the queue and closes the database; raises PersistenceError if messages are lost."""
+        try:
+            await self.flush()
+        finally:
+            if self._writer is not None:
+                self._writer.cancel()
+                try:
+                    await self._writer
+                except asyncio.CancelledError:
+                    pass
+                self._writer = None
+            await self.engine.dispose()
@@ -1,7 +1,7 @@
 from datetime import datetime, timezone
 import uuid
 from typing import Optional, List
-from sqlalchemy import String, DateTime, ForeignKey, Text, JSON
+from sqlalchemy import String, DateTime, ForeignKey, Text, JSON, Boolean, Integer, Index, false
 from sqlalchemy.orm import DeclarativeBase, Mapped, mapped_column, relationship
 
 class Base(DeclarativeBase):
@@ -13,9 +13,11 @@ class ChatSession(Base):
     id: Mapped[str] = mapped_column(String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     created_at: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(timezone.utc))
     metadata_json: Mapped[Optional[dict]] = mapped_column(JSON, nullable=True)
+    # Highest ChatMessage.seq handed out for this session
+    last_seq: Mapped[int] = mapped_column(Integer, default=0, server_default="0")
 
     messages: Mapped[List["ChatMessage"]] = relationship(
-        "ChatMessage", back_populates="session", cascade="all, delete-orphan", order_by="ChatMessage.timestamp"
+        "ChatMessage", back_populates="session", cascade="all, delete-orphan", order_by="ChatMessage.seq"
     )
 
     def __repr__(self) -> str:
@@ -23,14 +25,22 @@ class ChatSession(Base):
 
 class ChatMessage(Base):
     __tablename__ = "chat_messages"
+    __table_args__ = (
+        # Every history query filters on session and walks seq
+        Index("ix_chat_messages_session_seq", "session_id", "seq", unique=True),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True, autoincrement=True)
     session_id: Mapped[str] = mapped_column(ForeignKey("chat_sessions.id"))
-    role: Mapped[str] = mapped_column(String(20))  # 'user', 'model', 'system', 'tool'
+    # Monotonic position within the session; history is ordered by this
+    seq: Mapped[int] = mapped_column(Integer)
+    role: Mapped[str] = mapped_column(String(20))  # 'request', 'response', or 'summary' for compacted history
     content: Mapped[dict] = mapped_column(JSON)  # Store Pydantic AI ModelMessage blobs
     timestamp: Mapped[datetime] = mapped_column(DateTime, default=lambda: datetime.now(timezone.utc))
+    # Set once a message has been folded into a summary; kept for the record
+    archived: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false())
 
     session: Mapped["ChatSession"] = relationship("ChatSession", back_populates="messages")
 
     def __repr__(self) -> str:
-        return f"ChatMessage(id={self.id!r}, role={self.role!r}, timestamp={self.timestamp!r})"
+        return f"ChatMessage(id={self.id!r}, seq={self.seq!r}, role={self.role!r}, timestamp={self.timestamp!r}, archived={self.archived!r})"
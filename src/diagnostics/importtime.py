@@ -0,0 +1,124 @@
+"""
+Startup import-time report.
+
+Imports a module (default: the CLI entry point, src.main) in a fresh
+interpreter under `python -X importtime` and aggregates the per-module
+timings by top-level package, so the import share of time to first prompt
+can be measured and kept low.
+
+    python -m src.diagnostics.importtime
+    python -m src.diagnostics.importtime src.web_ui --top 15 --depth 2
+    python -m src.diagnostics.importtime --budget 2.5   # exit 1 if slower
+"""
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple
+
+_PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+_PREFIX = "import time:"
+
+
+@dataclass
+class ImportRecord:
+    module: str
+    self_us: int        # time spent in this module's own body
+    cumulative_us: int  # including the modules it imported
+    depth: int          # nesting level in the import tree (0 = top)
+
+
+def parse_importtime(text: str) -> List[ImportRecord]:
+    """Parse `-X importtime` stderr output; other lines are ignored."""
+    records = []
+    for line in text.splitlines():
+        if not line.startswith(_PREFIX):
+            continue
+        fields = line[len(_PREFIX):].split("|")
+        if len(fields) != 3 or not fields[0].strip().isdigit():
+            continue  # the header line
+        name = fields[2].rstrip()
+        stripped = name.lstrip(" ")
+        # One leading space, then two more per nesting level
+        depth = max(0, (len(name) - len(stripped) - 1) // 2)
+        records.append(ImportRecord(stripped, int(fields[0]), int(fields[1]), depth))
+    return records
+
+
+def aggregate(records: List[ImportRecord], depth: int = 1) -> List[Tuple[str, int, int]]:
+    """
+    Sums self time per package prefix of `depth` dotted components.
+
+    Returns:
+        (package, self_us, module_count) tuples, slowest first.
+    """
+    totals: Dict[str, int] = defaultdict(int)
+    counts: Dict[str, int] = defaultdict(int)
+    for record in records:
+        package = ".".join(record.module.split(".")[:depth])
+        totals[package] += record.self_us
+        counts[package] += 1
+    return sorted(((p, totals[p], counts[p]) for p in totals), key=lambda item: item[1], reverse=True)
+
+
+def measure(module: str, python: Optional[str] = None) -> Tuple[List[ImportRecord], float]:
+    """
+    Imports `module` in a fresh interpreter with -X importtime.
+
+    Returns:
+        (records, wall_seconds) where wall time includes interpreter startup.
+    """
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [_PROJECT_ROOT, env.get("PYTHONPATH")]))
+    started = time.perf_counter()
+    proc = subprocess.run(
+        [python or sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=_PROJECT_ROOT,
+        env=env,
+        capture_output=True,
+        text=True,
+    )
+    wall = time.perf_counter() - started
+    if proc.returncode != 0:
+        errors = [line for line in proc.stderr.splitlines() if not line.startswith(_PREFIX)]
+        raise RuntimeError(f"Importing {module} failed:\n" + "\n".join(errors[-20:]))
+    return parse_importtime(proc.stderr), wall
+
+
+def format_report(module: str, records: List[ImportRecord], wall: float, top: int = 20, depth: int = 1) -> str:
+    total_us = sum(record.self_us for record in records)
+    lines = [
+        f"Import of {module}: {total_us / 1e6:.2f}s in {len(records)} modules "
+        f"({wall:.2f}s wall, including interpreter startup)",
+        "",
+        f"{'package':<40} {'self (ms)':>10} {'share':>7} {'modules':>8}",
+    ]
+    for package, self_us, count in aggregate(records, depth)[:top]:
+        share = self_us / total_us * 100 if total_us else 0.0
+        lines.append(f"{package:<40} {self_us / 1000:>10.1f} {share:>6.1f}% {count:>8}")
+    return "\n".join(lines)
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(description="Report startup import time per package")
+    parser.add_argument("module", nargs="?", default="src.main", help="Module to import (default: src.main)")
+    parser.add_argument("--top", type=int, default=20, help="Packages to list")
+    parser.add_argument("--depth", type=int, default=1, help="Dotted components to group by")
+    parser.add_argument("--budget", type=float, help="Fail if total import time exceeds this many seconds")
+    args = parser.parse_args(argv)
+
+    records, wall = measure(args.module)
+    print(format_report(args.module, records, wall, top=args.top, depth=args.depth))
+    total = sum(record.self_us for record in records) / 1e6
+    if args.budget is not None and total > args.budget:
+        print(f"\n[!] Import time {total:.2f}s exceeds the {args.budget:.2f}s budget")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -12,14 +12,49 @@ from dotenv import load_dotenv
 load_dotenv()
 
 import asyncio
+import threading
 from pydantic import TypeAdapter
 from pydantic_ai.messages import ModelMessage
-from src.agent.core import ironclaw_agent, CodeExecutionRequest, AgentDeps
-from src.agent.provider import get_provider_config, check_ollama_health, get_missing_models, provider_banner
+from src.agent.core import get_agent, CodeExecutionRequest, AgentDeps
+from src.agent.tools.sandbox import discard_pending_blocks, release_sandbox_tool, sandbox_status, start_sandbox_warmup
+from src.agent.history import compact_history, ensure_system_prompt, history_window_size, window_messages
+from src.agent.health import get_health_monitor
+from src.agent.provider import get_provider_config, check_ollama_health, get_missing_models, provider_banner, OllamaUnavailableError
 from src.database.manager import DatabaseManager
+from src.telemetry.metrics import span, start_metrics_server
+from src.telemetry.profiler import profile_turn, request_profile
 
 import argparse
 
+def offer_cloud_fallback(reason: str) -> bool:
+    """Ask whether to switch from Ollama to a cloud provider; True if switched."""
+    answer = input(f"{reason} Fall back to cloud? [y/N] ").strip().lower()
+    if answer not in ("y", "yes"):
+        return False
+    # Re-resolve config without Ollama (unset PROVIDER, let fallback chain run)
+    os.environ.pop("PROVIDER", None)
+    print(provider_banner(get_provider_config()))
+    return True
+
+async def prompt(message: str) -> str:
+    """
+    input() on a daemon thread, so queued history writes keep landing while
+    the user types and a pending read never holds up interpreter exit.
+    """
+    loop = asyncio.get_running_loop()
+    answer = loop.create_future()
+
+    def read():
+        try:
+            result = input(message)
+        except BaseException as e:
+            loop.call_soon_threadsafe(lambda: answer.done() or answer.set_exception(e))
+        else:
+            loop.call_soon_threadsafe(lambda: answer.done() or answer.set_result(result))
+
+    threading.Thread(target=read, name="ironclaw-input", daemon=True).start()
+    return await answer
+
 async def main(session_id: str = "default"):
     print("━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━━")
     print(" IronClaw Agent System - Phase 2 Persistence")
@@ -31,105 +66,134 @@ async def main(session_id: str = "default"):
     _cfg = get_provider_config()
     print(provider_banner(_cfg))
 
+    # Warm the sandbox in the background while the health check and DB
+    # init run, so the first task doesn't wait for Docker
+    start_sandbox_warmup(session_id)
+    start_metrics_server()
+    db = DatabaseManager()
+    if _cfg.provider == "ollama":
+        (reachable, pulled_models), _ = await asyncio.gather(check_ollama_health(_cfg), db.initialize_db())
+    else:
+        await db.initialize_db()
+
     # Ollama startup health check
     if _cfg.provider == "ollama":
-        reachable, pulled_models = await check_ollama_health(_cfg)
         if not reachable:
-            answer = input(
-                f"Ollama unavailable at {_cfg.ollama_base_url}. Fall back to cloud? [y/N] "
-            ).strip().lower()
-            if answer not in ("y", "yes"):
+            if not offer_cloud_fallback(f"Ollama unavailable at {_cfg.ollama_base_url}."):
                 print("Aborting. Start Ollama and retry, or set PROVIDER to a cloud provider.")
+                await db.close()
                 return
-            else:
-                # Re-resolve config without Ollama (unset PROVIDER, let fallback chain run)
-                import os as _os
-                _os.environ.pop("PROVIDER", None)
-                _cfg = get_provider_config()
-                print(provider_banner(_cfg))
         else:
             missing = get_missing_models(_cfg, pulled_models)
             if missing:
                 for m in missing:
                     print(f"[!] Model not pulled: {m}. Run: ollama pull {m}")
                 print("Aborting. Pull the required models and retry.")
+                await db.close()
                 return
 
-    db = DatabaseManager()
-    await db.initialize_db()
-    
     await db.get_or_create_session(session_id)
+    print(f"[*] {sandbox_status(session_id)}")
     
-    # Load history
-    history_dicts = await db.get_messages(session_id)
+    # Load only the recent window of history the model will see
+    window = history_window_size()
+    history_dicts = await db.get_history_window(session_id, window)
     adapter = TypeAdapter(list[ModelMessage])
-    history = adapter.validate_python(history_dicts) if history_dicts else []
+    history = ensure_system_prompt(adapter.validate_python(history_dicts)) if history_dicts else []
     
     if history:
         print(f"[*] Loaded {len(history)} previous messages.")
     
     _callback = lambda token: print(token, end='', flush=True)
-    _deps = AgentDeps(on_output=_callback)
+    _deps = AgentDeps(on_output=_callback, session_id=session_id)
 
     while True:
         try:
-            user_input = input("\nUser: ").strip()
+            user_input = (await prompt("\nUser: ")).strip()
             if not user_input:
                 continue
             if user_input.lower() in ["exit", "quit"]:
                 break
+
+            if user_input == "/profile":
+                request_profile(session_id)
+                print("[*] Your next message will be profiled.")
+                continue
+
+            _cfg = get_provider_config()
+            if _cfg.provider == "ollama":
+                # Fail fast, before the agent's first model call, if Ollama is down
+                get_health_monitor(_cfg).check()
+
+            # Sampled only if IRONCLAW_PROFILE is set or /profile asked for it
+            with profile_turn(session_id) as profile:
+                # Fold older turns into a summary once history grows too large
+                history = await compact_history(history, db, session_id)
             
-            result = await ironclaw_agent.run(
-                user_input,
-                message_history=history,
-                output_type=CodeExecutionRequest | str,
-                deps=_deps,
-            )
-            print()  # trailing newline after streaming so approval prompt starts on its own line
+                result = await get_agent().run(
+                    user_input,
+                    message_history=history,
+                    output_type=CodeExecutionRequest | str,
+                    deps=_deps,
+                )
+                print()  # trailing newline after streaming so approval prompt starts on its own line
             
-            # Save new messages
-            new_msgs = adapter.dump_python(result.new_messages(), mode='json')
-            await db.save_messages(session_id, new_msgs)
+                # Save new messages
+                new_msgs = adapter.dump_python(result.new_messages(), mode='json')
+                await db.queue_messages(session_id, new_msgs)
             
-            # Update local history
-            history = result.all_messages()
+                # Update local history
+                history = window_messages(result.all_messages(), window)
             
-            response = result.output
+                response = result.output
             
-            if isinstance(response, CodeExecutionRequest):
-                print(f"\nAgent Logic:\n{response.reasoning}")
-                print("\n--- Proposed Code ---")
-                for i, block in enumerate(response.blocks, 1):
-                    print(f"[{i}] {block.language}:\n{block.code}\n")
+                if isinstance(response, CodeExecutionRequest):
+                    print(f"\nAgent Logic:\n{response.reasoning}")
+                    print("\n--- Proposed Code ---")
+                    for i, block in enumerate(response.blocks, 1):
+                        after = " (after the blocks above)" if block.sequential else ""
+                        print(f"[{i}] {block.language}{after}:\n{block.code}\n")
                 
-                approval = input("Approve execution? (y/n): ").strip().lower()
-                if approval in ["y", "yes"]:
-                    print("Executing...")
-                    confirm_result = await ironclaw_agent.run(
-                        "Confirm the execution.",
-                        message_history=history,
-                        output_type=str,
-                        deps=_deps,
-                    )
+                    with span("approval_wait") as waited:
+                        approval = (await prompt("Approve execution? (y/n): ")).strip().lower()
+                        approved = approval in ["y", "yes"]
+                        waited.set(approved=approved)
+                    if approved:
+                        print("Executing...")
+                        confirm_result = await get_agent().run(
+                            "Confirm the execution.",
+                            message_history=history,
+                            output_type=str,
+                            deps=_deps,
+                        )
                     
-                    # Save confirmation messages
-                    confirm_new_msgs = adapter.dump_python(confirm_result.new_messages(), mode='json')
-                    await db.save_messages(session_id, confirm_new_msgs)
+                        # Save confirmation messages
+                        confirm_new_msgs = adapter.dump_python(confirm_result.new_messages(), mode='json')
+                        await db.queue_messages(session_id, confirm_new_msgs)
                     
-                    # Update local history
-                    history = confirm_result.all_messages()
+                        # Update local history
+                        history = window_messages(confirm_result.all_messages(), window)
                     
-                    print(f"\nResult:\n{confirm_result.output}")
+                        print(f"\nResult:\n{confirm_result.output}")
+                    else:
+                        discard_pending_blocks(session_id)
+                        print("Execution cancelled by user.")
                 else:
-                    print("Execution cancelled by user.")
-            else:
-                print(f"\nAgent: {response}")
+                    print(f"\nAgent: {response}")
+            if profile is not None and profile.path:
+                print(f"\n[*] Profile written to {profile.path}\n{profile.profile.summary()}")
                 
-        except KeyboardInterrupt:
+        except (KeyboardInterrupt, asyncio.CancelledError):
+            # Ctrl-C while awaiting input cancels the task instead of raising
             break
+        except OllamaUnavailableError as e:
+            print(f"Error: {e}")
+            if offer_cloud_fallback("Ollama went down."):
+                print("Send your message again to retry it with the new provider.")
         except Exception as e:
             print(f"Error: {e}")
     
+    release_sandbox_tool(session_id)
     await db.close()
 
 if __name__ == "__main__":
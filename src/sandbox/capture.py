@@ -0,0 +1,206 @@
+"""
+Bounded capture of execution output.
+
+A command can print far more than the agent or the UI can use (`cat` of a
+multi-GB log). OutputCapture keeps only the first IRONCLAW_OUTPUT_HEAD and
+the last IRONCLAW_OUTPUT_TAIL characters in memory (default 8192 each), with
+the tail held in a ring buffer. Once output outgrows both, the whole stream
+is written to a spill file instead, so nothing is lost, and summary()
+points to it.
+
+Spill files are not kept forever: prune_spills() deletes the oldest ones
+beyond IRONCLAW_OUTPUT_KEEP_FILES files (default 20) or
+IRONCLAW_OUTPUT_KEEP_MB megabytes in total (default 256).
+"""
+
+import os
+from collections import deque
+from typing import Deque, Optional
+
+_DEFAULT_HEAD = 8192
+_DEFAULT_TAIL = 8192
+_DEFAULT_KEEP_FILES = 20
+_DEFAULT_KEEP_MB = 256
+SPILL_SUFFIX = ".log"
+
+
+def _env_int(name: str, default: int) -> int:
+    return max(0, int(os.environ.get(name, default)))
+
+
+def prune_spills(directory: str, max_files: Optional[int] = None, max_bytes: Optional[int] = None) -> int:
+    """Delete the oldest spill files in directory beyond a count or total size.
+
+    Args:
+        directory: Directory holding the spill files.
+        max_files: Files kept. Defaults to IRONCLAW_OUTPUT_KEEP_FILES (20).
+        max_bytes: Total size kept. Defaults to IRONCLAW_OUTPUT_KEEP_MB
+            (256) megabytes.
+
+    Returns:
+        How many files were removed.
+    """
+    if max_files is None:
+        max_files = _env_int("IRONCLAW_OUTPUT_KEEP_FILES", _DEFAULT_KEEP_FILES)
+    if max_bytes is None:
+        max_bytes = _env_int("IRONCLAW_OUTPUT_KEEP_MB", _DEFAULT_KEEP_MB) * 1024 * 1024
+    try:
+        entries = [e for e in os.scandir(directory) if e.name.endswith(SPILL_SUFFIX) and e.is_file()]
+    except FileNotFoundError:
+        return 0
+    spills = []
+    for entry in entries:
+        try:
+            st = entry.stat()
+        except FileNotFoundError:
+            continue
+        spills.append((st.st_mtime_ns, st.st_size, entry.path))
+    spills.sort(reverse=True)
+
+    removed = 0
+    kept_files = kept_bytes = 0
+    for _, size, path in spills:
+        if kept_files < max_files and kept_bytes + size <= max_bytes:
+            kept_files += 1
+            kept_bytes += size
+            continue
+        try:
+            os.remove(path)
+            removed += 1
+        except OSError:
+            pass
+    return removed
+
+
+class OutputCapture:
+    """Records a stream of text output with bounded memory.
+
+    Args:
+        head_chars: Characters kept from the start. Defaults to
+            IRONCLAW_OUTPUT_HEAD (8192).
+        tail_chars: Characters kept from the end. Defaults to
+            IRONCLAW_OUTPUT_TAIL (8192).
+        spill_path: File the full stream is written to once it no longer
+            fits in memory. Created only if needed; None keeps nothing.
+        spill_name: How summary() refers to the spill file (e.g. the
+            path inside the sandbox). Defaults to spill_path.
+    """
+
+    def __init__(
+        self,
+        head_chars: Optional[int] = None,
+        tail_chars: Optional[int] = None,
+        spill_path: Optional[str] = None,
+        spill_name: Optional[str] = None,
+    ):
+        self.head_chars = _env_int("IRONCLAW_OUTPUT_HEAD", _DEFAULT_HEAD) if head_chars is None else head_chars
+        self.tail_chars = _env_int("IRONCLAW_OUTPUT_TAIL", _DEFAULT_TAIL) if tail_chars is None else tail_chars
+        self.spill_path = spill_path
+        self.spill_name = spill_name or spill_path
+        self.total_bytes = 0
+        self.total_chars = 0
+        self._newlines = 0
+        self._last_char = ""
+        self._head: list = []
+        self._head_len = 0
+        self._tail: Deque[str] = deque()
+        self._tail_len = 0
+        self._spill = None
+        self.spilled = False
+
+    @property
+    def total_lines(self) -> int:
+        """Lines written so far, counting an unterminated last line."""
+        return self._newlines + (1 if self._last_char and self._last_char != "\n" else 0)
+
+    @property
+    def truncated(self) -> bool:
+        """True once some output is no longer held in memory."""
+        return self.total_chars > self.head_chars + self.tail_chars
+
+    def write(self, text: str) -> str:
+        """Record a chunk of output.
+
+        Returns:
+            The part of text kept in the head, so callers can stream output
+            until the head is full ("" after that).
+        """
+        if not text:
+            return ""
+        self.total_bytes += len(text.encode("utf-8", errors="replace"))
+        self.total_chars += len(text)
+        self._newlines += text.count("\n")
+        self._last_char = text[-1]
+
+        kept = ""
+        room = self.head_chars - self._head_len
+        if room > 0:
+            kept = text[:room]
+            self._head.append(kept)
+            self._head_len += len(kept)
+            text = text[room:]
+        if self._spill is not None:
+            self._write_spill(kept + text)
+        elif self.truncated and self.spill_path and not self.spilled:
+            # Nothing has been dropped yet: head, tail and this chunk hold the whole stream
+            self._open_spill(text)
+
+        # A single chunk can be far larger than the tail; keep only its end
+        text = text[-self.tail_chars:] if self.tail_chars else ""
+        if text:
+            self._tail.append(text)
+            self._tail_len += len(text)
+
+        # Ring buffer: drop whole chunks that are entirely outside the tail
+        while self._tail and self._tail_len - len(self._tail[0]) >= self.tail_chars:
+            self._tail_len -= len(self._tail.popleft())
+        return kept
+
+    def _open_spill(self, pending: str = ""):
+        self.spilled = True
+        try:
+            os.makedirs(os.path.dirname(self.spill_path) or ".", exist_ok=True)
+            self._spill = open(self.spill_path, "w", encoding="utf-8", errors="replace")
+        except OSError as e:
+            print(f"[!] Could not save full output to {self.spill_path}: {e}")
+            self.spill_name = None
+            return
+        self._write_spill("".join(self._head) + "".join(self._tail) + pending)
+
+    def _write_spill(self, text: str):
+        try:
+            self._spill.write(text)
+        except OSError as e:
+            print(f"[!] Could not save full output to {self.spill_path}: {e}")
+            self._spill.close()
+            self._spill = None
+            self.spill_name = None
+
+    def close(self):
+        if self._spill is not None:
+            self._spill.close()
+            self._spill = None
+
+    def summary(self) -> str:
+        """The output if it all fits in memory, else head and tail joined by a note."""
+        head = "".join(self._head)
+        if not self.truncated:
+            return head + "".join(self._tail)
+        tail = "".join(self._tail)[-self.tail_chars:] if self.tail_chars else ""
+        omitted = self.total_chars - len(head) - len(tail)
+        note = (
+            f"[... {omitted} characters omitted; "
+            f"{self.total_bytes} bytes, {self.total_lines} lines in total"
+        )
+        if self.spilled and self.spill_name:
+            note += f"; full output saved to {self.spill_name}"
+        note += " ...]"
+        if head and not head.endswith("\n"):
+            head += "\n"
+        return f"{head}{note}\n{tail}"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,138 @@
+"""
+Attached docker exec sessions.
+
+Wraps a long-lived process started inside the sandbox container with
+``exec_create`` + ``exec_start(socket=True)``, so the host can write to its
+stdin and read its stdout/stderr as demultiplexed docker stream frames.
+"""
+
+import codecs
+import socket
+from typing import List, Optional, Tuple
+
+from docker.utils.socket import STDERR, STDOUT, SocketError, next_frame_header, read_exactly
+
+__all__ = ["AttachedExec", "ExecSessionClosed", "StreamDecoder", "STDOUT", "STDERR"]
+
+
+class ExecSessionClosed(Exception):
+    """Raised when the attached process has exited or its socket was closed."""
+    pass
+
+
+class AttachedExec:
+    """A process running inside a container with stdin/stdout/stderr attached.
+
+    Args:
+        container: docker-py Container the process runs in.
+        cmd: Command (argv list) to execute.
+        workdir: Optional working directory inside the container.
+    """
+
+    def __init__(self, container, cmd: List[str], workdir: Optional[str] = None):
+        self.container = container
+        self.cmd = cmd
+        self.workdir = workdir
+        self.exec_id: Optional[str] = None
+        self._sock = None
+
+    @property
+    def closed(self) -> bool:
+        return self._sock is None
+
+    def start(self) -> "AttachedExec":
+        """Create the exec instance and attach to its socket."""
+        api = self.container.client.api
+        self.exec_id = api.exec_create(
+            self.container.id,
+            self.cmd,
+            stdin=True,
+            stdout=True,
+            stderr=True,
+            tty=False,
+            workdir=self.workdir,
+        )["Id"]
+        self._sock = api.exec_start(self.exec_id, socket=True)
+        return self
+
+    def write(self, data: bytes):
+        """Write raw bytes to the process's stdin."""
+        if self._sock is None:
+            raise ExecSessionClosed("exec session is not running")
+        raw = getattr(self._sock, "_sock", self._sock)
+        try:
+            raw.sendall(data)
+        except OSError as e:
+            self.close()
+            raise ExecSessionClosed(f"exec session stdin closed: {e}") from e
+
+    def read_frame(self) -> Tuple[int, bytes]:
+        """Block until the next stream frame arrives.
+
+        Returns:
+            (stream, payload) where stream is STDOUT or STDERR.
+
+        Raises:
+            ExecSessionClosed: if the process exited or the socket was closed.
+        """
+        if self._sock is None:
+            raise ExecSessionClosed("exec session is not running")
+        try:
+            stream, size = next_frame_header(self._sock)
+            if size < 0:
+                raise SocketError("Unexpected EOF")
+            payload = read_exactly(self._sock, size) if size else b""
+        except (SocketError, OSError, ValueError) as e:
+            self.close()
+            raise ExecSessionClosed(f"exec session ended: {e}") from e
+        return stream, payload
+
+    def exit_code(self) -> Optional[int]:
+        """Exit code of the process, or None while it is still running."""
+        if self.exec_id is None:
+            return None
+        return self.container.client.api.exec_inspect(self.exec_id).get("ExitCode")
+
+    def close(self):
+        """Close stdin and the socket. The process sees EOF on stdin."""
+        sock, self._sock = self._sock, None
+        if sock is None:
+            return
+        raw = getattr(sock, "_sock", sock)
+        try:
+            raw.shutdown(socket.SHUT_RDWR)
+        except (OSError, AttributeError):
+            pass
+        try:
+            sock.close()
+        except OSError:
+            pass
+
+
+class StreamDecoder:
+    """Incremental UTF-8 decoding for demultiplexed stdout/stderr bytes.
+
+    Multi-byte characters split across frame boundaries are held back until
+    the rest arrives instead of being replaced or raising.
+    """
+
+    NAMES = {STDOUT: "stdout", STDERR: "stderr"}
+
+    def __init__(self):
+        self._decoders = {}
+
+    def decode(self, stream: int, data: bytes, final: bool = False) -> str:
+        decoder = self._decoders.get(stream)
+        if decoder is None:
+            decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+            self._decoders[stream] = decoder
+        return decoder.decode(data, final)
+
+    def flush(self) -> List[Tuple[int, str]]:
+        """Decode whatever is still buffered at end of output."""
+        leftovers = []
+        for stream, decoder in self._decoders.items():
+            text = decoder.decode(b"", True)
+            if text:
+                leftovers.append((stream, text))
+        return leftovers
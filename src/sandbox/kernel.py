@@ -0,0 +1,368 @@
+"""
+Persistent Python kernel for the sandbox container.
+
+Instead of paying interpreter startup (and re-importing pandas/numpy) for every
+code block, a single long-lived worker process runs inside the container and
+executes blocks sent to it over an attached exec socket.
+
+Protocol (both directions): 4-byte big-endian length prefix + UTF-8 JSON.
+Requests go to the worker's stdin; responses come back on its stdout, which is
+reserved for the protocol. While a block runs, Python-level writes to
+sys.stdout/sys.stderr are sent immediately as "stream" messages, followed by a
+single "result" message carrying the exit status. fd-level output (e.g.
+subprocesses) is redirected to the container-side stderr and forwarded by the
+host as stderr.
+"""
+
+import json
+import struct
+import threading
+from typing import Dict, Generator, Optional, Tuple
+
+from src.sandbox.exec_session import AttachedExec, ExecSessionClosed, StreamDecoder, STDERR, STDOUT
+
+_HEADER = struct.Struct(">I")
+
+# Seconds an interrupted block gets to finish before the worker is killed
+_INTERRUPT_GRACE = 5.0
+
+# Source of the worker process. Runs under the container's python3 with no
+# dependencies beyond the standard library.
+KERNEL_SOURCE = r'''
+import io, json, os, signal, struct, sys, traceback
+
+_HEADER = struct.Struct(">I")
+# Characters per "stream" message
+_STREAM_FRAME = 64 * 1024
+_proto_in = os.fdopen(os.dup(0), "rb", buffering=0)
+_proto_out = os.fdopen(os.dup(1), "wb", buffering=0)
+# User code must not read the protocol stream or write raw bytes into it.
+_null = os.open(os.devnull, os.O_RDONLY)
+os.dup2(_null, 0)
+os.dup2(2, 1)
+sys.stdin = open(os.devnull)
+# Interrupts are for the running block; one arriving between blocks (or
+# while a result is being sent) must not kill the worker.
+signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+
+def _read_exactly(n):
+    data = b""
+    while len(data) < n:
+        chunk = _proto_in.read(n - len(data))
+        if not chunk:
+            return None
+        data += chunk
+    return data
+
+
+def _recv():
+    header = _read_exactly(_HEADER.size)
+    if header is None:
+        return None
+    payload = _read_exactly(_HEADER.unpack(header)[0])
+    return None if payload is None else json.loads(payload)
+
+
+def _send(msg):
+    payload = json.dumps(msg).encode("utf-8")
+    _proto_out.write(_HEADER.pack(len(payload)) + payload)
+
+
+class _StreamWriter(io.TextIOBase):
+    encoding = "utf-8"
+
+    def __init__(self, name, request_id):
+        self.name = name
+        self.request_id = request_id
+
+    def writable(self):
+        return True
+
+    def write(self, text):
+        # One huge print must not become one huge frame held in memory on both ends
+        for start in range(0, len(text), _STREAM_FRAME):
+            _send({"type": "stream", "id": self.request_id, "name": self.name,
+                   "text": text[start:start + _STREAM_FRAME]})
+        return len(text)
+
+
+def _execute(request_id, code, namespace):
+    status = 0
+    sys.stdout = _StreamWriter("stdout", request_id)
+    sys.stderr = _StreamWriter("stderr", request_id)
+    signal.signal(signal.SIGINT, signal.default_int_handler)
+    try:
+        exec(compile(code, "<ironclaw>", "exec"), namespace)
+    except SystemExit as e:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        if isinstance(e.code, int):
+            status = e.code
+        elif e.code is not None:
+            print(e.code, file=sys.stderr)
+            status = 1
+    except BaseException:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        traceback.print_exc()
+        status = 1
+    finally:
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        sys.stdout, sys.stderr = sys.__stdout__, sys.__stderr__
+    return status
+
+
+namespaces = {}
+_send({"type": "ready", "pid": os.getpid()})
+while True:
+    req = _recv()
+    if req is None:
+        break
+    session = req.get("session", "default")
+    if req["op"] == "exec":
+        namespace = namespaces.setdefault(session, {"__name__": "__main__"})
+        status = _execute(req["id"], req["code"], namespace)
+        _send({"type": "result", "id": req["id"], "status": status})
+    elif req["op"] == "reset":
+        namespaces.pop(session, None)
+        _send({"type": "result", "id": req["id"], "status": 0})
+    elif req["op"] == "get_state":
+        _send({"type": "result", "id": req["id"], "status": 0,
+               "cwd": os.getcwd(), "env": dict(os.environ)})
+    elif req["op"] == "set_state":
+        os.environ.clear()
+        os.environ.update(req["env"])
+        try:
+            os.chdir(req["cwd"])
+            status = 0
+        except OSError:
+            status = 1
+        _send({"type": "result", "id": req["id"], "status": status})
+'''
+
+
+class KernelError(Exception):
+    """Raised when the kernel worker misbehaves (protocol error or unexpected exit)."""
+    pass
+
+
+class PythonKernel:
+    """Host-side handle to the persistent Python worker in one container.
+
+    The worker is started lazily on first use and respawned automatically if
+    it has died. Each session gets its own globals namespace inside the worker.
+    Calls are serialised: the worker executes one block at a time.
+
+    Args:
+        container: docker-py Container to run the worker in.
+        exec_factory: Callable (container, cmd) -> started AttachedExec-like
+            object. Overridable for tests.
+    """
+
+    def __init__(self, container, exec_factory=None):
+        self.container = container
+        self._exec_factory = exec_factory or (lambda c, cmd: AttachedExec(c, cmd).start())
+        self._exec = None
+        self._buffer = bytearray()
+        self._lock = threading.RLock()
+        self._next_id = 0
+        self.pid: Optional[int] = None
+        self.last_status: Optional[int] = None
+        self._last_result: dict = {}
+
+    @property
+    def running(self) -> bool:
+        return self._exec is not None and not self._exec.closed
+
+    def _ensure_started(self):
+        if self.running:
+            return
+        self._buffer = bytearray()
+        self._exec = self._exec_factory(self.container, ["python3", "-u", "-c", KERNEL_SOURCE])
+        for kind, ready in self._frames():
+            if kind == "message":
+                break
+        if ready.get("type") != "ready":
+            raise KernelError(f"Unexpected kernel handshake: {ready!r}")
+        self.pid = ready.get("pid")
+
+    def start(self):
+        """Start the worker now instead of on first use."""
+        with self._lock:
+            self._ensure_started()
+
+    def _send(self, msg: dict):
+        payload = json.dumps(msg).encode("utf-8")
+        self._exec.write(_HEADER.pack(len(payload)) + payload)
+
+    def _frames(self):
+        """Yield ("message", dict) for protocol messages and ("stderr", bytes)
+        for fd-level output, in arrival order."""
+        while True:
+            while len(self._buffer) >= _HEADER.size:
+                (size,) = _HEADER.unpack_from(self._buffer)
+                end = _HEADER.size + size
+                if len(self._buffer) < end:
+                    break
+                payload = bytes(self._buffer[_HEADER.size:end])
+                del self._buffer[:end]
+                yield "message", json.loads(payload)
+            stream, data = self._exec.read_frame()
+            if stream == STDOUT:
+                self._buffer += data
+            else:
+                yield "stderr", data
+
+    def _request(self, op: str, **fields) -> Generator[Tuple[str, str], None, None]:
+        """Send one request and yield (stream, text) output until its result.
+
+        Sets self.last_status when the result arrives.
+        """
+        self._ensure_started()
+        self._next_id += 1
+        request_id = self._next_id
+        decoder = StreamDecoder()
+        self.last_status = None
+        self._last_result = {}
+        try:
+            self._send({"op": op, "id": request_id, **fields})
+            for kind, item in self._frames():
+                if kind == "stderr":
+                    text = decoder.decode(STDERR, item)
+                    if text:
+                        yield "stderr", text
+                    continue
+                if item.get("id") != request_id:
+                    raise KernelError(f"Out-of-order kernel response: {item!r}")
+                if item["type"] == "stream":
+                    yield item["name"], item["text"]
+                elif item["type"] == "result":
+                    self.last_status = item.get("status", 0)
+                    self._last_result = item
+                    break
+        except ExecSessionClosed:
+            self._exec = None
+            self.pid = None
+            self.last_status = -1
+            yield "stderr", "Python kernel exited unexpectedly; it will be restarted on the next run.\n"
+        for stream, text in decoder.flush():
+            yield StreamDecoder.NAMES[stream], text
+
+    def stream(self, code: str, session: str = "default") -> Generator[Tuple[str, str], None, None]:
+        """Execute code in the session's namespace, yielding output as it is produced.
+
+        Yields:
+            (stream, text) where stream is "stdout" or "stderr".
+
+        After the generator is exhausted, self.last_status holds 0 on success,
+        non-zero on an uncaught exception or sys.exit(n). Abandoning the
+        generator early interrupts the block and waits for it to finish so
+        the protocol stays in sync; a block still running after
+        _INTERRUPT_GRACE seconds is ended by killing the worker.
+        """
+        with self._lock:
+            pieces = self._request("exec", code=code, session=session)
+            for piece in pieces:
+                try:
+                    yield piece
+                except GeneratorExit:
+                    self._abandon(pieces)
+                    raise
+
+    def _abandon(self, pieces):
+        """
+        Interrupt the running block and drain its output. A block that
+        ignores KeyboardInterrupt gets _INTERRUPT_GRACE seconds, then the
+        worker is killed (ending the drain) and respawned on next use.
+        """
+        pid = self.pid
+        self.interrupt()
+        deadline = threading.Timer(_INTERRUPT_GRACE, self._kill, args=(pid,))
+        deadline.daemon = True
+        deadline.start()
+        try:
+            for _ in pieces:
+                pass
+        finally:
+            deadline.cancel()
+
+    def _kill(self, pid: Optional[int]):
+        if pid is not None:
+            self.container.exec_run(["kill", "-9", str(pid)])
+
+    def execute(self, code: str, session: str = "default") -> Tuple[str, int]:
+        """Execute code in the session's namespace.
+
+        Returns:
+            (output, status) — combined output and the exit status (see stream()).
+        """
+        output = "".join(text for _, text in self.stream(code, session))
+        return output, self.last_status
+
+    def reset(self, session: str = "default"):
+        """Drop a session's namespace without restarting the worker."""
+        if self.running:
+            with self._lock:
+                for _ in self._request("reset", session=session):
+                    pass
+
+    def get_state(self) -> dict:
+        """The worker's working directory and environment ({"cwd", "env"})."""
+        with self._lock:
+            for _ in self._request("get_state"):
+                pass
+            return {"cwd": self._last_result.get("cwd"), "env": self._last_result.get("env", {})}
+
+    def set_state(self, state: dict):
+        """Switch the worker to a working directory and environment from get_state()."""
+        with self._lock:
+            for _ in self._request("set_state", cwd=state["cwd"], env=state["env"]):
+                pass
+
+    def interrupt(self):
+        """Raise KeyboardInterrupt in the currently executing block."""
+        if self.pid is not None:
+            self.container.exec_run(["kill", "-INT", str(self.pid)])
+
+    def restart(self):
+        """Kill the worker. A fresh one (with empty namespaces) starts on next use.
+
+        The kill happens before taking the lock so a stuck block can be
+        recovered from another thread.
+        """
+        self._kill(self.pid)
+        with self._lock:
+            self.shutdown()
+
+    def shutdown(self):
+        """Close the worker's stdin; it exits once the current block finishes."""
+        if self._exec is not None:
+            self._exec.close()
+        self._exec = None
+        self.pid = None
+
+
+# One kernel per container, plus one per extra parallel-execution slot
+_kernels: Dict[Tuple[str, int], PythonKernel] = {}
+_kernels_lock = threading.Lock()
+
+
+def get_kernel(container, slot: int = 0) -> PythonKernel:
+    """Kernel for a container. Slots above 0 are separate workers, so blocks
+    run concurrently (see SandboxedTool.confirm_execution) don't queue
+    behind each other."""
+    with _kernels_lock:
+        key = (container.id, slot)
+        kernel = _kernels.get(key)
+        if kernel is None:
+            kernel = PythonKernel(container)
+            _kernels[key] = kernel
+        return kernel
+
+
+def discard_kernel(container):
+    """Forget the kernel handles for a container that is being recycled or removed."""
+    with _kernels_lock:
+        keys = [key for key in _kernels if key[0] == container.id]
+        kernels = [_kernels.pop(key) for key in keys]
+    for kernel in kernels:
+        kernel.shutdown()
@@ -1,9 +1,16 @@
 from typing import Generator
-from interpreter.core.computer.terminal.base_language import BaseLanguage
+from src.sandbox.kernel import get_kernel
+from src.sandbox.shell import get_shell
 
-class DockerLanguage(BaseLanguage):
-    def __init__(self, container):
+class DockerLanguage:
+    # Implements Open Interpreter's BaseLanguage interface (name, aliases,
+    # run/stop/terminate). OI duck-types languages, so this module doesn't
+    # subclass it and importing it doesn't load the interpreter package.
+    def __init__(self, container, session_id: str = "default", slot: int = 0):
         self.container = container
+        self.session_id = session_id
+        # Parallel-execution slot; slots above 0 get their own kernel worker
+        self.slot = slot
 
     def stop(self):
         pass
@@ -11,20 +18,75 @@ class DockerLanguage(BaseLanguage):
     def terminate(self):
         pass
 
+    @staticmethod
+    def _console_chunks(pieces) -> Generator[dict, None, None]:
+        """Convert (stream, text) pieces into LMC console output chunks.
+
+        stdout and stderr stay separate chunks, tagged with a "stream" key.
+        """
+        for stream, text in pieces:
+            yield {"type": "console", "format": "output", "content": text, "stream": stream}
+
+    @staticmethod
+    def _exit_chunk(exit_code) -> dict:
+        return {"type": "console", "format": "exit_code", "content": exit_code}
+
 class DockerPython(DockerLanguage):
     name = "python"
     file_extension = "py"
     aliases = ["python3", "py"]
 
+    @property
+    def kernel(self):
+        return get_kernel(self.container, self.slot)
+
     def run(self, code: str) -> Generator[dict, None, None]:
-        result = self.container.exec_run(["python3", "-c", code])
-        yield {"type": "console", "format": "output", "content": result.output.decode("utf-8")}
+        # Runs in the container's persistent kernel: state survives between blocks
+        kernel = self.kernel
+        yield from self._console_chunks(kernel.stream(code, session=self.session_id))
+        yield self._exit_chunk(kernel.last_status)
+
+    def get_state(self) -> dict:
+        """The kernel's cwd and environment, for set_state() on another slot."""
+        return self.kernel.get_state()
+
+    def set_state(self, state: dict):
+        self.kernel.set_state(state)
+
+    def stop(self):
+        self.kernel.interrupt()
+
+    def terminate(self):
+        self.kernel.reset(self.session_id)
+
+    def restart(self):
+        """Restart the kernel worker, discarding every session's state."""
+        self.kernel.restart()
 
 class DockerShell(DockerLanguage):
     name = "shell"
     file_extension = "sh"
     aliases = ["bash", "sh", "zsh"]
 
+    @property
+    def shell(self):
+        return get_shell(self.container, self.session_id)
+
     def run(self, code: str) -> Generator[dict, None, None]:
-        result = self.container.exec_run(["/bin/bash", "-c", code])
-        yield {"type": "console", "format": "output", "content": result.output.decode("utf-8")}
+        # Runs in the session's persistent bash: cwd and env survive between blocks
+        shell = self.shell
+        yield from self._console_chunks(shell.stream(code))
+        yield self._exit_chunk(shell.exit_code)
+
+    def get_state(self) -> str:
+        """The shell's cwd and exported variables, for set_state() on another slot."""
+        return self.shell.get_state()
+
+    def set_state(self, state: str):
+        self.shell.set_state(state)
+
+    def stop(self):
+        self.shell.interrupt()
+
+    def terminate(self):
+        self.shell.restart()
@@ -1,7 +1,8 @@
 import docker
 import os
+import threading
 import time
-from typing import Optional
+from typing import Dict, Optional
 from docker.models.containers import Container
 from docker.errors import DockerException, ImageNotFound
 
@@ -16,19 +17,11 @@ class SandboxManager:
         self.container_name = container_name
         self.workspace_path = os.path.abspath("workspace")
         os.makedirs(self.workspace_path, exist_ok=True)
+        self._image_lock = threading.Lock()
 
-    def get_or_create_container(self) -> Container:
-        """
-        Gets the existing container or creates a new one.
-        The container runs a persistent 'tail -f /dev/null' command.
-        """
-        try:
-            container = self.client.containers.get(self.container_name)
-            if container.status != "running":
-                container.start()
-            return container
-        except docker.errors.NotFound:
-            # Ensure image exists
+    def ensure_image(self):
+        """Builds (from the local Dockerfile) or pulls the sandbox image if missing."""
+        with self._image_lock:
             try:
                 self.client.images.get(self.image)
             except ImageNotFound:
@@ -39,20 +32,52 @@ class SandboxManager:
                     print(f"Pulling image {self.image}...")
                     self.client.images.pull(self.image)
 
-            # Create container
-            container = self.client.containers.run(
-                self.image,
-                command="tail -f /dev/null",
-                name=self.container_name,
-                detach=True,
-                volumes={
-                    self.workspace_path: {"bind": "/workspace", "mode": "rw"}
-                },
-                working_dir="/workspace",
-                # Run as current user to avoid permission issues with volume mounts
-                user=f"{os.getuid()}:{os.getgid()}" if hasattr(os, 'getuid') else None
-            )
+    def create_container(
+        self,
+        name: Optional[str] = None,
+        labels: Optional[Dict[str, str]] = None,
+        workspace_path: Optional[str] = None,
+    ) -> Container:
+        """
+        Starts a new sandbox container running 'tail -f /dev/null'.
+        `workspace_path` (default: the shared workspace) is mounted at /workspace.
+        """
+        self.ensure_image()
+        return self.client.containers.run(
+            self.image,
+            command="tail -f /dev/null",
+            name=name,
+            labels=labels or {},
+            detach=True,
+            volumes={
+                os.path.abspath(workspace_path or self.workspace_path): {"bind": "/workspace", "mode": "rw"}
+            },
+            working_dir="/workspace",
+            # Run as current user to avoid permission issues with volume mounts
+            user=f"{os.getuid()}:{os.getgid()}" if hasattr(os, 'getuid') else None
+        )
+
+    def destroy_container(self, container: Container):
+        """Force-removes a container, ignoring ones that are already gone."""
+        try:
+            container.remove(force=True)
+        except docker.errors.NotFound:
+            pass
+        except DockerException as e:
+            print(f"Error removing container {container.name}: {e}")
+
+    def get_or_create_container(self) -> Container:
+        """
+        Gets the existing container or creates a new one.
+        The container runs a persistent 'tail -f /dev/null' command.
+        """
+        try:
+            container = self.client.containers.get(self.container_name)
+            if container.status != "running":
+                container.start()
             return container
+        except docker.errors.NotFound:
+            return self.create_container(name=self.container_name)
 
     def stop_container(self):
         """Stops and removes the container."""
@@ -0,0 +1,334 @@
+"""
+Warm container pool for the sandbox.
+
+Keeps a few pre-started, idle sandbox containers ready so that a new chat
+session never waits for an image build/pull or a container start. Each
+session leases its own container; on release the container is wiped of
+processes and temp files and returned to the pool, or destroyed if the pool
+is already full. A background thread refills the pool.
+
+Sessions with their own workspace directory: every pooled container is
+started with an empty slot directory (workspace/.pool/<name>) mounted at
+/workspace. Leasing moves the session's files into the slot and renames the
+slot to the session's directory; with a local Linux daemon the bind mount
+follows the rename, so the warm container sees exactly that session's files.
+A marker file confirms it. Where the mount doesn't follow (Docker Desktop's
+file sharing, rootless or remote daemons), the lease falls back to starting
+a fresh container on the session's directory, and later leases with a
+workspace skip the pool. Bound containers are destroyed, not recycled, on
+release.
+"""
+
+import atexit
+import os
+import shutil
+import socket
+import threading
+import time
+import uuid
+from typing import Dict, List, Optional, Set
+
+from docker.errors import DockerException
+from docker.models.containers import Container
+
+from src.sandbox.manager import SandboxManager
+from src.sandbox.kernel import discard_kernel
+from src.sandbox.shell import discard_shells
+
+POOL_LABEL = "ironclaw.pool"
+OWNER_LABEL = "ironclaw.owner"
+
+_DEFAULT_POOL_SIZE = 2
+
+# Runs inside a released container: clear temp files, then kill every process
+# except PID 1 (`kill -1` skips init, and the shell that issued it dies last).
+# Only if PID 1 is the container's own command or init, i.e. the container
+# has its own PID namespace; otherwise it exits with _RESET_REFUSED and the
+# container is destroyed instead.
+_RESET_REFUSED = 3
+_RESET_CMD = [
+    "/bin/sh", "-c",
+    "rm -rf /tmp/* /tmp/.[!.]* 2>/dev/null; "
+    f"case \"$(cat /proc/1/comm)\" in tail|docker-init|tini) ;; *) exit {_RESET_REFUSED};; esac; "
+    "kill -9 -1",
+]
+
+
+def _owner_id() -> str:
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def _pid_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class ContainerPool:
+    """Pool of pre-started sandbox containers leased out per session.
+
+    Args:
+        manager: SandboxManager used to create/destroy containers.
+        size: Number of idle containers to keep ready. Defaults to
+            IRONCLAW_POOL_SIZE (2). 0 disables pre-starting; leases then
+            create containers on demand.
+    """
+
+    def __init__(self, manager: Optional[SandboxManager] = None, size: Optional[int] = None):
+        self.manager = manager or SandboxManager()
+        if size is None:
+            size = int(os.environ.get("IRONCLAW_POOL_SIZE", _DEFAULT_POOL_SIZE))
+        self.size = max(0, size)
+        self._idle: List[Container] = []
+        self._leases: Dict[str, Container] = {}
+        self._slots: Dict[str, str] = {}  # container id -> slot dir (idle, unbound)
+        self._bound: Set[str] = set()  # ids of containers mounted on a session workspace
+        # Whether a slot's bind mount follows its rename; None until first tried
+        self._rename_binds: Optional[bool] = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self._thread: Optional[threading.Thread] = None
+        self._labels = {POOL_LABEL: self.manager.image, OWNER_LABEL: _owner_id()}
+
+    @property
+    def idle_count(self) -> int:
+        with self._cond:
+            return len(self._idle)
+
+    def leased(self) -> Dict[str, Container]:
+        """Snapshot of session_id -> container for current leases."""
+        with self._cond:
+            return dict(self._leases)
+
+    def start(self) -> "ContainerPool":
+        """Reap containers left behind by dead processes and start the refill thread."""
+        with self._cond:
+            if self._thread is not None:
+                return self
+            self._thread = threading.Thread(target=self._refill_loop, name="ironclaw-pool-refill", daemon=True)
+        self._reap_orphans()
+        self._thread.start()
+        return self
+
+    def wait_until_warm(self, timeout: Optional[float] = None, count: Optional[int] = None) -> bool:
+        """Block until the pool holds `count` (default `size`) idle containers. Returns False on timeout."""
+        count = self.size if count is None else min(count, self.size)
+        with self._cond:
+            return self._cond.wait_for(lambda: self._closed or len(self._idle) >= count, timeout)
+
+    def lease(self, session_id: str, workspace_path: Optional[str] = None) -> Container:
+        """Returns the session's container, taking a warm one from the pool if needed.
+
+        Args:
+            session_id: Lease key.
+            workspace_path: Session workspace directory to mount at /workspace.
+                None shares the manager's workspace across sessions.
+        """
+        container = None
+        with self._cond:
+            if session_id in self._leases:
+                return self._leases[session_id]
+            usable = workspace_path is None or self._rename_binds is not False
+            while usable and self._idle and container is None:
+                candidate = self._idle.pop(0)
+                if self._is_running(candidate):
+                    container = candidate
+                else:
+                    self._destroy_later(candidate)
+            self._cond.notify_all()  # wake the refill thread
+
+        if container is not None and workspace_path is not None:
+            if not self._bind_workspace(container, workspace_path):
+                self._destroy_later(container)
+                container = None
+        if container is None:
+            # Cold path: pool empty (or disabled), or the slot couldn't be adopted
+            container = self.manager.create_container(
+                name=self._new_name(), labels=self._labels, workspace_path=workspace_path
+            )
+            if workspace_path is not None:
+                with self._cond:
+                    self._bound.add(container.id)
+
+        with self._cond:
+            current = self._leases.setdefault(session_id, container)
+        if current is not container:
+            # Another thread leased for this session concurrently
+            self._destroy(container)
+        return current
+
+    def release(self, session_id: str, recycle: bool = True):
+        """Ends a session's lease, recycling the container into the pool or destroying it.
+
+        Containers bound to a session workspace are always destroyed.
+        """
+        with self._cond:
+            container = self._leases.pop(session_id, None)
+            if container is not None and container.id in self._bound:
+                recycle = False
+        if container is None:
+            return
+
+        discard_kernel(container)
+        discard_shells(container)
+        if recycle:
+            try:
+                reset = container.exec_run(_RESET_CMD)
+                recycle = reset.exit_code != _RESET_REFUSED and self._is_running(container)
+            except DockerException:
+                recycle = False
+
+        with self._cond:
+            if recycle and not self._closed and len(self._idle) < self.size:
+                self._idle.append(container)
+                self._cond.notify_all()
+                return
+        self._destroy(container)
+
+    def shutdown(self):
+        """Stop refilling and destroy every idle and leased container."""
+        with self._cond:
+            self._closed = True
+            containers = self._idle + list(self._leases.values())
+            self._idle = []
+            self._leases = {}
+            self._cond.notify_all()
+        for container in containers:
+            discard_kernel(container)
+            discard_shells(container)
+            self._destroy(container)
+
+    @staticmethod
+    def _new_name() -> str:
+        return f"ironclaw-sandbox-{uuid.uuid4().hex[:8]}"
+
+    def _create(self) -> Container:
+        """Start an unbound container on a fresh, empty slot directory."""
+        name = self._new_name()
+        slot = os.path.join(self.manager.workspace_path, ".pool", name)
+        os.makedirs(slot, exist_ok=True)
+        try:
+            container = self.manager.create_container(name=name, labels=self._labels, workspace_path=slot)
+        except BaseException:
+            shutil.rmtree(slot, ignore_errors=True)
+            raise
+        with self._cond:
+            self._slots[container.id] = slot
+        return container
+
+    def _bind_workspace(self, container: Container, workspace_path: str) -> bool:
+        """Turn an idle container's slot directory into the session's workspace."""
+        with self._cond:
+            slot = self._slots.pop(container.id, None)
+        if slot is None:
+            return False
+        try:
+            os.makedirs(workspace_path, exist_ok=True)
+            if os.stat(slot).st_dev != os.stat(workspace_path).st_dev:
+                return False  # rename can't cross filesystems
+            for entry in os.listdir(workspace_path):
+                os.rename(os.path.join(workspace_path, entry), os.path.join(slot, entry))
+            os.rmdir(workspace_path)
+            os.rename(slot, workspace_path)
+        except OSError as e:
+            print(f"[!] Could not bind pooled container to {workspace_path}: {e}")
+            return False
+        # The files are in the session's directory either way, so a fresh
+        # container mounted on it works if this one can't see them
+        follows = self._sees_workspace(container, workspace_path)
+        with self._cond:
+            if not follows and self._rename_binds is not False:
+                print("[!] Docker bind mounts don't follow a renamed directory here; "
+                      "sessions with their own workspace will start fresh containers")
+            self._rename_binds = follows
+            if follows:
+                self._bound.add(container.id)
+        return follows
+
+    @staticmethod
+    def _sees_workspace(container: Container, workspace_path: str) -> bool:
+        """True if the container's /workspace is workspace_path, checked with a marker file."""
+        marker = f".ironclaw-bind-{uuid.uuid4().hex[:8]}"
+        path = os.path.join(workspace_path, marker)
+        try:
+            open(path, "w").close()
+            return container.exec_run(["test", "-e", f"/workspace/{marker}"]).exit_code == 0
+        except (OSError, DockerException):
+            return False
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _destroy(self, container: Container):
+        with self._cond:
+            slot = self._slots.pop(container.id, None)
+            self._bound.discard(container.id)
+        self.manager.destroy_container(container)
+        if slot is not None:
+            shutil.rmtree(slot, ignore_errors=True)
+
+    def _is_running(self, container: Container) -> bool:
+        try:
+            container.reload()
+        except DockerException:
+            return False
+        return container.status == "running"
+
+    def _destroy_later(self, container: Container):
+        threading.Thread(target=self._destroy, args=(container,), daemon=True).start()
+
+    def _refill_loop(self):
+        backoff = 1.0
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._closed or len(self._idle) < self.size)
+                if self._closed:
+                    return
+            try:
+                container = self._create()
+            except Exception as e:
+                print(f"[!] Sandbox pool refill failed: {e}")
+                time.sleep(backoff)
+                backoff = min(backoff * 2, 60.0)
+                continue
+            backoff = 1.0
+            with self._cond:
+                if not self._closed and len(self._idle) < self.size:
+                    self._idle.append(container)
+                    self._cond.notify_all()
+                    continue
+            self._destroy(container)
+
+    def _reap_orphans(self):
+        """Remove pool containers whose owning process on this host has exited."""
+        host = socket.gethostname()
+        try:
+            containers = self.manager.client.containers.list(all=True, filters={"label": POOL_LABEL})
+        except DockerException:
+            return
+        for container in containers:
+            owner = container.labels.get(OWNER_LABEL, "")
+            owner_host, _, pid = owner.rpartition(":")
+            if owner_host == host and pid.isdigit() and not _pid_alive(int(pid)):
+                self.manager.destroy_container(container)
+                shutil.rmtree(os.path.join(self.manager.workspace_path, ".pool", container.name), ignore_errors=True)
+
+
+# Process-wide pool
+_pool: Optional[ContainerPool] = None
+_pool_lock = threading.Lock()
+
+
+def get_pool() -> ContainerPool:
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ContainerPool().start()
+            atexit.register(_pool.shutdown)
+        return _pool
@@ -0,0 +1,181 @@
+"""
+Registry of live per-session sandboxes.
+
+Tracks one value (a session's sandbox) per session id in LRU order. Values
+idle for longer than a TTL are evicted by a background reaper, and when the
+number of live values reaches a cap the least recently used idle one is
+evicted to make room. Values that report themselves busy are never evicted.
+"""
+
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Dict, Generic, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+_DEFAULT_MAX_LIVE = 8
+_DEFAULT_IDLE_TTL = 900.0  # seconds
+
+
+class _Entry(Generic[T]):
+    __slots__ = ("value", "last_used")
+
+    def __init__(self, value: T):
+        self.value = value
+        self.last_used = time.monotonic()
+
+
+class SessionRegistry(Generic[T]):
+    """LRU registry of per-session values with idle eviction.
+
+    Args:
+        factory: Called with a session id to create its value.
+        on_evict: Called with a value after it has been removed from the registry.
+        max_live: Cap on live values. Defaults to IRONCLAW_MAX_SANDBOXES (8).
+        idle_ttl: Seconds of inactivity before a value is evicted. Defaults to
+            IRONCLAW_SANDBOX_IDLE_TTL (900). 0 disables idle eviction.
+        reap_interval: Seconds between idle sweeps.
+    """
+
+    def __init__(
+        self,
+        factory: Callable[[str], T],
+        on_evict: Callable[[T], None],
+        max_live: Optional[int] = None,
+        idle_ttl: Optional[float] = None,
+        reap_interval: float = 30.0,
+    ):
+        self.factory = factory
+        self.on_evict = on_evict
+        if max_live is None:
+            max_live = int(os.environ.get("IRONCLAW_MAX_SANDBOXES", _DEFAULT_MAX_LIVE))
+        if idle_ttl is None:
+            idle_ttl = float(os.environ.get("IRONCLAW_SANDBOX_IDLE_TTL", _DEFAULT_IDLE_TTL))
+        self.max_live = max(1, max_live)
+        self.idle_ttl = idle_ttl
+        self.reap_interval = reap_interval
+        self._entries: "OrderedDict[str, _Entry[T]]" = OrderedDict()  # oldest first
+        self._creating: Dict[str, threading.Event] = {}
+        self._lock = threading.Lock()
+        self._reaper: Optional[threading.Thread] = None
+        self._stopped = threading.Event()
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, session_id: str) -> bool:
+        with self._lock:
+            return session_id in self._entries
+
+    def sessions(self) -> List[str]:
+        """Session ids from least to most recently used."""
+        with self._lock:
+            return list(self._entries)
+
+    def peek(self, session_id: str) -> Optional[T]:
+        """Returns the session's value without creating it or marking it used."""
+        with self._lock:
+            entry = self._entries.get(session_id)
+            return entry.value if entry else None
+
+    def get(self, session_id: str) -> T:
+        """Returns the session's value, creating it if needed, and marks it used."""
+        self._ensure_reaper()
+        while True:
+            with self._lock:
+                entry = self._entries.get(session_id)
+                if entry is not None:
+                    self._entries.move_to_end(session_id)
+                    entry.last_used = time.monotonic()
+                    return entry.value
+                pending = self._creating.get(session_id)
+                if pending is None:
+                    self._creating[session_id] = threading.Event()
+                    break
+            # Another thread is creating this session's value
+            pending.wait()
+
+        try:
+            value = self.factory(session_id)
+        except BaseException:
+            with self._lock:
+                self._creating.pop(session_id).set()
+            raise
+
+        with self._lock:
+            self._entries[session_id] = _Entry(value)
+            self._creating.pop(session_id).set()
+            evicted = self._pop_over_cap(keep=session_id)
+        self._evict(evicted)
+        return value
+
+    def remove(self, session_id: str) -> bool:
+        """Evicts a session's value now. Returns False if it was not live."""
+        with self._lock:
+            entry = self._entries.pop(session_id, None)
+        if entry is None:
+            return False
+        self._evict([entry.value])
+        return True
+
+    def reap(self) -> int:
+        """Evicts values idle for longer than idle_ttl. Returns how many were evicted."""
+        if self.idle_ttl <= 0:
+            return 0
+        cutoff = time.monotonic() - self.idle_ttl
+        with self._lock:
+            expired = [
+                sid for sid, entry in self._entries.items()
+                if entry.last_used < cutoff and not self._is_busy(entry.value)
+            ]
+            values = [self._entries.pop(sid).value for sid in expired]
+        self._evict(values)
+        return len(values)
+
+    def close(self):
+        """Stops the reaper and evicts everything."""
+        self._stopped.set()
+        with self._lock:
+            values = [entry.value for entry in self._entries.values()]
+            self._entries.clear()
+        self._evict(values)
+
+    @staticmethod
+    def _is_busy(value) -> bool:
+        return bool(getattr(value, "busy", False))
+
+    def _pop_over_cap(self, keep: str) -> List[T]:
+        """Remove least recently used idle values (other than `keep`) until
+        under the cap. Caller holds the lock."""
+        evicted = []
+        for sid in list(self._entries):
+            if len(self._entries) <= self.max_live:
+                break
+            entry = self._entries[sid]
+            if sid != keep and not self._is_busy(entry.value):
+                evicted.append(self._entries.pop(sid).value)
+        if len(self._entries) > self.max_live:
+            print(f"[!] {len(self._entries)} sandboxes busy; exceeding cap of {self.max_live}")
+        return evicted
+
+    def _evict(self, values: List[T]):
+        for value in values:
+            try:
+                self.on_evict(value)
+            except Exception as e:
+                print(f"[!] Failed to evict sandbox: {e}")
+
+    def _ensure_reaper(self):
+        if self._reaper is not None or self.idle_ttl <= 0:
+            return
+        with self._lock:
+            if self._reaper is None:
+                self._reaper = threading.Thread(target=self._reap_loop, name="ironclaw-sandbox-reaper", daemon=True)
+                self._reaper.start()
+
+    def _reap_loop(self):
+        while not self._stopped.wait(self.reap_interval):
+            self.reap()
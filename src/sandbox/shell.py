@@ -0,0 +1,253 @@
+"""
+Persistent bash sessions for the sandbox container.
+
+Each session keeps one non-interactive bash attached over a docker exec socket,
+so `cd`, `export` and `source venv/bin/activate` survive between code blocks.
+Every command is followed by a unique sentinel marker on stdout (carrying the
+exit code) and on stderr, which is how command boundaries are detected without
+a TTY. A shell that dies (e.g. user code ran `exit`) is respawned on next use.
+"""
+
+import base64
+import threading
+import uuid
+from typing import Dict, Generator, Optional, Tuple
+
+from src.sandbox.exec_session import AttachedExec, ExecSessionClosed, StreamDecoder, STDERR, STDOUT
+
+# setsid makes bash a process group leader, so an interrupt can reach the
+# running command and everything it started (see ShellSession.interrupt)
+_SHELL_CMD = ["setsid", "-w", "/bin/bash", "--noprofile", "--norc"]
+
+# Seconds an interrupted command gets to finish before bash is killed
+_INTERRUPT_GRACE = 5.0
+
+
+def _partial_marker_len(buf: bytearray, marker: bytes) -> int:
+    """Length of the longest suffix of buf that is a proper prefix of marker."""
+    for k in range(min(len(buf), len(marker) - 1), 0, -1):
+        if buf.endswith(marker[:k]):
+            return k
+    return 0
+
+
+class ShellSession:
+    """Host-side handle to one long-lived bash process in a container.
+
+    Args:
+        container: docker-py Container to run bash in.
+        exec_factory: Callable (container, cmd) -> started AttachedExec-like
+            object. Overridable for tests.
+    """
+
+    def __init__(self, container, exec_factory=None):
+        self.container = container
+        self._exec_factory = exec_factory or (lambda c, cmd: AttachedExec(c, cmd).start())
+        self._exec = None
+        self._lock = threading.RLock()
+        self.pid: Optional[int] = None
+        self.exit_code: Optional[int] = None
+
+    @property
+    def running(self) -> bool:
+        return self._exec is not None and not self._exec.closed
+
+    def _ensure_started(self):
+        if self.running:
+            return
+        self._exec = self._exec_factory(self.container, list(_SHELL_CMD))
+        self.pid = None
+        # Learn bash's pid (and process group) so stop() can interrupt its
+        # children. The INT trap keeps bash itself alive when the group is
+        # interrupted; commands it starts get the default handler back.
+        output, _ = self._collect(self._command("trap : INT; echo $$"))
+        if output.strip().isdigit():
+            self.pid = int(output.strip())
+
+    def start(self):
+        """Start bash now instead of on first use."""
+        with self._lock:
+            self._ensure_started()
+
+    def _command(self, code: str) -> Generator[Tuple[int, bytes], None, None]:
+        """Send one command and yield (stream, bytes) pieces until its markers arrive.
+
+        Sets self.exit_code when done.
+        """
+        marker = f"__IRONCLAW_{uuid.uuid4().hex}__"
+        encoded = base64.b64encode(code.encode("utf-8")).decode("ascii")
+        script = (
+            f"eval \"$(printf '%s' '{encoded}' | base64 -d)\" < /dev/null\n"
+            f"__ironclaw_rc=$?\n"
+            f"printf '%s %s\\n' '{marker}' \"$__ironclaw_rc\"\n"
+            f"printf '%s\\n' '{marker}' >&2\n"
+        )
+        marker_bytes = marker.encode("ascii")
+        pending = {STDOUT: bytearray(), STDERR: bytearray()}
+        done = {STDOUT: False, STDERR: False}
+        self.exit_code = None
+
+        try:
+            self._exec.write(script.encode("utf-8"))
+            while not all(done.values()):
+                stream, data = self._exec.read_frame()
+                if done.get(stream, True):
+                    continue  # late output from a backgrounded process
+                buf = pending[stream]
+                buf += data
+                idx = buf.find(marker_bytes)
+                if idx < 0:
+                    # Hold back only what could be the start of a split marker
+                    safe = len(buf) - _partial_marker_len(buf, marker_bytes)
+                    if safe > 0:
+                        yield stream, bytes(buf[:safe])
+                        del buf[:safe]
+                    continue
+                if stream == STDOUT:
+                    newline = buf.find(b"\n", idx)
+                    if newline < 0:
+                        # Marker seen but exit code not complete yet
+                        if idx:
+                            yield stream, bytes(buf[:idx])
+                            del buf[:idx]
+                        continue
+                    rc = buf[idx + len(marker_bytes):newline].strip()
+                    self.exit_code = int(rc) if rc.lstrip(b"-").isdigit() else -1
+                if idx:
+                    yield stream, bytes(buf[:idx])
+                buf.clear()
+                done[stream] = True
+        except ExecSessionClosed:
+            # The shell itself exited (e.g. `exit 3`); flush what we have and
+            # respawn on next use.
+            for stream, buf in pending.items():
+                if buf:
+                    yield stream, bytes(buf)
+            code = None
+            try:
+                code = self._exec.exit_code()
+            except Exception:
+                pass
+            self.exit_code = code if code is not None else -1
+            self._exec = None
+            self.pid = None
+
+    def _collect(self, pieces) -> Tuple[str, int]:
+        output = b"".join(data for _, data in pieces)
+        return output.decode("utf-8", errors="replace"), self.exit_code
+
+    def stream(self, code: str) -> Generator[Tuple[str, str], None, None]:
+        """Run code in the persistent shell, yielding output as it is produced.
+
+        Yields:
+            (stream, text) where stream is "stdout" or "stderr". UTF-8 is
+            decoded incrementally per stream, so characters split across
+            frames come through intact.
+
+        After the generator is exhausted, self.exit_code holds the command's
+        exit code. Abandoning the generator early interrupts the command and
+        waits for its markers so the next command starts cleanly; if it is
+        still running after _INTERRUPT_GRACE seconds the shell is killed.
+        """
+        with self._lock:
+            self._ensure_started()
+            decoder = StreamDecoder()
+            pieces = self._command(code)
+            for stream, data in pieces:
+                text = decoder.decode(stream, data)
+                if not text:
+                    continue
+                try:
+                    yield StreamDecoder.NAMES[stream], text
+                except GeneratorExit:
+                    self._abandon(pieces)
+                    raise
+            for stream, text in decoder.flush():
+                yield StreamDecoder.NAMES[stream], text
+
+    def _abandon(self, pieces):
+        """
+        Interrupt the running command and wait for its markers. A command
+        that keeps going (a loop of builtins runs inside bash itself, which
+        the INT trap keeps alive) gets _INTERRUPT_GRACE seconds, then bash
+        and its process group are killed and a fresh shell starts on next use.
+        """
+        pid = self.pid
+        self.interrupt()
+        deadline = threading.Timer(_INTERRUPT_GRACE, self._kill, args=(pid,))
+        deadline.daemon = True
+        deadline.start()
+        try:
+            for _ in pieces:
+                pass
+        finally:
+            deadline.cancel()
+
+    def _kill(self, pid: Optional[int]):
+        if pid is not None:
+            self.container.exec_run(["kill", "-9", "--", f"-{pid}"])
+
+    def execute(self, code: str) -> Tuple[str, int]:
+        """Run code in the persistent shell.
+
+        Returns:
+            (output, exit_code) — stdout and stderr combined in arrival order.
+        """
+        output = "".join(text for _, text in self.stream(code))
+        return output, self.exit_code
+
+    def get_state(self) -> str:
+        """A script that recreates this shell's working directory and exported variables."""
+        with self._lock:
+            self._ensure_started()
+            output, _ = self._collect(self._command('export -p; printf \'cd -- %q\\n\' "$PWD"'))
+            return output
+
+    def set_state(self, state: str):
+        """Run a script from get_state() in this shell."""
+        with self._lock:
+            self._ensure_started()
+            # Read-only variables can't be re-declared; that's fine
+            self._collect(self._command(f"{{\n{state}\n}} 2>/dev/null"))
+
+    def interrupt(self):
+        """Send SIGINT to the shell's process group: the running command and
+        everything it started, not just bash's direct children."""
+        if self.pid is not None:
+            self.container.exec_run(["kill", "-INT", "--", f"-{self.pid}"])
+
+    def restart(self):
+        """Kill the shell and its process group. A fresh one starts on next use."""
+        self._kill(self.pid)
+        with self._lock:
+            self.shutdown()
+
+    def shutdown(self):
+        if self._exec is not None:
+            self._exec.close()
+        self._exec = None
+        self.pid = None
+
+
+# One shell per (container, session)
+_shells: Dict[Tuple[str, str], ShellSession] = {}
+_shells_lock = threading.Lock()
+
+
+def get_shell(container, session_id: str = "default") -> ShellSession:
+    with _shells_lock:
+        key = (container.id, session_id)
+        shell = _shells.get(key)
+        if shell is None:
+            shell = ShellSession(container)
+            _shells[key] = shell
+        return shell
+
+
+def discard_shells(container):
+    """Forget every shell handle for a container that is being recycled or removed."""
+    with _shells_lock:
+        keys = [key for key in _shells if key[0] == container.id]
+        shells = [_shells.pop(key) for key in keys]
+    for shell in shells:
+        shell.shutdown()
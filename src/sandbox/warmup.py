@@ -0,0 +1,96 @@
+"""
+Background warm-up with observable readiness.
+
+Connecting to Docker, building or pulling the image and starting a container
+can take from seconds to minutes. A Warmup runs that work once on a
+background thread at process start, so the first request doesn't pay for
+it; callers can check its state or wait for it to finish instead of starting
+the same work a second time.
+"""
+
+import threading
+import time
+from typing import Callable, Optional
+
+PENDING = "pending"
+WARMING = "warming"
+READY = "ready"
+FAILED = "failed"
+
+
+class Warmup:
+    """Runs a warm-up function at most once at a time, in the background.
+
+    Args:
+        fn: The warm-up work. Raising marks the warm-up failed.
+        name: Used in messages and as the thread name.
+    """
+
+    def __init__(self, fn: Callable[[], None], name: str = "warmup"):
+        self.fn = fn
+        self.name = name
+        self.state = PENDING
+        self.error: Optional[BaseException] = None
+        self._started_at: Optional[float] = None
+        self._finished_at: Optional[float] = None
+        self._done = threading.Event()
+        self._lock = threading.Lock()
+
+    def start(self) -> "Warmup":
+        """Start the warm-up unless it is running or has succeeded. A failed one is retried."""
+        with self._lock:
+            if self.state in (WARMING, READY):
+                return self
+            self.state = WARMING
+            self.error = None
+            self._started_at = time.monotonic()
+            self._finished_at = None
+            self._done.clear()
+        threading.Thread(target=self._run, name=f"ironclaw-{self.name}", daemon=True).start()
+        return self
+
+    def _run(self):
+        try:
+            self.fn()
+        except Exception as e:
+            print(f"[!] {self.name.capitalize()} failed: {e}")
+            with self._lock:
+                self.error = e
+                self.state = FAILED
+        else:
+            with self._lock:
+                self.state = READY
+        finally:
+            self._finished_at = time.monotonic()
+            self._done.set()
+
+    @property
+    def ready(self) -> bool:
+        return self.state == READY
+
+    @property
+    def in_flight(self) -> bool:
+        return self.state == WARMING
+
+    @property
+    def elapsed(self) -> float:
+        """Seconds the warm-up has taken so far (or took in total)."""
+        if self._started_at is None:
+            return 0.0
+        return (self._finished_at or time.monotonic()) - self._started_at
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        """Wait for a running warm-up to finish. Returns True if it succeeded."""
+        if self.state == PENDING:
+            return False
+        self._done.wait(timeout)
+        return self.ready
+
+    def describe(self) -> str:
+        if self.state == READY:
+            return f"ready ({self.elapsed:.1f}s)"
+        if self.state == WARMING:
+            return f"warming up ({self.elapsed:.0f}s so far)"
+        if self.state == FAILED:
+            return f"unavailable ({self.error})"
+        return "not started"
@@ -0,0 +1,405 @@
+"""
+Timing spans and latency metrics.
+
+Each phase of a turn (agent model call, code generation, approval wait,
+block execution, workspace scan and diff, message persistence) runs inside
+span(phase). A span records its duration in the `ironclaw_phase_seconds`
+histogram, labelled by phase, provider and model, and optionally:
+
+- writes a JSON line per span to IRONCLAW_METRICS_LOG;
+- opens an OpenTelemetry span of the same name when IRONCLAW_OTEL is set
+  and opentelemetry-api is installed. Spans go wherever the OpenTelemetry
+  SDK is configured to send them (e.g. `opentelemetry-instrument` with
+  OTEL_EXPORTER_OTLP_ENDPOINT).
+
+StreamMeter adds time to first token and tokens/sec for streamed code
+generation. With IRONCLAW_METRICS_PORT set, start_metrics_server() serves
+every metric in the Prometheus text format at /metrics.
+"""
+
+import bisect
+import json
+import math
+import os
+import threading
+import time
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterator, List, Optional, Sequence, Tuple
+
+# Seconds. Approval waits are human-scale, so the buckets go up to minutes.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0, 600.0)
+RATE_BUCKETS = (1.0, 2.0, 5.0, 10.0, 20.0, 50.0, 100.0, 200.0, 500.0)
+
+_TRUTHY = ("1", "true", "yes", "on")
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if math.isinf(value):
+        return "+Inf" if value > 0 else "-Inf"
+    return repr(float(value)) if not float(value).is_integer() else str(int(value))
+
+
+def _label_text(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    """Monotonic count per label set.
+
+    Args:
+        name: Metric name.
+        help: One-line description for the exposition.
+        labelnames: Label names; every inc() passes a value for each.
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def inc(self, amount: float = 1.0, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(self._key(labels), 0.0)
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = sorted(self._values.items())
+        for key, value in items:
+            lines.append(f"{self.name}{_label_text(self.labelnames, key)} {_format_value(value)}")
+        return lines
+
+
+class Histogram:
+    """Bucketed distribution per label set, as Prometheus histograms are.
+
+    Args:
+        name: Metric name.
+        help: One-line description for the exposition.
+        labelnames: Label names; every observe() passes a value for each.
+        buckets: Upper bounds, ascending. +Inf is implied.
+    """
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        # label values -> [per-bucket counts (+Inf last), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: Dict[str, Any]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(self._key(labels))
+        return series[2] if series else 0
+
+    def sum(self, **labels) -> float:
+        series = self._series.get(self._key(labels))
+        return series[1] if series else 0.0
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = sorted((key, (list(s[0]), s[1], s[2])) for key, s in self._series.items())
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (math.inf,), counts):
+                cumulative += bucket_count
+                le = f'le="{_format_value(bound)}"'
+                lines.append(f"{self.name}_bucket{_label_text(self.labelnames, key, le)} {cumulative}")
+            labels = _label_text(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """The set of metrics rendered together at /metrics."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            self._metrics[metric.name] = metric
+        return metric
+
+    def render(self) -> str:
+        """All metrics in the Prometheus text exposition format."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+PHASE_SECONDS = REGISTRY.register(Histogram(
+    "ironclaw_phase_seconds",
+    "Duration of each phase of a turn.",
+    ("phase", "provider", "model"),
+))
+PHASE_ERRORS = REGISTRY.register(Counter(
+    "ironclaw_phase_errors_total",
+    "Phases that ended with an exception.",
+    ("phase", "provider", "model"),
+))
+TTFT_SECONDS = REGISTRY.register(Histogram(
+    "ironclaw_codegen_ttft_seconds",
+    "Time from the code-generation request to its first streamed token.",
+    ("provider", "model"),
+))
+TOKENS_PER_SECOND = REGISTRY.register(Histogram(
+    "ironclaw_codegen_tokens_per_second",
+    "Generation rate of streamed code generation.",
+    ("provider", "model"),
+    buckets=RATE_BUCKETS,
+))
+TOKENS = REGISTRY.register(Counter(
+    "ironclaw_codegen_tokens_total",
+    "Tokens streamed by code generation.",
+    ("provider", "model"),
+))
+
+
+_log_lock = threading.Lock()
+_otel_tracer = None
+_otel_checked = False
+
+
+def _write_log(record: Dict[str, Any]):
+    path = os.environ.get("IRONCLAW_METRICS_LOG")
+    if not path:
+        return
+    line = json.dumps(record, default=str)
+    try:
+        with _log_lock, open(path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+    except OSError as e:
+        print(f"[!] Could not write metrics log {path}: {e}")
+
+
+def _tracer():
+    """OpenTelemetry tracer if IRONCLAW_OTEL is on and the API is installed."""
+    global _otel_tracer, _otel_checked
+    if os.environ.get("IRONCLAW_OTEL", "").strip().lower() not in _TRUTHY:
+        return None
+    if not _otel_checked:
+        _otel_checked = True
+        try:
+            from opentelemetry import trace
+            _otel_tracer = trace.get_tracer("ironclaw")
+        except ImportError:
+            print("[!] IRONCLAW_OTEL is set but opentelemetry-api is not installed; spans are not exported")
+    return _otel_tracer
+
+
+class Span:
+    """A timed phase. Attributes set on it go to the log and OpenTelemetry, not to labels."""
+
+    def __init__(self, phase: str, provider: str = "", model: str = "", **attributes):
+        self.phase = phase
+        self.provider = provider
+        self.model = model
+        self.attributes: Dict[str, Any] = dict(attributes)
+        self.started = time.perf_counter()
+        self.duration: Optional[float] = None
+        self._otel = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        if self._otel is not None:
+            for key, value in attributes.items():
+                self._otel.set_attribute(f"ironclaw.{key}", _otel_value(value))
+
+
+def _otel_value(value: Any):
+    return value if isinstance(value, (bool, int, float, str)) else str(value)
+
+
+@contextmanager
+def span(phase: str, provider: str = "", model: str = "", **attributes) -> Iterator[Span]:
+    """Time a phase of a turn.
+
+    Args:
+        phase: Phase name, e.g. "codegen" or "block_exec".
+        provider: Provider label, where the phase talks to an LLM.
+        model: Model label, likewise.
+        **attributes: Extra detail for the log and OpenTelemetry.
+    """
+    current = Span(phase, provider, model, **attributes)
+    tracer = _tracer()
+    otel_cm = None
+    if tracer is not None:
+        otel_attributes = {f"ironclaw.{k}": _otel_value(v) for k, v in attributes.items()}
+        if provider:
+            otel_attributes["ironclaw.provider"] = provider
+        if model:
+            otel_attributes["ironclaw.model"] = model
+        otel_cm = tracer.start_as_current_span(f"ironclaw.{phase}", attributes=otel_attributes)
+        current._otel = otel_cm.__enter__()
+    error: Optional[BaseException] = None
+    try:
+        yield current
+    except BaseException as e:
+        error = e
+        raise
+    finally:
+        current.duration = time.perf_counter() - current.started
+        PHASE_SECONDS.observe(current.duration, phase=phase, provider=provider, model=model)
+        if error is not None:
+            PHASE_ERRORS.inc(phase=phase, provider=provider, model=model)
+        record = {
+            "ts": time.time(),
+            "phase": phase,
+            "duration_ms": round(current.duration * 1000, 3),
+            "provider": provider,
+            "model": model,
+            **current.attributes,
+        }
+        if error is not None:
+            record["error"] = f"{type(error).__name__}: {error}"
+        _write_log(record)
+        if otel_cm is not None:
+            if error is None:
+                otel_cm.__exit__(None, None, None)
+            else:
+                otel_cm.__exit__(type(error), error, error.__traceback__)
+
+
+class StreamMeter:
+    """Time to first token and generation rate of one streamed response.
+
+    Args:
+        provider: Provider label.
+        model: Model label.
+    """
+
+    def __init__(self, provider: str, model: str):
+        self.provider = provider
+        self.model = model
+        self.started = time.perf_counter()
+        self.first_token_at: Optional[float] = None
+        self.tokens = 0
+
+    @property
+    def ttft(self) -> Optional[float]:
+        return None if self.first_token_at is None else self.first_token_at - self.started
+
+    def token(self, text: str):
+        """Count one streamed chunk; the first non-empty one sets TTFT."""
+        if not text:
+            return
+        if self.first_token_at is None:
+            self.first_token_at = time.perf_counter()
+            TTFT_SECONDS.observe(self.ttft, provider=self.provider, model=self.model)
+        self.tokens += 1
+
+    def finish(self, eval_count: Optional[int] = None, eval_duration_ns: Optional[int] = None) -> Optional[float]:
+        """Record the generation rate.
+
+        Ollama's final chunk reports eval_count and eval_duration (ns); those
+        are used when present, otherwise chunks per second after the first.
+
+        Returns:
+            Tokens per second, or None if it could not be measured.
+        """
+        tokens = eval_count or self.tokens
+        rate = None
+        if eval_count and eval_duration_ns:
+            rate = eval_count / (eval_duration_ns / 1e9)
+        elif self.first_token_at is not None and self.tokens > 1:
+            elapsed = time.perf_counter() - self.first_token_at
+            if elapsed > 0:
+                rate = (self.tokens - 1) / elapsed
+        if tokens:
+            TOKENS.inc(tokens, provider=self.provider, model=self.model)
+        if rate is not None:
+            TOKENS_PER_SECOND.observe(rate, provider=self.provider, model=self.model)
+        return rate
+
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path.split("?")[0] != "/metrics":
+            self.send_error(404)
+            return
+        body = REGISTRY.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass  # scrapes every few seconds would flood the console
+
+
+_server: Optional[ThreadingHTTPServer] = None
+_server_lock = threading.Lock()
+
+
+def start_metrics_server(port: Optional[int] = None, host: Optional[str] = None) -> Optional[ThreadingHTTPServer]:
+    """
+    Serve /metrics on a background thread, once per process.
+
+    Args:
+        port: Defaults to IRONCLAW_METRICS_PORT; unset means no server.
+        host: Defaults to IRONCLAW_METRICS_HOST, else 127.0.0.1.
+
+    Returns:
+        The server, or None if no port is configured or it could not bind.
+    """
+    global _server
+    with _server_lock:
+        if _server is not None:
+            return _server
+        if port is None:
+            raw = os.environ.get("IRONCLAW_METRICS_PORT", "").strip()
+            if not raw:
+                return None
+            port = int(raw)
+        host = host or os.environ.get("IRONCLAW_METRICS_HOST", "127.0.0.1")
+        try:
+            _server = ThreadingHTTPServer((host, port), _MetricsHandler)
+        except OSError as e:
+            print(f"[!] Could not serve metrics on {host}:{port}: {e}")
+            return None
+        _server.daemon_threads = True
+        threading.Thread(target=_server.serve_forever, name="ironclaw-metrics", daemon=True).start()
+        print(f"[*] Metrics at http://{host}:{_server.server_address[1]}/metrics")
+        return _server
@@ -0,0 +1,242 @@
+"""
+Opt-in sampling profiler for single turns.
+
+When a turn is slow, aggregate metrics say which phase took the time but
+not why. profile_turn() wraps one turn in a sampling profiler: a
+background thread snapshots every thread's stack (sys._current_frames)
+every IRONCLAW_PROFILE_INTERVAL milliseconds (default 5), which covers the
+event loop running the agent, the worker threads doing code generation and
+the sandbox calls. The samples are written in the folded-stack format
+("thread;outer;inner count"), which flamegraph.pl, inferno and speedscope
+read, to IRONCLAW_PROFILE_DIR (default ./profiles).
+
+A turn is profiled when IRONCLAW_PROFILE is set (every turn), or once after
+request_profile() (the `/profile` chat command). Otherwise profile_turn()
+costs a set lookup and starts nothing. Every thread is sampled, so turns
+of other sessions running at the same time appear in the profile too.
+"""
+
+import itertools
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Set, Tuple
+
+_DEFAULT_INTERVAL_MS = 5.0
+_DEFAULT_DIR = "profiles"
+_TRUTHY = ("1", "true", "yes", "on")
+
+# Leaf frames of a thread that is waiting for work rather than doing it
+_IDLE_FRAMES = {
+    ("threading.py", "wait"),
+    ("threading.py", "_wait_for_tstate_lock"),  # Thread.join()
+    ("queue.py", "get"),
+    ("selectors.py", "select"),
+    ("socket.py", "accept"),
+}
+IDLE = "<idle>"
+
+
+def _frame_label(frame) -> str:
+    code = frame.f_code
+    name = getattr(code, "co_qualname", code.co_name)
+    label = f"{name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})"
+    return label.replace(";", ":")
+
+
+def _waits_in_idle_call(frame) -> bool:
+    code = frame.f_code
+    return (os.path.basename(code.co_filename), code.co_name) in _IDLE_FRAMES
+
+
+def _is_thread_target(frame) -> bool:
+    caller = frame.f_back
+    return (
+        caller is not None
+        and caller.f_code.co_name == "run"
+        and os.path.basename(caller.f_code.co_filename) == "threading.py"
+    )
+
+
+def _thread_cpu_time(ident: int) -> Optional[float]:
+    try:
+        return time.clock_gettime(time.pthread_getcpuclockid(ident))
+    except (AttributeError, OSError):
+        return None  # not available on this platform
+
+
+class Profile:
+    """Stack samples collected over one profiled stretch.
+
+    Attributes:
+        stacks: Folded stack -> number of samples.
+        interval: Seconds between samples.
+        duration: Seconds the profiler ran.
+    """
+
+    def __init__(self, stacks: Counter, interval: float, duration: float, samples: int):
+        self.stacks = stacks
+        self.interval = interval
+        self.duration = duration
+        self.samples = samples
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in sorted(self.stacks.items()))
+
+    def write(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(self.folded())
+        return path
+
+    def top(self, n: int = 5) -> List[Tuple[str, int]]:
+        """The n frames most often on top of a busy stack (self time)."""
+        leaves: Counter = Counter()
+        for stack, count in self.stacks.items():
+            leaf = stack.rsplit(";", 1)[-1]
+            if leaf != IDLE:
+                leaves[leaf] += count
+        return leaves.most_common(n)
+
+    def summary(self, n: int = 5) -> str:
+        busy = sum(count for stack, count in self.stacks.items() if not stack.endswith(IDLE))
+        lines = [
+            f"{self.samples} samples over {self.duration:.2f}s "
+            f"every {self.interval * 1000:.0f} ms; {busy} busy thread samples"
+        ]
+        for label, count in self.top(n):
+            lines.append(f"  {count * self.interval * 1000:8.0f} ms  {label}")
+        return "\n".join(lines)
+
+
+class SamplingProfiler:
+    """Samples the stacks of every thread on a background thread.
+
+    Args:
+        interval: Seconds between samples. Defaults to
+            IRONCLAW_PROFILE_INTERVAL (milliseconds, default 5).
+    """
+
+    def __init__(self, interval: Optional[float] = None):
+        if interval is None:
+            interval = float(os.environ.get("IRONCLAW_PROFILE_INTERVAL", _DEFAULT_INTERVAL_MS)) / 1000
+        self.interval = max(0.0005, interval)
+        self._stacks: Counter = Counter()
+        self._samples = 0
+        self._cpu: Dict[int, Optional[float]] = {}
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._started = 0.0
+
+    def start(self) -> "SamplingProfiler":
+        self._started = time.perf_counter()
+        self._thread = threading.Thread(target=self._run, name="ironclaw-profiler", daemon=True)
+        self._thread.start()
+        return self
+
+    def _run(self):
+        me = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                if ident == me:
+                    continue
+                root = names.get(ident, f"thread-{ident}").replace(";", ":").replace(" ", "_")
+                if self._is_idle(ident, frame):
+                    self._stacks[f"{root};{IDLE}"] += 1
+                    continue
+                labels = []
+                while frame is not None:
+                    labels.append(_frame_label(frame))
+                    frame = frame.f_back
+                labels.append(root)
+                self._stacks[";".join(reversed(labels))] += 1
+            self._samples += 1
+
+    def _is_idle(self, ident: int, frame) -> bool:
+        if _waits_in_idle_call(frame):
+            return True
+        if not _is_thread_target(frame):
+            return False
+        # A thread's own target function on top of the stack is either busy
+        # in Python or blocked in a C call in its main loop (a worker pool's
+        # queue, a database connection thread, an inotify read). Only the
+        # latter leaves the thread's CPU time unchanged between samples.
+        cpu = _thread_cpu_time(ident)
+        previous = self._cpu.get(ident)
+        self._cpu[ident] = cpu
+        return cpu is not None and previous is not None and cpu == previous
+
+    def stop(self) -> Profile:
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return Profile(Counter(self._stacks), self.interval, time.perf_counter() - self._started, self._samples)
+
+
+_sequence = itertools.count(1)
+_requested: Set[str] = set()
+_requested_lock = threading.Lock()
+
+
+def request_profile(session_id: str):
+    """Profile the next turn of a session."""
+    with _requested_lock:
+        _requested.add(session_id)
+
+
+def _take_request(session_id: str) -> bool:
+    if os.environ.get("IRONCLAW_PROFILE", "").strip().lower() in _TRUTHY:
+        return True
+    if not _requested:
+        return False
+    with _requested_lock:
+        if session_id in _requested:
+            _requested.discard(session_id)
+            return True
+    return False
+
+
+class TurnProfile:
+    """Result of a profiled turn; path and profile are set when it ends."""
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.path: Optional[str] = None
+        self.profile: Optional[Profile] = None
+
+
+def profile_path(session_id: str) -> str:
+    directory = os.environ.get("IRONCLAW_PROFILE_DIR", _DEFAULT_DIR)
+    safe = re.sub(r"[^A-Za-z0-9_.-]", "_", session_id) or "session"
+    stamp = time.strftime("%Y%m%d-%H%M%S")
+    return os.path.join(directory, f"{safe}-{stamp}-{os.getpid()}-{next(_sequence)}.folded")
+
+
+@contextmanager
+def profile_turn(session_id: str) -> Iterator[Optional[TurnProfile]]:
+    """
+    Profile the enclosed turn if profiling is switched on for it.
+
+    Yields:
+        None when the turn is not profiled. Otherwise a TurnProfile whose
+        path (the folded-stack file) and profile are filled in on exit.
+    """
+    if not _take_request(session_id):
+        yield None
+        return
+    turn = TurnProfile(session_id)
+    profiler = SamplingProfiler().start()
+    try:
+        yield turn
+    finally:
+        turn.profile = profiler.stop()
+        path = profile_path(session_id)
+        try:
+            turn.path = turn.profile.write(path)
+        except OSError as e:
+            print(f"[!] Could not write profile {path}: {e}")
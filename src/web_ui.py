@@ -1,5 +1,7 @@
+import asyncio
 import os
 import sys
+import time
 from typing import Union
 
 # Ensure project root is in sys.path
@@ -31,15 +33,30 @@ from dotenv import load_dotenv
 from pydantic import TypeAdapter
 from pydantic_ai.messages import ModelMessage
 
-from src.agent.core import ironclaw_agent, AgentDeps
-from src.agent.tools.sandbox import CodeExecutionRequest, get_sandbox_tool, confirm_execution as _direct_confirm
+from src.agent.core import get_agent, AgentDeps
+from src.agent.concurrency import run_blocking, OutputBridge
+from src.agent.tools.sandbox import (
+    CodeExecutionRequest,
+    get_pending_blocks,
+    confirm_execution as _direct_confirm,
+    discard_pending_blocks,
+    sandbox_status,
+    start_sandbox_warmup,
+)
 from src.agent.tools.workspace import (
     list_workspace_files,
-    get_workspace_snapshot,
-    get_workspace_diff
+    get_workspace_token,
+    get_workspace_changes,
+    session_workspace_path,
 )
-from src.agent.provider import get_provider_config, check_ollama_health, get_missing_models, provider_banner
+from src.sandbox.capture import OutputCapture
+from src.agent.tools.uploads import UploadResult, get_blob_store, store_upload
+from src.agent.history import compact_history, ensure_system_prompt, history_window_size, window_messages
+from src.agent.health import get_health_monitor
+from src.agent.provider import get_provider_config, check_ollama_health, get_missing_models, provider_banner, OllamaUnavailableError
 from src.database.manager import DatabaseManager
+from src.telemetry.metrics import span, start_metrics_server
+from src.telemetry.profiler import profile_turn, request_profile
 
 load_dotenv()
 
@@ -55,6 +72,17 @@ def auth_callback(username: str, password: str):
 db = DatabaseManager()
 adapter = TypeAdapter(list[ModelMessage])
 
+# Start the sandbox pool now so the first chat doesn't wait for Docker
+start_sandbox_warmup()
+# Prometheus metrics at /metrics, if IRONCLAW_METRICS_PORT is set
+start_metrics_server()
+# Chats then start from a cached Ollama health status instead of probing
+if get_provider_config().provider == "ollama":
+    get_health_monitor(get_provider_config())
+
+# Seconds between upload progress updates
+_PROGRESS_INTERVAL = 0.5
+
 @cl.set_starters
 async def set_starters():
     return [
@@ -67,11 +95,14 @@ async def set_starters():
 
 @cl.on_chat_start
 async def on_chat_start():
-    # Ensure workspace directory exists
-    if not os.path.exists("./workspace"):
-        os.makedirs("./workspace")
-    
-    await db.initialize_db()
+    # Pool warm-up runs in the background (started at import, restarted here
+    # if it failed) alongside DB init and the provider health check
+    start_sandbox_warmup()
+    _cfg = get_provider_config()
+    if _cfg.provider == "ollama":
+        (reachable, pulled_models), _ = await asyncio.gather(check_ollama_health(_cfg), db.initialize_db())
+    else:
+        await db.initialize_db()
     
     user = cl.user_session.get("user")
     username = user.identifier if user else "default"
@@ -82,35 +113,17 @@ async def on_chat_start():
     
     await db.get_or_create_session(session_id)
     
-    # Load history
-    history_dicts = await db.get_messages(session_id)
-    history = adapter.validate_python(history_dicts) if history_dicts else []
+    # Load only the recent window of history the model will see
+    history_dicts = await db.get_history_window(session_id, history_window_size())
+    history = ensure_system_prompt(adapter.validate_python(history_dicts)) if history_dicts else []
     cl.user_session.set("history", history)
     
-    _cfg = get_provider_config()
     _banner = provider_banner(_cfg)
-    await cl.Message(content=f"Welcome {username}! IronClaw is ready.\n\n{_banner}").send()
+    await cl.Message(content=f"Welcome {username}! IronClaw is ready.\n\n{_banner}\n{sandbox_status()}").send()
 
     if _cfg.provider == "ollama":
-        reachable, pulled_models = await check_ollama_health(_cfg)
         if not reachable:
-            action_res = await cl.AskActionMessage(
-                content=(
-                    f"Ollama is unreachable at {_cfg.ollama_base_url}. "
-                    "Fall back to a cloud provider, or abort?"
-                ),
-                actions=[
-                    cl.Action(name="fallback", label="Fall back to cloud", payload={"choice": "fallback"}),
-                    cl.Action(name="abort", label="Abort session", payload={"choice": "abort"}),
-                ],
-            ).send()
-            choice = (action_res.get("payload", {}) if action_res else {}).get("choice", "abort")
-            if choice == "fallback":
-                import os as _os
-                _os.environ.pop("PROVIDER", None)
-                _cfg = get_provider_config()
-                await cl.Message(content=f"Switched provider. {provider_banner(_cfg)}").send()
-            else:
+            if not await offer_cloud_fallback(f"Ollama is unreachable at {_cfg.ollama_base_url}."):
                 await cl.Message(content="Session aborted. Start Ollama and refresh.").send()
                 return
         else:
@@ -123,8 +136,67 @@ async def on_chat_start():
                 return
 
 
+async def offer_cloud_fallback(reason: str) -> bool:
+    """Ask whether to switch from Ollama to a cloud provider; True if switched."""
+    action_res = await cl.AskActionMessage(
+        content=f"{reason} Fall back to a cloud provider, or abort?",
+        actions=[
+            cl.Action(name="fallback", label="Fall back to cloud", payload={"choice": "fallback"}),
+            cl.Action(name="abort", label="Abort session", payload={"choice": "abort"}),
+        ],
+    ).send()
+    choice = (action_res.get("payload", {}) if action_res else {}).get("choice", "abort")
+    if choice != "fallback":
+        return False
+    os.environ.pop("PROVIDER", None)
+    await cl.Message(content=f"Switched provider. {provider_banner(get_provider_config())}").send()
+    return True
+
+
+def _format_size(size: int) -> str:
+    for unit in ("B", "KB", "MB", "GB"):
+        if size < 1024 or unit == "GB":
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+
+
+async def _upload_file(file: cl.File, workspace_path: str) -> UploadResult:
+    """Stream one upload into the blob store, showing progress in its own message."""
+    status = cl.Message(content=f"Uploading `{file.name}`...")
+    await status.send()
+
+    async def _show(text: str):
+        status.content = text
+        await status.update()
+
+    bridge = OutputBridge(_show)
+    last = [0.0]
+
+    def progress(done: int, total):
+        now = time.monotonic()
+        if total and done < total and now - last[0] >= _PROGRESS_INTERVAL:
+            last[0] = now
+            bridge(f"Uploading `{file.name}`... {done * 100 // total}% of {_format_size(total)}")
+
+    try:
+        result = await run_blocking(
+            store_upload, get_blob_store(), workspace_path, file.name,
+            source_path=file.path, content=file.content, progress=progress,
+        )
+    except Exception as e:
+        await bridge.aclose()
+        await _show(f"Upload of `{file.name}` failed: {e}")
+        raise
+    await bridge.aclose()
+    note = " (already stored)" if result.deduplicated else ""
+    await _show(
+        f"Uploaded `{result.name}` to `/workspace/{result.name}` "
+        f"({_format_size(result.size)}, sha256 `{result.sha256[:12]}`){note}"
+    )
+    return result
+
 async def handle_file_uploads(message: cl.Message):
-    """Process any files attached to a message, saving them to the workspace."""
+    """Process any files attached to a message, saving them to the workspace concurrently."""
     from pydantic_ai.messages import ModelRequest, UserPromptPart
     import datetime
 
@@ -133,87 +205,148 @@ async def handle_file_uploads(message: cl.Message):
     if not file_elements:
         return
 
-    workspace_path = "./workspace"
-    if not os.path.exists(workspace_path):
-        os.makedirs(workspace_path)
-
     history = cl.user_session.get("history", [])
     session_id = cl.user_session.get("session_id")
-
-    for file in file_elements:
-        target_path = os.path.join(workspace_path, file.name)
-        if file.path and os.path.exists(file.path):
-            import shutil
-            shutil.copy2(file.path, target_path)
-        elif file.content:
-            with open(target_path, "wb") as f:
-                f.write(file.content)
-
-        await cl.Message(content=f"Uploaded `{file.name}` to `/workspace/{file.name}`").send()
-
-        upload_notification = ModelRequest(parts=[
+    workspace_path = session_workspace_path(session_id)
+
+    results = await asyncio.gather(
+        *(_upload_file(file, workspace_path) for file in file_elements),
+        return_exceptions=True,
+    )
+
+    notifications = []
+    for file, result in zip(file_elements, results):
+        if isinstance(result, BaseException):
+            print(f"[!] Upload of {file.name} failed: {result}")
+            continue
+        notifications.append(ModelRequest(parts=[
             UserPromptPart(
-                content=f"[SYSTEM NOTIFICATION] User uploaded a file: {file.name}. It is now available at /workspace/{file.name}",
+                content=(
+                    f"[SYSTEM NOTIFICATION] User uploaded a file: {result.name} "
+                    f"({result.size} bytes, sha256 {result.sha256}). "
+                    f"It is now available at /workspace/{result.name}."
+                ),
                 timestamp=datetime.datetime.now(datetime.timezone.utc)
             )
-        ])
-        history.append(upload_notification)
-        new_msgs = adapter.dump_python([upload_notification], mode='json')
-        await db.save_messages(session_id, new_msgs)
+        ]))
+    if not notifications:
+        return
+    history.extend(notifications)
+    new_msgs = adapter.dump_python(notifications, mode='json')
+    await db.queue_messages(session_id, new_msgs)
 
-    cl.user_session.set("history", history)
+    cl.user_session.set("history", window_messages(history, history_window_size()))
 
-async def send_file_diff(old_snapshot):
-    new_snapshot = get_workspace_snapshot()
-    diff = get_workspace_diff(old_snapshot, new_snapshot)
-    if diff:
-        elements = [
-            cl.File(name=f, path=f"./workspace/{f}", display="inline")
-            for f in sorted(list(diff))
-        ]
-        await cl.Message(content="Files created or modified:", elements=elements).send()
+async def send_file_diff(old_token, workspace_path):
+    changes = await run_blocking(get_workspace_changes, workspace_path, old_token)
+    if not changes:
+        return
+    lines = [f"- renamed `{old}` → `{new}`" for old, new in changes.renamed]
+    lines += [f"- deleted `{f}`" for f in changes.deleted]
+    # Only files with new content are attached; renames are listed, not re-sent
+    content_changed = sorted(changes.added + changes.modified)
+    elements = [
+        cl.File(name=f, path=os.path.join(workspace_path, f), display="inline")
+        for f in content_changed
+    ]
+    content = "Files created or modified:" if content_changed else "Workspace changes:"
+    if lines:
+        content += "\n" + "\n".join(lines)
+    await cl.Message(content=content, elements=elements).send()
+
+@cl.on_chat_end
+async def on_chat_end():
+    # History is written behind the conversation; make sure it has landed
+    await db.flush()
 
 @cl.on_message
 async def on_message(message: cl.Message):
     await handle_file_uploads(message)
 
+    session_id = cl.user_session.get("session_id")
+    workspace_path = session_workspace_path(session_id)
+
     if message.content == "/files":
-        files = list_workspace_files()
+        files = await run_blocking(list_workspace_files, workspace_path)
         if not files:
             await cl.Message(content="No files in workspace.").send()
             return
         
         elements = [
-            cl.File(name=f, path=f"./workspace/{f}", display="inline")
+            cl.File(name=f, path=os.path.join(workspace_path, f), display="inline")
             for f in sorted(files)
         ]
         await cl.Message(content="Current workspace files:", elements=elements).send()
         return
 
-    session_id = cl.user_session.get("session_id")
+    if message.content == "/status":
+        await cl.Message(content=sandbox_status()).send()
+        return
+
+    if message.content == "/profile":
+        request_profile(session_id)
+        await cl.Message(content="Your next message will be profiled.").send()
+        return
+
+    # Sampled only if IRONCLAW_PROFILE is set or /profile asked for it
+    with profile_turn(session_id) as profile:
+        await _run_turn(message, session_id, workspace_path)
+    if profile is not None and profile.path:
+        name = os.path.basename(profile.path)
+        await cl.Message(
+            content=(
+                f"**Profile:** `{profile.path}` (folded stacks for flamegraph.pl or speedscope)\n"
+                f"```\n{profile.profile.summary()}\n```"
+            ),
+            elements=[cl.File(name=name, path=profile.path, display="inline")],
+        ).send()
+
+async def _run_turn(message: cl.Message, session_id: str, workspace_path: str):
     history = cl.user_session.get("history", [])
+
+    # Fold older turns into a summary once history grows too large
+    history = await compact_history(history, db, session_id)
+    cl.user_session.set("history", history)
     
-    # Take a snapshot before execution
-    old_snapshot = get_workspace_snapshot()
+    # Remember the workspace state before execution
+    old_token = await run_blocking(get_workspace_token, workspace_path)
 
     # Create an empty message to stream content into
     msg = cl.Message(content="")
+    code_gen_step = None
+    code_gen_output = None
+    code_gen_blocks = None
 
     try:
         # For Ollama, stream code-generation tokens into a dedicated step.
         # The step is created eagerly so the on_output callback can reference it.
         _cfg = get_provider_config()
         if _cfg.provider == "ollama":
+            # Fail fast, before the agent's first model call, if Ollama is down
+            get_health_monitor(_cfg).check()
             code_gen_step = cl.Step(name="⚙ Generating code...")
             await code_gen_step.__aenter__()
-            def _on_output(token: str):
-                cl.run_sync(code_gen_step.stream_token(token))
-            deps = AgentDeps(on_output=_on_output)
+            # Codegen runs on a worker thread; the bridge streams its tokens
+            # into the step from the event loop.
+            code_gen_output = OutputBridge(code_gen_step.stream_token)
+            ready_blocks = []
+
+            async def _show_block(block):
+                # Completed blocks show up while later ones are still generated
+                ready_blocks.append(block)
+                code_gen_step.name = f"⚙ Generating code... ({len(ready_blocks)} block(s) ready)"
+                await code_gen_step.update()
+                await cl.Message(
+                    content=f"```{block.language}\n{block.code}\n```",
+                    parent_id=code_gen_step.id,
+                ).send()
+
+            code_gen_blocks = OutputBridge(_show_block)
+            deps = AgentDeps(on_output=code_gen_output, on_block=code_gen_blocks, session_id=session_id)
         else:
-            code_gen_step = None
-            deps = AgentDeps()
+            deps = AgentDeps(session_id=session_id)
 
-        async with ironclaw_agent.run_stream(
+        async with get_agent().run_stream(
             message.content,
             message_history=history,
             deps=deps
@@ -233,17 +366,17 @@ async def on_message(message: cl.Message):
 
             # Save new messages
             new_msgs = adapter.dump_python(result.new_messages(), mode='json')
-            await db.save_messages(session_id, new_msgs)
+            await db.queue_messages(session_id, new_msgs)
 
             # Update local history
-            history = result.all_messages()
+            history = window_messages(result.all_messages(), history_window_size())
             cl.user_session.set("history", history)
 
             # Smaller Ollama models may return a plain string even after run_system_task
             # generates code, because they don't relay the CodeExecutionRequest as
-            # structured output. Fall back to the singleton's pending_blocks if any.
+            # structured output. Fall back to the session's pending_blocks if any.
             if not isinstance(response, CodeExecutionRequest):
-                pending = get_sandbox_tool().pending_blocks
+                pending = get_pending_blocks(session_id)
                 if pending:
                     response = CodeExecutionRequest(
                         blocks=pending,
@@ -252,7 +385,7 @@ async def on_message(message: cl.Message):
 
             if isinstance(response, CodeExecutionRequest):
                 # Don't show the streamed text — the approval dialog presents the code.
-                await handle_code_approval(response, cl.Message(content=""), history, session_id, old_snapshot)
+                await handle_code_approval(response, cl.Message(content=""), history, session_id, old_token)
             else:
                 if msg.content:
                     await msg.send()
@@ -261,7 +394,7 @@ async def on_message(message: cl.Message):
                     await msg.send()
                 
                 # Check for file changes if no code approval was needed
-                await send_file_diff(old_snapshot)
+                await send_file_diff(old_token, workspace_path)
             
     except Exception as e:
         if not msg.content:
@@ -269,11 +402,21 @@ async def on_message(message: cl.Message):
             await msg.send()
         else:
             await cl.Message(content=f"\n\nError: {str(e)}").send()
+        outage = isinstance(e, OllamaUnavailableError)
+    else:
+        outage = False
     finally:
+        if code_gen_output is not None:
+            await code_gen_output.aclose()
+        if code_gen_blocks is not None:
+            await code_gen_blocks.aclose()
         if code_gen_step is not None:
             await code_gen_step.__aexit__(None, None, None)
 
-async def handle_code_approval(request: CodeExecutionRequest, original_msg: cl.Message, history, session_id, old_snapshot=None):
+    if outage and await offer_cloud_fallback("Ollama went down during this turn."):
+        await cl.Message(content="Send your message again to retry it with the new provider.").send()
+
+async def handle_code_approval(request: CodeExecutionRequest, original_msg: cl.Message, history, session_id, old_token=None):
     # Display reasoning
     # If original_msg already has content from streaming, we might want to append or use a new message
     content = f"""**Agent Logic:** {request.reasoning}
@@ -291,7 +434,7 @@ async def handle_code_approval(request: CodeExecutionRequest, original_msg: cl.M
     # Show code blocks as separate messages or combined
     code_content = ""
     for block in request.blocks:
-        code_content += f"""```{block.language}
+        code_content += f"""```{block.language}{' sequential' if block.sequential else ''}
 {block.code}
 ```
 """
@@ -299,15 +442,18 @@ async def handle_code_approval(request: CodeExecutionRequest, original_msg: cl.M
     await cl.Message(content=code_content, parent_id=approval_msg.id).send()
     
     # Ask for approval via actions
-    res = await cl.AskActionMessage(
-        content="Approve execution in the sandboxed environment?",
-        actions=[
-            cl.Action(name="approve", label="✅ Approve", payload={"value": "yes"}),
-            cl.Action(name="reject", label="❌ Reject", payload={"value": "no"}),
-        ],
-    ).send()
-
-    if res and res.get("payload", {}).get("value") == "yes":
+    with span("approval_wait") as waited:
+        res = await cl.AskActionMessage(
+            content="Approve execution in the sandboxed environment?",
+            actions=[
+                cl.Action(name="approve", label="✅ Approve", payload={"value": "yes"}),
+                cl.Action(name="reject", label="❌ Reject", payload={"value": "no"}),
+            ],
+        ).send()
+        approved = bool(res and res.get("payload", {}).get("value") == "yes")
+        waited.set(approved=approved)
+
+    if approved:
         # Execute directly — don't route through the agent again.
         # Small models (e.g. llama3.1:8b) often respond with plain text instead
         # of calling confirm_execution(), so we call it ourselves.
@@ -315,14 +461,26 @@ async def handle_code_approval(request: CodeExecutionRequest, original_msg: cl.M
         from pydantic_ai.messages import ModelRequest, UserPromptPart
 
         async with cl.Step(name="Docker Execution") as step:
-            output_lines: list[str] = []
-            def on_output(content: str):
-                output_lines.append(content)
-                cl.run_sync(step.stream_token(content))
-
-            execution_result = _direct_confirm(on_output=on_output)
+            # Stream only the head of the output into the step; the bounded
+            # result (with head, tail and spill file) is shown afterwards
+            shown = OutputCapture(tail_chars=0)
+            async def _emit(content: str):
+                was_truncated = shown.truncated
+                kept = shown.write(content)
+                if kept:
+                    await step.stream_token(kept)
+                elif shown.truncated and not was_truncated:
+                    await step.stream_token("\n[... live output truncated; see the execution result ...]\n")
+
+            # Execution blocks on Docker, so it runs on the worker pool while
+            # output is streamed into the step from the event loop.
+            on_output = OutputBridge(_emit)
+            try:
+                execution_result = await run_blocking(_direct_confirm, on_output=on_output, session_id=session_id)
+            finally:
+                await on_output.aclose()
 
-        result_summary = "".join(output_lines) or str(execution_result)
+        result_summary = str(execution_result)
         if result_summary.strip():
             await cl.Message(content=f"**Execution Result:**\n```\n{result_summary}\n```").send()
         else:
@@ -335,12 +493,13 @@ async def handle_code_approval(request: CodeExecutionRequest, original_msg: cl.M
                 timestamp=datetime.datetime.now(datetime.timezone.utc),
             )
         ])
-        history = list(history) + [exec_note]
+        history = window_messages(list(history) + [exec_note], history_window_size())
         new_msgs = adapter.dump_python([exec_note], mode='json')
-        await db.save_messages(session_id, new_msgs)
+        await db.queue_messages(session_id, new_msgs)
         cl.user_session.set("history", history)
 
-        if old_snapshot:
-            await send_file_diff(old_snapshot)
+        if old_token is not None:
+            await send_file_diff(old_token, session_workspace_path(session_id))
     else:
+        discard_pending_blocks(session_id)
         await cl.Message(content="Execution cancelled by user.").send()
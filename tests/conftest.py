@@ -0,0 +1,61 @@
+import os
+import queue
+import subprocess
+import sys
+import threading
+import pytest
+from src.sandbox.exec_session import ExecSessionClosed, STDOUT, STDERR
+
+
+class LocalExec:
+    """Runs a sandbox command on the host, exposing AttachedExec's frame interface."""
+
+    def __init__(self, cmd):
+        if cmd[0] == "python3":
+            cmd = [sys.executable] + cmd[1:]
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+        self.frames = queue.Queue()
+        self.closed = False
+        self._open_pipes = 2
+        for stream, pipe in ((STDOUT, self.proc.stdout), (STDERR, self.proc.stderr)):
+            threading.Thread(target=self._pump, args=(stream, pipe), daemon=True).start()
+
+    def _pump(self, stream, pipe):
+        while True:
+            data = os.read(pipe.fileno(), 4096)
+            if not data:
+                self.frames.put(None)
+                return
+            self.frames.put((stream, data))
+
+    def write(self, data):
+        self.proc.stdin.write(data)
+        self.proc.stdin.flush()
+
+    def read_frame(self):
+        # Like the docker socket, report closure only once both streams are drained
+        while True:
+            frame = self.frames.get(timeout=10)
+            if frame is not None:
+                return frame
+            self._open_pipes -= 1
+            if self._open_pipes == 0:
+                self.closed = True
+                raise ExecSessionClosed("exited")
+
+    def exit_code(self):
+        return self.proc.wait(timeout=10)
+
+    def close(self):
+        self.closed = True
+        try:
+            self.proc.stdin.close()
+        except OSError:
+            pass
+        self.proc.wait(timeout=10)
+
+
+@pytest.fixture
+def local_exec_factory():
+    """exec_factory for PythonKernel/ShellSession that runs processes on the host."""
+    return lambda container, cmd: LocalExec(cmd)
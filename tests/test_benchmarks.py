@@ -0,0 +1,80 @@
+import asyncio
+import time
+
+from benchmarks import chainlit_stub as cl
+from benchmarks.fakes import FakeContainer, StubOllama, codegen_answer
+from benchmarks.load_webui import TimedExecutor
+from benchmarks.stats import compare, percentile, summarize
+from src.agent.tools.code_blocks import parse_code_blocks
+from src.sandbox.kernel import PythonKernel
+from src.sandbox.shell import ShellSession
+
+
+def test_percentile_interpolates():
+    samples = [4.0, 1.0, 3.0, 2.0]
+    assert percentile(samples, 0) == 1.0
+    assert percentile(samples, 50) == 2.5
+    assert percentile(samples, 100) == 4.0
+    assert summarize(samples)["n"] == 4
+
+
+def test_compare_needs_ratio_and_slack():
+    baseline = {"stages": {"total": {"p50": 10.0, "p95": 100.0}}, "memory": {"max_rss_kib": 1000.0}}
+    current = {"stages": {"total": {"p50": 14.0, "p95": 200.0}}, "memory": {"max_rss_kib": 1500.0}}
+    result = {item.metric: item for item in compare(current, baseline, tolerance=1.25, slack_ms=5.0)}
+    # 40% slower but only 4 ms: jitter, not a regression
+    assert not result["total.p50"].regressed
+    assert result["total.p95"].regressed
+    assert result["total.p95"].ratio == 2.0
+    assert not result["memory.max_rss_kib"].regressed
+
+
+def test_stub_ollama_streams_canned_blocks():
+    ollama = StubOllama()
+    text = "".join(chunk["response"] for chunk in ollama.generate("m", "task", stream=True))
+    assert text == codegen_answer(1)
+    blocks = parse_code_blocks(text)
+    assert [(b.language, b.sequential) for b in blocks] == [("shell", False), ("python", True)]
+
+
+def test_fake_container_runs_kernel_and_shell(tmp_path):
+    container = FakeContainer(str(tmp_path))
+    try:
+        kernel = PythonKernel(container)
+        assert kernel.execute("x = 6 * 7\nprint(x)")[0].strip() == "42"
+        shell = ShellSession(container)
+        output, code = shell.execute("echo hi > f.txt && cat f.txt")
+        assert output.strip() == "hi" and code == 0
+        assert (tmp_path / "f.txt").read_text() == "hi\n"
+        kernel.shutdown()
+        shell.shutdown()
+    finally:
+        container.stop()
+
+
+def test_chainlit_stub_keeps_sessions_per_user():
+    async def user(name):
+        state = cl.UserState(name)
+        cl.bind_user(state)
+        cl.user_session.set("session_id", f"web-{name}")
+        await asyncio.sleep(0)
+        await cl.Message(content=cl.user_session.get("session_id")).send()
+        answer = await cl.AskActionMessage(actions=[cl.Action("approve"), cl.Action("reject")]).send()
+        return state, answer["name"]
+
+    async def main():
+        return await asyncio.gather(user("a"), user("b"))
+
+    (a, answer), (b, _) = asyncio.run(main())
+    assert answer == "approve"
+    assert a.messages_after(0) == ["web-a"]
+    assert b.messages_after(0) == ["web-b"]
+
+
+def test_timed_executor_records_queue_wait():
+    with TimedExecutor(max_workers=1) as executor:
+        first = executor.submit(time.sleep, 0.05)
+        second = executor.submit(lambda: 1)
+        assert second.result() == 1 and first.result() is None
+    assert len(executor.waits) == 2
+    assert executor.waits[1] >= 40
@@ -0,0 +1,152 @@
+import threading
+import time
+
+import pytest
+
+from src.agent.tools.block_runner import parallel_blocks_limit, run_blocks, tag_output
+
+
+def test_limit_defaults_to_sequential(monkeypatch):
+    monkeypatch.delenv("IRONCLAW_PARALLEL_BLOCKS", raising=False)
+    assert parallel_blocks_limit() == 1
+    monkeypatch.setenv("IRONCLAW_PARALLEL_BLOCKS", "4")
+    assert parallel_blocks_limit() == 4
+
+
+def test_independent_blocks_overlap_and_keep_order():
+    barrier = threading.Barrier(3, timeout=5)
+
+    def execute(index, slot):
+        # Deadlocks (and times out) unless all three run at once
+        barrier.wait()
+        return (index, slot)
+
+    results = run_blocks([False, False, False], execute, max_parallel=3)
+    assert [index for index, _ in results] == [0, 1, 2]
+    assert sorted(slot for _, slot in results) == [0, 1, 2]
+
+
+def test_concurrency_is_limited():
+    active = 0
+    peak = 0
+    lock = threading.Lock()
+
+    def execute(index, slot):
+        nonlocal active, peak
+        with lock:
+            active += 1
+            peak = max(peak, active)
+        time.sleep(0.02)
+        with lock:
+            active -= 1
+        return slot
+
+    slots = run_blocks([False] * 6, execute, max_parallel=2)
+    assert peak == 2
+    assert set(slots) <= {0, 1}
+
+
+def test_sequential_block_waits_for_earlier_blocks_on_slot_zero():
+    finished = []
+
+    def execute(index, slot):
+        if index == 2:
+            assert finished == [0, 1] or finished == [1, 0]
+            return slot
+        time.sleep(0.02 * (2 - index))
+        finished.append(index)
+        return slot
+
+    results = run_blocks([False, False, True], execute, max_parallel=3)
+    assert results[2] == 0
+
+
+def test_single_slot_runs_in_order():
+    order = []
+    run_blocks([False, False], lambda index, slot: order.append((index, slot)), max_parallel=1)
+    assert order == [(0, 0), (1, 0)]
+
+
+def test_error_stops_scheduling_and_is_raised():
+    started = []
+
+    def execute(index, slot):
+        started.append(index)
+        if index == 0:
+            raise RuntimeError("boom")
+        return index
+
+    with pytest.raises(RuntimeError, match="boom"):
+        run_blocks([False, True, False], execute, max_parallel=2)
+    assert started == [0]
+
+
+def test_tag_output_prefixes_each_line():
+    out = []
+    emit = tag_output(out.append, "[#2]", threading.Lock())
+    emit("one\ntw")
+    emit("o\nthree\n")
+    emit("")
+    assert "".join(out) == "[#2] one\n[#2] two\n[#2] three\n"
+
+
+def test_fence_marks_sequential_blocks():
+    from src.agent.tools.sandbox import SandboxedTool
+
+    text = "```bash\ncurl -O a\n```\n```bash\ncurl -O b\n```\n```python sequential\nprint(1)\n```"
+    blocks = SandboxedTool._parse_code_blocks(None, text)
+    assert [(b.language, b.sequential) for b in blocks] == [
+        ("shell", False), ("shell", False), ("python", True),
+    ]
+
+
+def test_parallel_blocks_start_in_the_session_cwd(tmp_path, monkeypatch, local_exec_factory):
+    from unittest.mock import MagicMock
+    from src.agent.tools.code_blocks import CodeBlock
+    from src.agent.tools.sandbox import SandboxedTool
+    from src.sandbox import languages
+    from src.sandbox.kernel import PythonKernel
+    from src.sandbox.shell import ShellSession
+
+    kernels, shells = {}, {}
+
+    def get_kernel(container, slot=0):
+        if slot not in kernels:
+            kernels[slot] = PythonKernel(container, exec_factory=local_exec_factory)
+        return kernels[slot]
+
+    def get_shell(container, session_id="default"):
+        if session_id not in shells:
+            shells[session_id] = ShellSession(container, exec_factory=local_exec_factory)
+        return shells[session_id]
+
+    monkeypatch.setattr(languages, "get_kernel", get_kernel)
+    monkeypatch.setattr(languages, "get_shell", get_shell)
+
+    workspace = tmp_path / "workspace"
+    workspace.mkdir()
+    tool = SandboxedTool.__new__(SandboxedTool)
+    tool.session_id = "alice"
+    tool.container = MagicMock()
+    tool.workspace_path = str(workspace)
+    tool._slot_languages = {}
+    tool.interpreter = MagicMock()
+    tool.interpreter.computer.run = lambda language, code, stream: tool._slot_language(language, 0).run(code)
+    try:
+        # The session's own shell and kernel have moved into the workspace
+        tool._slot_language("shell", 0).shell.execute(f"cd {workspace} && export DATASET=sales")
+        tool._slot_language("python", 0).kernel.execute(f"import os; os.chdir({str(workspace)!r})")
+
+        tool.pending_blocks = [
+            CodeBlock(language="shell", code='sleep 0.2; echo "$PWD $DATASET"'),
+            CodeBlock(language="shell", code='echo "$PWD $DATASET"'),
+            CodeBlock(language="python", code="import os; print(os.getcwd(), os.environ.get('DATASET'))"),
+        ]
+        result = tool.confirm_execution(max_parallel=2)
+
+        assert result.count(f"{workspace} sales") == 2
+        assert f"{workspace} None" in result
+        assert "(shell, slot 1, exit code 0)" in result
+    finally:
+        for session in list(kernels.values()) + list(shells.values()):
+            session.shutdown()
@@ -0,0 +1,94 @@
+import os
+
+from src.sandbox.capture import OutputCapture
+
+
+def test_small_output_is_kept_whole(tmp_path):
+    spill = tmp_path / "out.log"
+    capture = OutputCapture(head_chars=10, tail_chars=10, spill_path=str(spill))
+    with capture:
+        capture.write("hello\n")
+        capture.write("world")
+    assert capture.summary() == "hello\nworld"
+    assert capture.total_lines == 2
+    assert capture.total_bytes == 11
+    assert not capture.truncated
+    assert not spill.exists()
+
+
+def test_large_output_keeps_head_and_tail_and_spills(tmp_path):
+    spill = tmp_path / "outputs" / "run-1.log"
+    capture = OutputCapture(head_chars=22, tail_chars=22, spill_path=str(spill), spill_name="/workspace/run-1.log")
+    lines = [f"line {i:05d}\n" for i in range(1000)]
+    with capture:
+        for line in lines:
+            capture.write(line)
+
+    summary = capture.summary()
+    assert summary.startswith("line 00000\nline 00001")
+    assert summary.endswith("line 00998\nline 00999\n")
+    assert "1000 lines in total" in summary
+    assert f"{len(''.join(lines))} bytes" in summary
+    assert "full output saved to /workspace/run-1.log" in summary
+    assert spill.read_text() == "".join(lines)
+    assert capture.truncated
+
+
+def test_memory_stays_bounded():
+    capture = OutputCapture(head_chars=100, tail_chars=100)
+    for _ in range(10000):
+        capture.write("x" * 50)
+    assert capture._head_len == 100
+    assert capture._tail_len < 100 + 50
+    assert len(capture.summary()) < 400
+
+
+def test_one_huge_chunk_keeps_only_the_tail_in_memory(tmp_path):
+    spill = tmp_path / "out.log"
+    text = "a" * 10 + "b" * 1_000_000 + "tail-end"
+    with OutputCapture(head_chars=10, tail_chars=100, spill_path=str(spill)) as capture:
+        capture.write(text)
+        capture.write("!" * 500_000)
+    assert capture._tail_len <= capture.tail_chars
+    assert capture.summary().endswith("!" * 100)
+    assert spill.read_text() == text + "!" * 500_000
+
+
+def test_write_returns_head_part_only():
+    capture = OutputCapture(head_chars=5, tail_chars=0)
+    assert capture.write("abc") == "abc"
+    assert capture.write("defg") == "de"
+    assert capture.write("hij") == ""
+    assert capture.total_bytes == 10
+
+
+def test_byte_count_is_utf8():
+    capture = OutputCapture()
+    capture.write("é✓")
+    assert capture.total_bytes == len("é✓".encode("utf-8"))
+
+
+def test_unwritable_spill_is_reported_not_raised(tmp_path):
+    blocker = tmp_path / "file"
+    blocker.write_text("")
+    capture = OutputCapture(head_chars=2, tail_chars=2, spill_path=os.path.join(str(blocker), "out.log"))
+    capture.write("0123456789")
+    capture.close()
+    assert "full output saved" not in capture.summary()
+    assert capture.summary().startswith("01\n[... 6 characters omitted")
+
+
+def test_prune_spills_keeps_newest_within_count_and_size(tmp_path):
+    from src.sandbox.capture import prune_spills
+
+    for i in range(5):
+        path = tmp_path / f"run-{i}.log"
+        path.write_text("x" * 100)
+        os.utime(path, ns=(i * 10**9, i * 10**9))
+    (tmp_path / "notes.txt").write_text("not a spill file")
+
+    assert prune_spills(str(tmp_path), max_files=3, max_bytes=10_000) == 2
+    assert sorted(os.listdir(tmp_path)) == ["notes.txt", "run-2.log", "run-3.log", "run-4.log"]
+    assert prune_spills(str(tmp_path), max_files=3, max_bytes=250) == 1
+    assert sorted(os.listdir(tmp_path)) == ["notes.txt", "run-3.log", "run-4.log"]
+    assert prune_spills(str(tmp_path / "missing")) == 0
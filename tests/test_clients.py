@@ -0,0 +1,47 @@
+import os
+from dataclasses import replace
+import pytest
+from src.agent.clients import clear_clients, get_clients
+from src.agent.provider import ProviderConfig
+
+
+def _config(**overrides):
+    config = ProviderConfig(
+        provider="ollama",
+        ollama_base_url="http://ollama.test:11434",
+        ollama_agent_model="m",
+        ollama_codegen_model="m",
+        gemini_api_key=None,
+        anthropic_api_key=None,
+        openai_api_key=None,
+    )
+    return replace(config, **overrides)
+
+
+@pytest.fixture(autouse=True)
+def _clean_registry():
+    clear_clients()
+    yield
+    clear_clients()
+
+
+def test_same_config_reuses_clients():
+    a = get_clients(_config())
+    b = get_clients(_config())
+    assert a is b
+    assert a.ollama is b.ollama
+
+
+def test_different_config_gets_separate_clients():
+    a = get_clients(_config())
+    b = get_clients(_config(ollama_base_url="http://other.test:11434"))
+    assert a is not b
+    assert a.ollama is not b.ollama
+
+
+def test_ollama_client_does_not_touch_process_env(monkeypatch):
+    monkeypatch.delenv("OLLAMA_HOST", raising=False)
+    client = get_clients(_config()).ollama
+    assert "OLLAMA_HOST" not in os.environ
+    assert str(client._client.base_url).startswith("http://ollama.test:11434")
+
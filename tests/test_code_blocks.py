@@ -0,0 +1,67 @@
+import re
+
+from src.agent.tools.code_blocks import CodeBlock, FenceParser, parse_code_blocks
+
+RESPONSE = (
+    "Here you go:\n"
+    "```bash\ncurl -O https://example.com/a.csv\n```\n"
+    "Some prose with `inline` code.\n"
+    "````python\nimport pandas as pd\nprint(pd.read_csv('a.csv'))\n```\n"
+    "```py sequential\nprint('done')\n```\n"
+    "```\n\n```\n"
+    "```ruby\nputs 1\n```"
+)
+
+
+def _reference(text):
+    """The original regex-over-the-whole-response parser."""
+    blocks = []
+    for match in re.finditer(r"```(\w+)?([^\n`]*)\n(.*?)```", text, re.DOTALL):
+        code = match.group(3).strip()
+        if code:
+            blocks.append(code)
+    return blocks
+
+
+def test_matches_whole_text_parse():
+    blocks = parse_code_blocks(RESPONSE)
+    assert [b.code for b in blocks] == _reference(RESPONSE)
+    assert [(b.language, b.sequential) for b in blocks] == [
+        ("shell", False), ("python", False), ("python", True), ("ruby", False),
+    ]
+
+
+def test_same_blocks_for_every_split_point():
+    expected = parse_code_blocks(RESPONSE)
+    for size in (1, 2, 3, 5, 7):
+        parser = FenceParser()
+        for start in range(0, len(RESPONSE), size):
+            parser.feed(RESPONSE[start:start + size])
+        assert parser.close() == expected
+
+
+def test_blocks_are_emitted_when_their_fence_closes():
+    seen = []
+    parser = FenceParser(on_block=seen.append)
+    assert parser.feed("```python\nprint(1)\n``") == []
+    assert seen == []
+    found = parser.feed("`\n```bash\nls")
+    assert found == [CodeBlock(code="print(1)", language="python")]
+    assert seen == found
+    parser.feed("\n```")
+    assert [b.language for b in seen] == ["python", "shell"]
+    assert parser.close() == seen
+
+
+def test_unfenced_response_falls_back_to_shell():
+    seen = []
+    parser = FenceParser(on_block=seen.append)
+    parser.feed("ls -la\n")
+    assert parser.close() == [CodeBlock(code="ls -la", language="shell")]
+    assert seen == parser.blocks
+    # close() is idempotent
+    assert parser.close() == seen
+
+
+def test_empty_response_has_no_blocks():
+    assert parse_code_blocks("  \n") == []
@@ -0,0 +1,90 @@
+import os
+from src.agent.tools.codegen_cache import CodegenCache, make_key, normalize_task, workspace_fingerprint
+from src.agent.tools.workspace_index import close_workspace_index
+
+BLOCKS = [{"code": "du -sh .", "language": "shell"}]
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_normalize_task_ignores_case_whitespace_and_punctuation():
+    assert normalize_task("  Show   disk usage. ") == normalize_task("show disk usage")
+    assert make_key("Show disk usage!", "ollama", "m", "fp") == make_key("show disk usage", "ollama", "m", "fp")
+    assert make_key("show disk usage", "ollama", "m", "fp") != make_key("show disk usage", "ollama", "other", "fp")
+
+
+def test_workspace_fingerprint_tracks_listing(tmp_path):
+    empty = workspace_fingerprint(str(tmp_path))
+    (tmp_path / "data.csv").write_text("a,b\n")
+    with_file = workspace_fingerprint(str(tmp_path))
+    assert with_file != empty
+    (tmp_path / "data.csv").write_text("a,b\n1,2\n")
+    assert workspace_fingerprint(str(tmp_path)) != with_file
+    assert workspace_fingerprint(str(tmp_path / "missing")) == empty
+    close_workspace_index(str(tmp_path))
+    close_workspace_index(str(tmp_path / "missing"))
+
+
+def test_workspace_fingerprint_sees_nested_same_size_edits(tmp_path):
+    nested = tmp_path / "reports" / "q1.csv"
+    nested.parent.mkdir()
+    nested.write_text("a,b\n")
+    os.utime(nested, ns=(10**18, 10**18))
+    before = workspace_fingerprint(str(tmp_path))
+
+    nested.write_text("x,y\n")  # same size, new mtime
+    assert workspace_fingerprint(str(tmp_path)) != before
+    close_workspace_index(str(tmp_path))
+
+
+def test_hits_misses_and_lru_eviction():
+    cache = CodegenCache(max_entries=2)
+    assert cache.get("a") is None
+    cache.put("a", BLOCKS)
+    cache.put("b", BLOCKS)
+    assert cache.get("a") == BLOCKS  # "a" is now most recently used
+    cache.put("c", BLOCKS)
+    assert cache.get("b") is None
+    assert cache.get("a") == BLOCKS
+    assert cache.stats() == {"hits": 2, "misses": 2, "evictions": 1, "entries": 2}
+
+
+def test_entries_expire_after_ttl():
+    clock = FakeClock()
+    cache = CodegenCache(ttl=60, clock=clock)
+    cache.put("a", BLOCKS)
+    clock.now += 59
+    assert cache.get("a") == BLOCKS
+    clock.now += 2
+    assert cache.get("a") is None
+    assert len(cache) == 0
+
+
+def test_disk_tier_survives_restart_and_honours_ttl(tmp_path):
+    db = str(tmp_path / "cache.db")
+    clock = FakeClock()
+    first = CodegenCache(ttl=60, db_path=db, clock=clock)
+    first.put("a", BLOCKS)
+    first.close()
+
+    second = CodegenCache(ttl=60, db_path=db, clock=clock)
+    assert second.get("a") == BLOCKS
+    second.close()
+
+    clock.now += 120
+    third = CodegenCache(ttl=60, db_path=db, clock=clock)
+    assert third.get("a") is None
+    third.close()
+
+
+def test_returned_blocks_are_copies():
+    cache = CodegenCache()
+    cache.put("a", BLOCKS)
+    cache.get("a")[0]["code"] = "rm -rf /"
+    assert cache.get("a") == BLOCKS
@@ -0,0 +1,43 @@
+import asyncio
+import threading
+import time
+import pytest
+from src.agent.concurrency import OutputBridge, run_blocking
+
+
+@pytest.mark.asyncio
+async def test_run_blocking_keeps_loop_responsive():
+    ticks = 0
+
+    async def ticker():
+        nonlocal ticks
+        while True:
+            await asyncio.sleep(0.01)
+            ticks += 1
+
+    task = asyncio.create_task(ticker())
+    result = await run_blocking(lambda: (time.sleep(0.2), "done")[1])
+    task.cancel()
+    assert result == "done"
+    assert ticks >= 5
+
+
+@pytest.mark.asyncio
+async def test_output_bridge_preserves_order_across_threads():
+    received = []
+
+    async def sink(content):
+        await asyncio.sleep(0)
+        received.append((content, threading.current_thread() is threading.main_thread()))
+
+    bridge = OutputBridge(sink)
+
+    def produce():
+        for i in range(50):
+            bridge(str(i))
+
+    await run_blocking(produce)
+    await bridge.aclose()
+    assert [c for c, _ in received] == [str(i) for i in range(50)]
+    # The sink always runs on the loop thread
+    assert all(on_loop for _, on_loop in received)
@@ -0,0 +1,13 @@
+from src.agent import core
+
+
+def test_agent_is_built_lazily_per_provider_config(monkeypatch):
+    monkeypatch.setenv("PROVIDER", "ollama")
+    agent = core.get_agent()
+    assert sorted(agent._function_toolset.tools) == ["confirm_execution", "list_workspace_files", "run_system_task"]
+    assert core.get_agent() is agent
+    assert core.ironclaw_agent is agent
+
+    # A different config (e.g. after falling back from Ollama) gets its own agent
+    monkeypatch.setenv("OLLAMA_AGENT_MODEL", "other-model")
+    assert core.get_agent() is not agent
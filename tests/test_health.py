@@ -0,0 +1,107 @@
+import asyncio
+import threading
+
+import httpx
+import pytest
+
+from src.agent import health
+from src.agent.health import ProviderHealthMonitor, probe_ollama
+from src.agent.provider import OllamaUnavailableError, check_ollama_health, get_provider_config
+
+
+class ScriptedProbe:
+    def __init__(self, *results):
+        self.results = list(results)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        reachable = self.results.pop(0) if len(self.results) > 1 else self.results[0]
+        return (True, ["llama3.2:latest"], None) if reachable else (False, [], "ConnectError: refused")
+
+
+@pytest.fixture(autouse=True)
+def _clean_monitors():
+    health.stop_health_monitors()
+    yield
+    health.stop_health_monitors()
+
+
+def test_probe_parses_tags_and_reports_errors():
+    def handler(request):
+        assert request.url.path == "/api/tags"
+        return httpx.Response(200, json={"models": [{"name": "llama3.2:latest"}]})
+
+    with httpx.Client(transport=httpx.MockTransport(handler)) as client:
+        assert probe_ollama("http://ollama.test", client) == (True, ["llama3.2:latest"], None)
+
+    def refuse(request):
+        raise httpx.ConnectError("refused")
+
+    with httpx.Client(transport=httpx.MockTransport(refuse)) as client:
+        reachable, models, error = probe_ollama("http://ollama.test", client)
+    assert not reachable and models == [] and "refused" in error
+
+
+def test_circuit_opens_after_consecutive_failures_and_closes_on_success():
+    monitor = ProviderHealthMonitor("http://ollama.test", failure_threshold=2, probe=ScriptedProbe(True, False, False, True))
+    assert monitor.refresh().reachable
+    monitor.check()
+
+    status = monitor.refresh()
+    assert not status.reachable and not status.circuit_open
+    # Models pulled before the outage are still known
+    assert status.models == ["llama3.2:latest"]
+    monitor.check()
+
+    assert monitor.refresh().circuit_open
+    with pytest.raises(OllamaUnavailableError, match="refused"):
+        monitor.check()
+
+    assert not monitor.refresh().circuit_open
+    monitor.check()
+
+
+def test_reported_call_failures_open_the_circuit():
+    monitor = ProviderHealthMonitor("http://ollama.test", failure_threshold=2, probe=ScriptedProbe(True))
+    monitor.refresh()
+    monitor.record_failure(ConnectionError("reset"))
+    monitor.record_success()
+    monitor.record_failure(ConnectionError("reset"))
+    monitor.check()
+    monitor.record_failure(ConnectionError("reset"))
+    with pytest.raises(OllamaUnavailableError, match="reset"):
+        monitor.check()
+
+
+def test_background_thread_probes_until_stopped():
+    probed = threading.Event()
+    probe = ScriptedProbe(True)
+
+    def counting_probe():
+        result = probe()
+        if probe.calls >= 3:
+            probed.set()
+        return result
+
+    monitor = ProviderHealthMonitor("http://ollama.test", interval=0.01, probe=counting_probe)
+    assert monitor.wait(timeout=5).reachable
+    assert probed.wait(5)
+    monitor.stop()
+    calls = probe.calls
+    assert not monitor._thread.is_alive()
+    assert probe.calls == calls
+
+
+def test_check_ollama_health_reads_the_cached_status(monkeypatch):
+    monkeypatch.setenv("PROVIDER", "ollama")
+    config = get_provider_config()
+    probe = ScriptedProbe(True)
+    health._monitors[config.ollama_base_url] = ProviderHealthMonitor(config.ollama_base_url, interval=60, probe=probe)
+
+    async def check_twice():
+        return await check_ollama_health(config), await check_ollama_health(config)
+
+    first, second = asyncio.run(check_twice())
+    assert first == second == (True, ["llama3.2:latest"])
+    assert probe.calls == 1
@@ -0,0 +1,118 @@
+import pytest
+from pydantic import TypeAdapter
+from pydantic_ai.messages import (
+    ModelMessage, ModelRequest, ModelResponse, SystemPromptPart, TextPart, ToolCallPart, ToolReturnPart, UserPromptPart,
+)
+from src.agent.history import (
+    HistoryCompactor, SUMMARY_PREFIX, compact_history, ensure_system_prompt, history_window_size, window_messages,
+)
+from src.database.manager import DatabaseManager
+
+
+def _turn(text, with_tool=False):
+    messages = [ModelRequest(parts=[UserPromptPart(content=text)])]
+    if with_tool:
+        messages.append(ModelResponse(parts=[ToolCallPart(tool_name="t", args={}, tool_call_id=text)]))
+        messages.append(ModelRequest(parts=[ToolReturnPart(tool_name="t", content="ok", tool_call_id=text)]))
+    messages.append(ModelResponse(parts=[TextPart(content=text)]))
+    return messages
+
+
+def test_window_keeps_short_history_intact():
+    history = _turn("a") + _turn("b")
+    assert window_messages(history, 10) == history
+    assert window_messages(history, None) == history
+
+
+def test_window_trims_forward_to_turn_start():
+    history = _turn("a") + _turn("b") + _turn("c")
+    window = window_messages(history, 3)
+    assert window == history[-2:]
+
+
+def test_window_never_splits_tool_call_from_return():
+    history = _turn("a") + _turn("b", with_tool=True)
+    window = window_messages(history, 2)
+    # The last two messages are a tool return and the answer; the window
+    # widens back to the start of that turn instead.
+    assert window == history[-4:]
+
+
+def test_window_size_from_env(monkeypatch):
+    monkeypatch.setenv("IRONCLAW_HISTORY_WINDOW", "0")
+    assert history_window_size() is None
+    monkeypatch.setenv("IRONCLAW_HISTORY_WINDOW", "50")
+    assert history_window_size() == 50
+
+
+def test_window_carries_system_prompt_over():
+    first = ModelRequest(parts=[SystemPromptPart(content="sys"), UserPromptPart(content="a")])
+    history = [first, ModelResponse(parts=[TextPart(content="a")])] + _turn("b")
+    window = window_messages(history, 2)
+    assert isinstance(window[0].parts[0], SystemPromptPart)
+    assert window[0].parts[1].content == "b"
+
+
+def test_ensure_system_prompt_only_adds_when_missing():
+    history = ensure_system_prompt(_turn("a"), "sys")
+    assert history[0].parts[0] == SystemPromptPart(content="sys", timestamp=history[0].parts[0].timestamp)
+    assert ensure_system_prompt(history, "other")[0].parts[0].content == "sys"
+
+
+def _fake_summarizer(calls):
+    async def summarize(transcript):
+        calls.append(transcript)
+        return "the user asked about a, b and c"
+    return summarize
+
+
+@pytest.mark.asyncio
+async def test_compactor_folds_older_turns_into_summary():
+    calls = []
+    compactor = HistoryCompactor(_fake_summarizer(calls), max_messages=4, max_tokens=0, keep_last=2)
+    history = _turn("a") + _turn("b", with_tool=True) + _turn("c")
+
+    assert compactor.should_compact(history)
+    result = await compactor.compact(history)
+
+    assert result.compacted == 6 and result.kept == 2
+    assert result.history[0].parts[0].content.startswith(SUMMARY_PREFIX)
+    assert result.history[1:] == history[-2:]
+    assert "User: a" in calls[0] and "Tool call: t({})" in calls[0] and "User: c" not in calls[0]
+
+
+@pytest.mark.asyncio
+async def test_compactor_uses_token_estimate():
+    compactor = HistoryCompactor(_fake_summarizer([]), max_messages=0, max_tokens=10, keep_last=2)
+    assert not compactor.should_compact(_turn("short"))
+    assert compactor.should_compact(_turn("x" * 200) + _turn("y"))
+
+
+@pytest.mark.asyncio
+async def test_compact_history_persists_summary_and_archives(tmp_path):
+    adapter = TypeAdapter(list[ModelMessage])
+    db = DatabaseManager(f"sqlite+aiosqlite:///{tmp_path / 'history.db'}")
+    await db.initialize_db()
+    session_id = await db.get_or_create_session()
+    history = _turn("a") + _turn("b") + _turn("c")
+    await db.save_messages(session_id, adapter.dump_python(history, mode='json'))
+
+    compactor = HistoryCompactor(_fake_summarizer([]), max_messages=4, max_tokens=0, keep_last=2)
+    compacted = await compact_history(history, db, session_id, compactor)
+    assert len(compacted) == 3
+
+    # Reloading yields the same shape: summary first, then the kept turn
+    reloaded = adapter.validate_python(await db.get_history_window(session_id, 200))
+    assert [m.parts[0].content for m in reloaded] == [m.parts[0].content for m in compacted]
+    assert len(await db.get_messages(session_id, include_archived=True)) == 6
+    await db.close()
+
+
+@pytest.mark.asyncio
+async def test_compact_history_keeps_history_when_summariser_fails():
+    async def broken(transcript):
+        raise RuntimeError("model down")
+
+    history = _turn("a") + _turn("b") + _turn("c")
+    compactor = HistoryCompactor(broken, max_messages=4, max_tokens=0, keep_last=2)
+    assert await compact_history(history, db=None, session_id="s", compactor=compactor) == history
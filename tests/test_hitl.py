@@ -1,6 +1,7 @@
 import pytest
 from unittest.mock import MagicMock, patch
 from src.agent.tools.sandbox import get_sandbox_tool, CodeExecutionRequest
+from src.agent.clients import clear_clients
 
 @pytest.fixture
 def sandbox_tool():
@@ -9,8 +10,10 @@ def sandbox_tool():
     tool.pending_blocks = []
     return tool
 
-@patch('src.agent.tools.sandbox.genai.Client')
+@patch('google.genai.Client')
 def test_run_system_task_generates_request(mock_client_class, sandbox_tool):
+    # Clients are cached per provider config; start from a clean registry
+    clear_clients()
     # Setup mock client and response
     mock_client = MagicMock()
     mock_client_class.return_value = mock_client
@@ -29,20 +32,20 @@ def test_run_system_task_generates_request(mock_client_class, sandbox_tool):
     assert "To accomplish: list files" in result.reasoning
     assert len(sandbox_tool.pending_blocks) == 1
 
-@patch('src.agent.tools.sandbox.interpreter')
-def test_confirm_execution_calls_computer_run(mock_interpreter, sandbox_tool):
+def test_confirm_execution_calls_computer_run(sandbox_tool):
     # Manually set pending blocks
     from src.agent.tools.sandbox import CodeBlock
     sandbox_tool.pending_blocks = [CodeBlock(code="echo hello", language="shell")]
     
     # Setup mock for interpreter.computer.run
-    mock_interpreter.computer.run.return_value = [
-        {"type": "console", "content": "hello\n"}
-    ]
+    with patch.object(sandbox_tool, 'interpreter') as mock_interpreter:
+        mock_interpreter.computer.run.return_value = [
+            {"type": "console", "content": "hello\n"}
+        ]
+        
+        result = sandbox_tool.confirm_execution()
     
-    result = sandbox_tool.confirm_execution()
-    
-    mock_interpreter.computer.run.assert_called_once_with("shell", "echo hello")
+    mock_interpreter.computer.run.assert_called_once_with("shell", "echo hello", stream=True)
     assert "hello" in result
     assert len(sandbox_tool.pending_blocks) == 0
 
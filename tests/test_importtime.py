@@ -0,0 +1,57 @@
+import os
+import subprocess
+import sys
+
+from src.diagnostics.importtime import aggregate, parse_importtime
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+SAMPLE = """\
+import time: self [us] | cumulative | imported package
+import time:       100 |        100 |   _io
+import time:        50 |        150 | io
+import time:       200 |        200 |     pkg.sub.leaf
+import time:        30 |        230 |   pkg.sub
+import time:        20 |        250 | pkg
+some other stderr line
+"""
+
+
+def test_parse_importtime():
+    records = parse_importtime(SAMPLE)
+    assert [(r.module, r.self_us, r.cumulative_us, r.depth) for r in records] == [
+        ("_io", 100, 100, 1),
+        ("io", 50, 150, 0),
+        ("pkg.sub.leaf", 200, 200, 2),
+        ("pkg.sub", 30, 230, 1),
+        ("pkg", 20, 250, 0),
+    ]
+
+
+def test_aggregate_by_package():
+    records = parse_importtime(SAMPLE)
+    assert aggregate(records) == [("pkg", 250, 3), ("_io", 100, 1), ("io", 50, 1)]
+    assert aggregate(records, depth=2)[0] == ("pkg.sub", 230, 2)
+
+
+def test_entry_point_does_not_import_heavy_sdks():
+    heavy = ["interpreter", "litellm", "google.genai", "ollama"]
+    code = (
+        "import sys, src.main; "
+        f"print([m for m in {heavy!r} if m in sys.modules])"
+    )
+    env = dict(os.environ, PYTHONPATH=_ROOT)
+    proc = subprocess.run([sys.executable, "-c", code], cwd=_ROOT, env=env, capture_output=True, text=True, timeout=120)
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip().splitlines()[-1] == "[]"
+
+
+def test_agent_modules_do_not_import_the_sandbox():
+    code = (
+        "import sys, src.agent.core, src.agent.history; "
+        "print([m for m in ('docker', 'src.agent.tools.sandbox') if m in sys.modules])"
+    )
+    env = dict(os.environ, PYTHONPATH=_ROOT)
+    proc = subprocess.run([sys.executable, "-c", code], cwd=_ROOT, env=env, capture_output=True, text=True, timeout=120)
+    assert proc.returncode == 0, proc.stderr
+    assert proc.stdout.strip().splitlines()[-1] == "[]"
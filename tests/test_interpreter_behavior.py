@@ -16,7 +16,7 @@ def test_confirm_execution_with_callback(sandbox_tool):
     ]
     
     # Mock interpreter.computer.run
-    with patch('src.agent.tools.sandbox.interpreter') as mock_interpreter:
+    with patch.object(sandbox_tool, 'interpreter') as mock_interpreter:
         # Mocking the generator returned by interpreter.computer.run
         mock_interpreter.computer.run.side_effect = [
             [{"type": "console", "content": "hello\n"}],
@@ -39,7 +39,7 @@ def test_confirm_execution_without_callback(sandbox_tool):
         CodeBlock(code="echo hello", language="shell")
     ]
     
-    with patch('src.agent.tools.sandbox.interpreter') as mock_interpreter:
+    with patch.object(sandbox_tool, 'interpreter') as mock_interpreter:
         mock_interpreter.computer.run.return_value = [{"type": "console", "content": "hello\n"}]
         
         result = sandbox_tool.confirm_execution()
@@ -0,0 +1,113 @@
+import pytest
+from unittest.mock import MagicMock
+from src.sandbox.kernel import PythonKernel
+
+
+@pytest.fixture
+def kernel(local_exec_factory):
+    k = PythonKernel(MagicMock(), exec_factory=local_exec_factory)
+    yield k
+    k.shutdown()
+
+
+def test_state_persists_between_blocks(kernel):
+    assert kernel.execute("x = 41") == ("", 0)
+    output, status = kernel.execute("print(x + 1)")
+    assert status == 0
+    assert output == "42\n"
+
+
+def test_sessions_have_separate_namespaces(kernel):
+    kernel.execute("x = 'a'", session="alice")
+    output, status = kernel.execute("print(x)", session="bob")
+    assert status == 1
+    assert "NameError" in output
+    assert kernel.execute("print(x)", session="alice") == ("a\n", 0)
+
+
+def test_reset_clears_session(kernel):
+    kernel.execute("y = 1")
+    kernel.reset()
+    output, status = kernel.execute("print(y)")
+    assert status == 1
+    assert "NameError" in output
+
+
+def test_exit_status_and_respawn(kernel):
+    assert kernel.execute("import sys; sys.exit(3)")[1] == 3
+    first_pid = kernel.pid
+    # Killing the worker process itself is reported, then a fresh one starts
+    _, status = kernel.execute("import os; os._exit(0)")
+    assert status == -1
+    assert kernel.execute("print('back')") == ("back\n", 0)
+    assert kernel.pid != first_pid
+
+
+
+def test_stream_separates_stdout_and_stderr(kernel):
+    pieces = list(kernel.stream("import sys\nprint('out')\nprint('err', file=sys.stderr)"))
+    assert "".join(t for s, t in pieces if s == "stdout") == "out\n"
+    assert "".join(t for s, t in pieces if s == "stderr") == "err\n"
+    assert kernel.last_status == 0
+
+
+def test_start_prewarms_worker(kernel):
+    assert not kernel.running
+    kernel.start()
+    assert kernel.running
+    pid = kernel.pid
+    assert kernel.execute("print(1)") == ("1\n", 0)
+    assert kernel.pid == pid
+
+
+def test_state_moves_between_workers(kernel, local_exec_factory, tmp_path):
+    kernel.execute(f"import os; os.chdir({str(tmp_path)!r}); os.environ['STAGE'] = 'two'")
+    other = PythonKernel(MagicMock(), exec_factory=local_exec_factory)
+    try:
+        other.set_state(kernel.get_state())
+        assert other.execute("import os; print(os.getcwd(), os.environ['STAGE'])") == (f"{tmp_path} two\n", 0)
+    finally:
+        other.shutdown()
+
+
+def _signal_locally(kernel):
+    # Route the kernel's `kill` calls to the local worker process
+    import os
+    import signal
+
+    def exec_run(cmd):
+        os.kill(int(cmd[-1]), signal.SIGKILL if cmd[1] == "-9" else signal.SIGINT)
+
+    kernel.container.exec_run.side_effect = exec_run
+
+
+def test_worker_ignores_interrupts_between_blocks(kernel):
+    _signal_locally(kernel)
+    kernel.start()
+    pid = kernel.pid
+    kernel.interrupt()
+    assert kernel.execute("print('alive')") == ("alive\n", 0)
+    assert kernel.pid == pid
+
+
+def test_abandoned_block_that_ignores_interrupts_kills_the_worker(kernel, monkeypatch):
+    import time
+    from src.sandbox import kernel as kernel_module
+
+    monkeypatch.setattr(kernel_module, "_INTERRUPT_GRACE", 0.5)
+    _signal_locally(kernel)
+    stubborn = (
+        "import signal, sys, time\n"
+        "signal.signal(signal.SIGINT, signal.SIG_IGN)\n"
+        "sys.stdout.write('started\\n')\n"
+        "while True:\n"
+        "    time.sleep(0.05)\n"
+    )
+    pieces = kernel.stream(stubborn)
+    assert next(pieces) == ("stdout", "started\n")
+    pid = kernel.pid
+    started = time.monotonic()
+    pieces.close()
+    assert time.monotonic() - started < 5
+    assert kernel.execute("print('back')") == ("back\n", 0)
+    assert kernel.pid != pid
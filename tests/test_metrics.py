@@ -0,0 +1,80 @@
+import json
+import urllib.request
+
+import pytest
+from pydantic_ai import Agent
+from pydantic_ai.messages import ModelResponse, TextPart
+from pydantic_ai.models.function import FunctionModel
+
+from src.agent.timed_model import TimedModel
+from src.telemetry import metrics
+from src.telemetry.metrics import Counter, Histogram, MetricsRegistry, StreamMeter, span
+
+
+def test_histogram_renders_cumulative_buckets():
+    hist = Histogram("test_seconds", "Test.", ("phase",), buckets=(0.1, 1.0))
+    for value in (0.05, 0.1, 0.5, 3.0):
+        hist.observe(value, phase='a"b')
+    registry = MetricsRegistry()
+    registry.register(hist)
+    text = registry.render()
+    assert "# TYPE test_seconds histogram" in text
+    assert 'test_seconds_bucket{phase="a\\"b",le="0.1"} 2' in text
+    assert 'test_seconds_bucket{phase="a\\"b",le="1"} 3' in text
+    assert 'test_seconds_bucket{phase="a\\"b",le="+Inf"} 4' in text
+    assert 'test_seconds_count{phase="a\\"b"} 4' in text
+    assert hist.sum(phase='a"b') == pytest.approx(3.65)
+
+
+def test_span_records_duration_errors_and_log(tmp_path, monkeypatch):
+    log = tmp_path / "spans.jsonl"
+    monkeypatch.setenv("IRONCLAW_METRICS_LOG", str(log))
+    before = metrics.PHASE_SECONDS.count(phase="test_phase", provider="p", model="m")
+
+    with span("test_phase", "p", "m", task="x") as timing:
+        timing.set(blocks=2)
+    with pytest.raises(ValueError):
+        with span("test_phase", "p", "m"):
+            raise ValueError("boom")
+
+    assert metrics.PHASE_SECONDS.count(phase="test_phase", provider="p", model="m") == before + 2
+    assert metrics.PHASE_ERRORS.value(phase="test_phase", provider="p", model="m") >= 1
+    records = [json.loads(line) for line in log.read_text().splitlines()]
+    assert records[0]["task"] == "x" and records[0]["blocks"] == 2 and "error" not in records[0]
+    assert records[1]["error"] == "ValueError: boom"
+
+
+def test_stream_meter_prefers_reported_eval_rate():
+    meter = StreamMeter("ollama", "meter-test")
+    meter.token("")
+    assert meter.ttft is None
+    meter.token("a")
+    meter.token("b")
+    assert meter.ttft is not None
+    assert meter.finish(eval_count=50, eval_duration_ns=2_000_000_000) == 25.0
+    assert metrics.TOKENS.value(provider="ollama", model="meter-test") == 50
+    assert metrics.TTFT_SECONDS.count(provider="ollama", model="meter-test") == 1
+
+
+def test_counter_and_metrics_server():
+    counter = metrics.REGISTRY.register(Counter("test_server_total", "Test."))
+    counter.inc(3)
+    server = metrics.start_metrics_server(port=0)
+    try:
+        port = server.server_address[1]
+        body = urllib.request.urlopen(f"http://127.0.0.1:{port}/metrics", timeout=5).read().decode()
+        assert "test_server_total 3" in body
+    finally:
+        server.shutdown()
+        server.server_close()
+        metrics._server = None
+
+
+def test_timed_model_times_agent_calls_lazily():
+    # A model name is not resolved (no API key needed) until the first call
+    assert Agent(TimedModel("google-gla:gemini-2.5-flash", "gemini")).model.model_label == "gemini-2.5-flash"
+
+    model = FunctionModel(lambda messages, info: ModelResponse(parts=[TextPart("hi")]), model_name="timed-test")
+    agent = Agent(TimedModel(model, "test"))
+    assert agent.run_sync("hello").output == "hi"
+    assert metrics.PHASE_SECONDS.count(phase="agent_model", provider="test", model="timed-test") == 1
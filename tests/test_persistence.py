@@ -2,7 +2,8 @@ import pytest
 import pytest_asyncio
 import os
 import asyncio
-from src.database.manager import DatabaseManager
+from src.database import manager as manager_module
+from src.database.manager import DatabaseManager, PersistenceError
 from src.database.models import Base
 
 @pytest_asyncio.fixture
@@ -60,3 +61,202 @@ async def test_multiple_sessions(db_manager):
     assert m1[0]["content"] == "S1"
     assert len(m2) == 1
     assert m2[0]["content"] == "S2"
+
+def _user(text):
+    return {"kind": "request", "parts": [{"part_kind": "user-prompt", "content": text}]}
+
+def _tool_call():
+    return {"kind": "response", "parts": [{"part_kind": "tool-call", "tool_name": "t", "tool_call_id": "1"}]}
+
+def _tool_return():
+    return {"kind": "request", "parts": [{"part_kind": "tool-return", "tool_name": "t", "tool_call_id": "1"}]}
+
+def _answer(text):
+    return {"kind": "response", "parts": [{"part_kind": "text", "content": text}]}
+
+@pytest.mark.asyncio
+async def test_message_pages_walk_backwards(db_manager):
+    session_id = await db_manager.get_or_create_session()
+    await db_manager.save_messages(session_id, [_user(str(i)) for i in range(5)])
+
+    page, cursor = await db_manager.get_message_page(session_id, 2)
+    assert [m["parts"][0]["content"] for m in page] == ["3", "4"]
+    page, cursor = await db_manager.get_message_page(session_id, 2, before_seq=cursor)
+    assert [m["parts"][0]["content"] for m in page] == ["1", "2"]
+    page, cursor = await db_manager.get_message_page(session_id, 2, before_seq=cursor)
+    assert [m["parts"][0]["content"] for m in page] == ["0"]
+    assert cursor is None
+
+@pytest.mark.asyncio
+async def test_messages_since_checkpoint(db_manager):
+    session_id = await db_manager.get_or_create_session()
+    await db_manager.save_messages(session_id, [_user("old")])
+    checkpoint = await db_manager.latest_seq(session_id)
+    await db_manager.save_messages(session_id, [_user("new")])
+
+    since = await db_manager.get_messages(session_id, after_seq=checkpoint)
+    assert [m["parts"][0]["content"] for m in since] == ["new"]
+
+@pytest.mark.asyncio
+async def test_history_window_starts_on_a_user_turn(db_manager):
+    session_id = await db_manager.get_or_create_session()
+    await db_manager.save_messages(session_id, [
+        _user("first"), _answer("a"),
+        _user("second"), _tool_call(), _tool_return(), _answer("b"),
+    ])
+
+    # A 3-message tail would begin on the tool call; widen to the turn start
+    window = await db_manager.get_history_window(session_id, 3)
+    assert window[0] == _user("second")
+    assert len(window) == 4
+
+    window = await db_manager.get_history_window(session_id, 5)
+    assert window[0] == _user("second")
+
+    assert len(await db_manager.get_history_window(session_id, None)) == 6
+
+@pytest.mark.asyncio
+async def test_initialize_db_adds_archived_column_to_old_databases(tmp_path):
+    import sqlite3
+    db_path = tmp_path / "old.db"
+    conn = sqlite3.connect(db_path)
+    conn.executescript("""
+        CREATE TABLE chat_sessions (id VARCHAR(36) PRIMARY KEY, created_at DATETIME, metadata_json JSON);
+        CREATE TABLE chat_messages (id INTEGER PRIMARY KEY, session_id VARCHAR(36), role VARCHAR(20),
+                                    content JSON, timestamp DATETIME);
+        INSERT INTO chat_sessions (id) VALUES ('s');
+        INSERT INTO chat_messages (session_id, role, content) VALUES ('s', 'request', '{"kind": "request"}');
+        INSERT INTO chat_messages (session_id, role, content) VALUES ('orphan', 'request', '{"kind": "request"}');
+    """)
+    conn.close()
+
+    manager = DatabaseManager(f"sqlite+aiosqlite:///{db_path}")
+    await manager.initialize_db()
+    assert await manager.get_messages("s") == [{"kind": "request"}]
+    # Sequence numbers continue after the migrated rows
+    await manager.save_messages("s", [{"kind": "response"}])
+    await manager.save_messages("orphan", [{"kind": "response"}])
+    assert await manager.get_messages("s") == [{"kind": "request"}, {"kind": "response"}]
+    assert await manager.get_messages("orphan") == [{"kind": "request"}, {"kind": "response"}]
+    await manager.close()
+
+@pytest.mark.asyncio
+async def test_save_summary_archives_all_but_recent(db_manager):
+    session_id = await db_manager.get_or_create_session()
+    await db_manager.save_messages(session_id, [_user(str(i)) for i in range(4)])
+
+    await db_manager.save_summary(session_id, _user("summary 1"), keep_last=2)
+    assert await db_manager.get_history_window(session_id, 10) == [_user("summary 1"), _user("2"), _user("3")]
+
+    await db_manager.save_messages(session_id, [_user("4")])
+    await db_manager.save_summary(session_id, _user("summary 2"), keep_last=1)
+    assert await db_manager.get_history_window(session_id, 10) == [_user("summary 2"), _user("4")]
+    assert await db_manager.get_summary(session_id) == _user("summary 2")
+
+@pytest.mark.asyncio
+async def test_sqlite_runs_in_wal_mode(db_manager):
+    async with db_manager.engine.connect() as conn:
+        mode = (await conn.exec_driver_sql("PRAGMA journal_mode")).scalar()
+    assert mode == "wal"
+
+@pytest.mark.asyncio
+async def test_sequence_orders_messages_and_creates_session(db_manager):
+    # save_messages creates the session row on first write
+    await db_manager.save_messages("fresh", [_user("a"), _user("b")])
+    await db_manager.save_messages("fresh", [_user("c")])
+    assert await db_manager.latest_seq("fresh") == 3
+    assert [m["parts"][0]["content"] for m in await db_manager.get_messages("fresh")] == ["a", "b", "c"]
+    assert await db_manager.get_or_create_session("fresh") == "fresh"
+
+@pytest.mark.asyncio
+async def test_concurrent_saves_get_distinct_sequence_numbers(db_manager):
+    session_id = await db_manager.get_or_create_session()
+    await asyncio.gather(*(db_manager.save_messages(session_id, [_user(str(i))]) for i in range(10)))
+    assert await db_manager.latest_seq(session_id) == 10
+    assert len(await db_manager.get_messages(session_id)) == 10
+
+@pytest.mark.asyncio
+async def test_queued_messages_are_visible_to_reads(db_manager):
+    session_id = await db_manager.get_or_create_session()
+    for i in range(5):
+        await db_manager.queue_messages(session_id, [_user(str(i))])
+    # Reads flush the write-behind queue first
+    assert [m["parts"][0]["content"] for m in await db_manager.get_messages(session_id)] == ["0", "1", "2", "3", "4"]
+
+@pytest.mark.asyncio
+async def test_queue_batches_sessions_into_one_transaction(db_manager):
+    s1 = await db_manager.get_or_create_session()
+    s2 = await db_manager.get_or_create_session()
+    batches = []
+    write_batch = db_manager._write_batch
+
+    async def recording_write(batch):
+        batches.append(batch)
+        await write_batch(batch)
+
+    db_manager._write_batch = recording_write
+    await asyncio.gather(
+        db_manager.queue_messages(s1, [_user("a1")]),
+        db_manager.queue_messages(s2, [_user("b1")]),
+        db_manager.queue_messages(s1, [_user("a2")]),
+    )
+    await db_manager.flush()
+    assert len(batches) == 1
+    assert [m["parts"][0]["content"] for m in await db_manager.get_messages(s1)] == ["a1", "a2"]
+    assert [m["parts"][0]["content"] for m in await db_manager.get_messages(s2)] == ["b1"]
+
+@pytest.mark.asyncio
+async def test_full_queue_applies_backpressure(tmp_path):
+    manager = DatabaseManager(f"sqlite+aiosqlite:///{tmp_path / 'bp.db'}", flush_interval=0, max_pending=1)
+    await manager.initialize_db()
+    release = asyncio.Event()
+    write_batch = manager._write_batch
+
+    async def slow_write(batch):
+        await release.wait()
+        await write_batch(batch)
+
+    manager._write_batch = slow_write
+    await manager.queue_messages("s", [_user("1")])  # taken by the writer
+    await asyncio.sleep(0)
+    await manager.queue_messages("s", [_user("2")])  # fills the queue
+    blocked = asyncio.create_task(manager.queue_messages("s", [_user("3")]))
+    await asyncio.sleep(0.05)
+    assert not blocked.done()
+
+    release.set()
+    await blocked
+    await manager.close()  # close drains the queue
+
+    reopened = DatabaseManager(f"sqlite+aiosqlite:///{tmp_path / 'bp.db'}")
+    assert [m["parts"][0]["content"] for m in await reopened.get_messages("s")] == ["1", "2", "3"]
+    await reopened.close()
+
+@pytest.mark.asyncio
+async def test_failed_batch_is_held_back_in_order(tmp_path, monkeypatch):
+    monkeypatch.setattr("src.database.manager._WRITE_ATTEMPTS", 1)
+    manager = DatabaseManager(f"sqlite+aiosqlite:///{tmp_path / 'fail.db'}", flush_interval=0)
+    await manager.initialize_db()
+    write_batch = manager._write_batch
+    broken = [True]
+
+    async def flaky_write(batch):
+        if broken[0]:
+            raise OSError("disk full")
+        await write_batch(batch)
+
+    manager._write_batch = flaky_write
+    await manager.queue_messages("s", [_user("1")])
+    with pytest.raises(PersistenceError, match="disk full"):
+        await manager.flush()
+
+    # Later batches wait behind the failed one instead of leaving a gap
+    broken[0] = False
+    await manager.queue_messages("s", [_user("2")])
+    assert [m["parts"][0]["content"] for m in await manager.get_messages("s")] == ["1", "2"]
+    await manager.close()
+
+def test_unsupported_database_is_rejected(monkeypatch):
+    monkeypatch.delitem(manager_module._UPSERT_INSERTS, "sqlite")
+    with pytest.raises(ValueError, match="Unsupported database 'sqlite'"):
+        DatabaseManager("sqlite+aiosqlite:///unused.db")
@@ -0,0 +1,152 @@
+import itertools
+import os
+import pytest
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+from src.sandbox.pool import _RESET_CMD, _RESET_REFUSED, ContainerPool
+
+_ids = itertools.count()
+
+
+def _make_container(*args, **kwargs):
+    container = MagicMock()
+    container.id = f"c{next(_ids)}"
+    container.status = "running"
+    # Every command succeeds, so the bind-mount check passes
+    container.exec_run.return_value = SimpleNamespace(exit_code=0, output=b"")
+    return container
+
+
+@pytest.fixture
+def manager():
+    m = MagicMock()
+    m.image = "ironclaw-agent"
+    m.client.containers.list.return_value = []
+    m.create_container.side_effect = _make_container
+    return m
+
+
+@pytest.fixture
+def pool(manager):
+    p = ContainerPool(manager, size=2).start()
+    assert p.wait_until_warm(timeout=5)
+    yield p
+    p.shutdown()
+
+
+def test_lease_uses_warm_container(pool, manager):
+    created_before = manager.create_container.call_count
+    container = pool.lease("alice")
+    assert container.status == "running"
+    # The same session keeps its container
+    assert pool.lease("alice") is container
+    assert "alice" in pool.leased()
+    # Refill replaces the leased one in the background
+    assert pool.wait_until_warm(timeout=5)
+    assert manager.create_container.call_count == created_before + 1
+
+
+def test_sessions_get_distinct_containers(pool):
+    assert pool.lease("alice") is not pool.lease("bob")
+
+
+def test_release_recycles_into_pool(manager):
+    pool = ContainerPool(manager, size=1)
+    container = pool.lease("alice")  # cold path, pool not started
+    pool.release("alice")
+    container.exec_run.assert_called_once()
+    assert pool.idle_count == 1
+    assert pool.lease("bob") is container
+    manager.destroy_container.assert_not_called()
+
+
+def test_release_destroys_when_pool_full(pool, manager):
+    container = pool.lease("alice")
+    assert pool.wait_until_warm(timeout=5)
+    pool.release("alice")
+    manager.destroy_container.assert_called_once_with(container)
+    assert pool.idle_count == 2
+
+
+def test_dead_idle_container_is_skipped(pool, manager):
+    stale = pool._idle[0]
+    stale.status = "exited"
+    container = pool.lease("alice")
+    assert container is not stale
+
+
+def test_shutdown_destroys_everything(manager):
+    pool = ContainerPool(manager, size=1).start()
+    assert pool.wait_until_warm(timeout=5)
+    pool.lease("alice")
+    assert pool.wait_until_warm(timeout=5)
+    pool.shutdown()
+    assert manager.destroy_container.call_count == 2
+    assert pool.idle_count == 0
+
+
+def test_lease_binds_pooled_container_to_session_workspace(manager, tmp_path):
+    manager.workspace_path = str(tmp_path)
+    pool = ContainerPool(manager, size=1).start()
+    assert pool.wait_until_warm(timeout=5)
+    slot_kwargs = manager.create_container.call_args.kwargs
+    slot = slot_kwargs["workspace_path"]
+    assert slot.startswith(str(tmp_path / ".pool"))
+
+    session_dir = tmp_path / "alice"
+    session_dir.mkdir()
+    (session_dir / "notes.txt").write_text("hi")
+    container = pool.lease("alice", workspace_path=str(session_dir))
+
+    # The slot directory became the session's workspace, files included
+    assert not (tmp_path / ".pool" / slot.rsplit("/", 1)[-1]).exists()
+    assert (session_dir / "notes.txt").read_text() == "hi"
+
+    # Bound containers are never recycled into the pool
+    pool.release("alice")
+    assert _RESET_CMD not in [c.args[0] for c in container.exec_run.call_args_list]
+    manager.destroy_container.assert_called_with(container)
+    assert (session_dir / "notes.txt").exists()
+    pool.shutdown()
+
+
+def test_lease_falls_back_when_bind_mount_does_not_follow_rename(manager, tmp_path):
+    manager.workspace_path = str(tmp_path)
+    pool = ContainerPool(manager, size=1).start()
+    assert pool.wait_until_warm(timeout=5)
+    warm = pool._idle[0]
+    # The container can't see the marker file (e.g. Docker Desktop file sharing)
+    warm.exec_run.return_value = SimpleNamespace(exit_code=1, output=b"")
+
+    session_dir = tmp_path / "alice"
+    session_dir.mkdir()
+    (session_dir / "notes.txt").write_text("hi")
+    container = pool.lease("alice", workspace_path=str(session_dir))
+
+    assert container is not warm
+    assert manager.create_container.call_args.kwargs["workspace_path"] == str(session_dir)
+    assert sorted(os.listdir(session_dir)) == ["notes.txt"]
+    # Later sessions with a workspace don't try the pool again
+    assert pool.wait_until_warm(timeout=5)
+    idle = list(pool._idle)
+    pool.lease("bob", workspace_path=str(tmp_path / "bob"))
+    assert pool._idle == idle
+    pool.shutdown()
+
+
+def test_release_destroys_container_that_refuses_reset(manager):
+    pool = ContainerPool(manager, size=1)
+    container = pool.lease("alice")
+    container.exec_run.return_value = SimpleNamespace(exit_code=_RESET_REFUSED, output=b"")
+    pool.release("alice")
+    assert pool.idle_count == 0
+    manager.destroy_container.assert_called_once_with(container)
+
+
+def test_wait_until_warm_for_first_container(manager):
+    pool = ContainerPool(manager, size=3)
+    assert not pool.wait_until_warm(timeout=0.05, count=1)
+    pool.start()
+    assert pool.wait_until_warm(timeout=5, count=1)
+    assert pool.idle_count >= 1
+    pool.shutdown()
@@ -0,0 +1,54 @@
+import threading
+import time
+
+from src.telemetry import profiler
+from src.telemetry.profiler import IDLE, SamplingProfiler, profile_turn, request_profile
+
+
+def _spin(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+def test_sampling_profiler_folds_busy_and_idle_threads():
+    event = threading.Event()
+    idle = threading.Thread(target=event.wait, name="idle-worker")
+    busy = threading.Thread(target=_spin, args=(0.2,), name="busy worker")
+    sampler = SamplingProfiler(interval=0.002).start()
+    idle.start()
+    busy.start()
+    busy.join()
+    profile = sampler.stop()
+    event.set()
+    idle.join()
+
+    assert profile.samples > 10
+    stacks = profile.folded().splitlines()
+    assert any(line.startswith("busy_worker;") and "_spin (test_profiler.py:" in line for line in stacks)
+    assert any(line.startswith(f"idle-worker;{IDLE} ") for line in stacks)
+    assert profile.top(1)[0][0].startswith("_spin (")
+
+
+def test_profile_turn_is_off_unless_requested(tmp_path, monkeypatch):
+    monkeypatch.delenv("IRONCLAW_PROFILE", raising=False)
+    monkeypatch.setenv("IRONCLAW_PROFILE_DIR", str(tmp_path))
+    with profile_turn("s") as profile:
+        pass
+    assert profile is None
+
+    request_profile("s")
+    with profile_turn("s") as profile:
+        _spin(0.05)
+    assert profile.path.startswith(str(tmp_path)) and profile.path.endswith(".folded")
+    assert "_spin" in open(profile.path).read()
+    # Only the next turn
+    with profile_turn("s") as again:
+        pass
+    assert again is None
+
+    monkeypatch.setenv("IRONCLAW_PROFILE", "1")
+    with profile_turn("other") as profile:
+        pass
+    assert profile is not None
+    assert not profiler._requested
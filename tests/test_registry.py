@@ -0,0 +1,116 @@
+import os
+import time
+import pytest
+from unittest.mock import MagicMock
+from src.sandbox.registry import SessionRegistry
+
+
+class FakeSandbox:
+    def __init__(self, session_id):
+        self.session_id = session_id
+        self.busy = False
+
+
+@pytest.fixture
+def evicted():
+    return []
+
+
+def _registry(evicted, **kwargs):
+    kwargs.setdefault("idle_ttl", 0)
+    return SessionRegistry(FakeSandbox, on_evict=evicted.append, **kwargs)
+
+
+def test_get_creates_once_per_session(evicted):
+    registry = _registry(evicted, max_live=4)
+    a = registry.get("alice")
+    assert registry.get("alice") is a
+    assert registry.get("bob") is not a
+    assert len(registry) == 2
+
+
+def test_cap_evicts_least_recently_used(evicted):
+    registry = _registry(evicted, max_live=2)
+    alice = registry.get("alice")
+    registry.get("bob")
+    registry.get("alice")  # bob is now least recently used
+    registry.get("carol")
+    assert [s.session_id for s in evicted] == ["bob"]
+    assert registry.sessions() == ["alice", "carol"]
+    assert registry.peek("alice") is alice
+
+
+def test_busy_sandboxes_are_not_evicted(evicted):
+    registry = _registry(evicted, max_live=1)
+    registry.get("alice").busy = True
+    registry.get("bob")
+    assert evicted == []
+    assert len(registry) == 2
+
+
+def test_idle_ttl_reaps(evicted):
+    registry = _registry(evicted, idle_ttl=0.05)
+    registry.get("alice")
+    registry.get("bob").busy = True
+    time.sleep(0.1)
+    assert registry.reap() == 1
+    assert [s.session_id for s in evicted] == ["alice"]
+    assert registry.sessions() == ["bob"]
+    registry.close()
+
+
+def test_remove_and_peek(evicted):
+    registry = _registry(evicted)
+    assert registry.peek("alice") is None
+    registry.get("alice")
+    assert registry.remove("alice")
+    assert not registry.remove("alice")
+    assert len(evicted) == 1
+
+
+def _sandbox_tool(session_id):
+    # SandboxedTool's own busy property, without a container behind it
+    from src.agent.tools.sandbox import SandboxedTool
+    tool = SandboxedTool.__new__(SandboxedTool)
+    tool.session_id = session_id
+    tool._active = 0
+    tool.pending_blocks = []
+    return tool
+
+
+def test_sessions_awaiting_approval_survive_cap_and_reap(evicted):
+    from src.agent.tools.code_blocks import CodeBlock
+    registry = SessionRegistry(_sandbox_tool, on_evict=evicted.append, max_live=1, idle_ttl=0.05)
+    registry.get("alice").pending_blocks = [CodeBlock(code="echo hi", language="shell")]
+    registry.get("bob")
+    assert evicted == []
+    time.sleep(0.1)
+    assert registry.reap() == 1
+    assert [s.session_id for s in evicted] == ["bob"]
+    assert registry.peek("alice").pending_blocks
+
+    # Once approved or rejected, the session is evictable again
+    registry.peek("alice").pending_blocks = []
+    assert registry.reap() == 1
+    registry.close()
+
+
+def test_evicting_a_session_closes_its_workspace_index(tmp_path):
+    from src.agent.tools import workspace_index
+    from src.agent.tools.workspace import list_workspace_files
+
+    def factory(session_id):
+        tool = _sandbox_tool(session_id)
+        tool.pool = MagicMock()
+        tool.workspace_path = str(tmp_path / session_id)
+        return tool
+
+    registry = SessionRegistry(factory, on_evict=lambda tool: tool.release(), max_live=1, idle_ttl=0)
+    alice = registry.get("alice")
+    list_workspace_files(alice.workspace_path)
+    index = workspace_index._indexes[os.path.abspath(alice.workspace_path)]
+
+    registry.get("bob")
+    assert os.path.abspath(alice.workspace_path) not in workspace_index._indexes
+    assert not index._thread.is_alive()
+    alice.pool.release.assert_called_once_with("alice")
@@ -0,0 +1,115 @@
+import pytest
+from unittest.mock import MagicMock
+from src.sandbox.shell import ShellSession
+
+
+@pytest.fixture
+def shell(local_exec_factory):
+    s = ShellSession(MagicMock(), exec_factory=local_exec_factory)
+    yield s
+    s.shutdown()
+
+
+def test_cwd_and_env_persist(shell, tmp_path):
+    assert shell.execute(f"cd {tmp_path} && export GREETING=hi") == ("", 0)
+    output, exit_code = shell.execute('echo "$PWD $GREETING"')
+    assert exit_code == 0
+    assert output == f"{tmp_path} hi\n"
+
+
+def test_exit_code_and_stderr(shell):
+    output, exit_code = shell.execute("echo out; echo err >&2; false")
+    assert exit_code == 1
+    assert "out\n" in output
+    assert "err\n" in output
+
+
+def test_output_without_trailing_newline(shell):
+    assert shell.execute("printf abc") == ("abc", 0)
+
+
+def test_stdin_is_not_the_control_channel(shell):
+    # `cat` with no args must not swallow the sentinel commands
+    assert shell.execute("cat; echo done") == ("done\n", 0)
+
+
+def test_shell_respawns_after_exit(shell):
+    shell.execute("export KEEP=1")
+    output, exit_code = shell.execute("echo bye; exit 3")
+    assert output == "bye\n"
+    assert exit_code == 3
+    # Fresh shell: previous environment is gone
+    assert shell.execute('echo "[$KEEP]"') == ("[]\n", 0)
+
+
+def test_stream_demultiplexes_and_is_incremental(shell):
+    import time
+    pieces = shell.stream("echo one; echo oops >&2; sleep 0.5; echo two")
+    start = time.monotonic()
+    first = next(pieces)
+    assert time.monotonic() - start < 0.5
+    assert first == ("stdout", "one\n")
+    rest = list(pieces)
+    assert ("stderr", "oops\n") in rest
+    assert rest[-1] == ("stdout", "two\n")
+    assert shell.exit_code == 0
+
+
+def test_stream_decodes_utf8_split_across_frames(shell):
+    # U+00E9 arrives as two separate single-byte writes
+    pieces = list(shell.stream(r"printf '\303'; sleep 0.2; printf '\251\n'"))
+    assert pieces == [("stdout", "é\n")]
+
+
+def test_start_prewarms_shell(shell):
+    assert not shell.running
+    shell.start()
+    assert shell.running
+    assert shell.execute("echo hi") == ("hi\n", 0)
+
+
+def test_state_moves_between_shells(shell, local_exec_factory, tmp_path):
+    shell.execute(f"cd {tmp_path} && export GREETING='hi there'")
+    other = ShellSession(MagicMock(), exec_factory=local_exec_factory)
+    try:
+        other.set_state(shell.get_state())
+        assert other.execute('echo "$PWD $GREETING"') == (f"{tmp_path} hi there\n", 0)
+    finally:
+        other.shutdown()
+
+
+def _signal_locally(shell):
+    # Run the shell's `kill` calls on the host, where its processes live
+    import subprocess
+    shell.container.exec_run.side_effect = lambda cmd: subprocess.run(cmd)
+
+
+def test_interrupt_reaches_grandchildren(shell):
+    import time
+    _signal_locally(shell)
+    shell.start()
+    pid = shell.pid
+    pieces = shell.stream("bash -c 'echo started; sleep 30; echo late'")
+    assert next(pieces) == ("stdout", "started\n")
+    started = time.monotonic()
+    pieces.close()
+    assert time.monotonic() - started < 3
+    assert shell.execute("echo back") == ("back\n", 0)
+    assert shell.pid == pid
+
+
+def test_builtin_loop_that_survives_interrupt_kills_the_shell(shell, monkeypatch):
+    import time
+    from src.sandbox import shell as shell_module
+
+    monkeypatch.setattr(shell_module, "_INTERRUPT_GRACE", 0.5)
+    _signal_locally(shell)
+    shell.start()
+    pid = shell.pid
+    pieces = shell.stream("echo started; while :; do :; done")
+    assert next(pieces) == ("stdout", "started\n")
+    started = time.monotonic()
+    pieces.close()
+    assert time.monotonic() - started < 5
+    assert shell.execute("echo back") == ("back\n", 0)
+    assert shell.pid != pid
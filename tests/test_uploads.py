@@ -0,0 +1,157 @@
+import hashlib
+import os
+import time
+
+import pytest
+
+from src.agent.tools.uploads import BlobStore, store_upload
+
+
+@pytest.fixture
+def store(tmp_path):
+    return BlobStore(str(tmp_path / "blobs"))
+
+
+@pytest.fixture
+def workspace(tmp_path):
+    path = tmp_path / "ws"
+    path.mkdir()
+    return str(path)
+
+
+def test_upload_from_bytes_is_hashed_and_placed_as_private_copy(store, workspace):
+    data = b"a,b\n1,2\n" * 1000
+    result = store_upload(store, workspace, "data.csv", content=data)
+
+    assert result.sha256 == hashlib.sha256(data).hexdigest()
+    assert result.size == len(data)
+    assert not result.deduplicated
+    with open(result.path, "rb") as f:
+        assert f.read() == data
+    assert os.stat(result.path).st_ino != os.stat(store.blob_path(result.sha256)).st_ino
+
+
+def test_duplicate_upload_reuses_one_blob(store, tmp_path, workspace):
+    other = tmp_path / "ws2"
+    other.mkdir()
+    first = store_upload(store, workspace, "a.bin", content=b"same")
+    second = store_upload(store, str(other), "b.bin", content=b"same")
+
+    assert second.deduplicated
+    assert first.sha256 == second.sha256
+    assert os.stat(store.blob_path(first.sha256)).st_nlink == 1
+    assert os.listdir(os.path.join(store.root, "tmp")) == []
+
+
+def test_writing_a_placed_copy_leaves_other_sessions_intact(store, tmp_path, workspace):
+    other = tmp_path / "ws2"
+    other.mkdir()
+    mine = store_upload(store, workspace, "data.csv", content=b"a,b\n")
+    theirs = store_upload(store, str(other), "data.csv", content=b"a,b\n")
+
+    # What sandbox code running as the workspace owner can do
+    os.chmod(mine.path, 0o644)
+    with open(mine.path, "ab") as f:
+        f.write(b"1,2\n")
+
+    with open(theirs.path, "rb") as f:
+        assert f.read() == b"a,b\n"
+    with open(store.blob_path(mine.sha256), "rb") as f:
+        assert hashlib.sha256(f.read()).hexdigest() == mine.sha256
+
+
+def test_upload_from_path_reports_progress(store, tmp_path, workspace, monkeypatch):
+    monkeypatch.setattr("src.agent.tools.uploads._CHUNK", 4)
+    source = tmp_path / "upload.tmp"
+    source.write_bytes(b"0123456789")
+    calls = []
+
+    result = store_upload(store, workspace, "../../escape.txt", source_path=str(source),
+                          progress=lambda done, total: calls.append((done, total)))
+
+    assert result.name == "escape.txt"
+    assert os.path.dirname(result.path) == workspace
+    assert calls == [(4, 10), (8, 10), (10, 10)]
+    # The source stays intact for its owner
+    assert source.read_bytes() == b"0123456789"
+
+
+def test_blobs_are_read_only_and_copies_writable(store, workspace):
+    result = store_upload(store, workspace, "f.txt", content=b"x")
+    assert not os.stat(store.blob_path(result.sha256)).st_mode & 0o222
+    assert os.stat(result.path).st_mode & 0o200
+
+
+def test_reupload_replaces_target(store, workspace):
+    store_upload(store, workspace, "f.txt", content=b"old")
+    result = store_upload(store, workspace, "f.txt", content=b"new")
+    with open(result.path, "rb") as f:
+        assert f.read() == b"new"
+    assert sorted(os.listdir(workspace)) == ["f.txt"]
+
+
+def test_plain_copy_when_reflinks_disabled(store, workspace, monkeypatch):
+    monkeypatch.setenv("IRONCLAW_UPLOAD_LINK", "0")
+    result = store_upload(store, workspace, "f.txt", content=b"x")
+    assert not result.cloned
+    with open(result.path, "rb") as f:
+        assert f.read() == b"x"
+
+
+def test_collect_garbage_removes_unused_blobs(store, workspace):
+    kept = store_upload(store, workspace, "kept.txt", content=b"kept")
+    dropped = store_upload(store, workspace, "dropped.txt", content=b"dropped")
+    old = time.time() - 7200
+    os.utime(store.blob_path(dropped.sha256), (old, old))
+
+    assert store.collect_garbage() == 1
+    assert os.path.exists(store.blob_path(kept.sha256))
+    assert not os.path.exists(store.blob_path(dropped.sha256))
+
+
+def test_linked_upload_source_keeps_its_mode(store, tmp_path, workspace, monkeypatch):
+    # No reflinks, so the upload's temp file is hardlinked into the store
+    monkeypatch.setattr("src.agent.tools.uploads._reflink", lambda source, target: False)
+    source = tmp_path / "upload.tmp"
+    source.write_bytes(b"chainlit's file")
+    os.chmod(source, 0o600)
+
+    result = store_upload(store, workspace, "f.txt", source_path=str(source))
+    assert os.stat(store.blob_path(result.sha256)).st_ino == os.stat(source).st_ino
+    assert os.stat(source).st_mode & 0o777 == 0o600
+
+
+def test_collect_garbage_skips_blobs_being_placed(store, workspace, monkeypatch):
+    import threading
+    from src.agent.tools import uploads
+
+    result = store_upload(store, workspace, "f.txt", content=b"old upload")
+    blob = store.blob_path(result.sha256)
+    old = time.time() - 7200
+    os.utime(blob, (old, old))
+
+    copying, collected = threading.Event(), threading.Event()
+    real_copy = uploads.shutil.copyfile
+
+    def slow_copy(source, target):
+        copying.set()
+        assert collected.wait(5)
+        return real_copy(source, target)
+
+    monkeypatch.setattr(uploads.shutil, "copyfile", slow_copy)
+    placing = threading.Thread(target=store.place, args=(result.sha256, os.path.join(workspace, "g.txt"), False))
+    placing.start()
+    assert copying.wait(5)
+    assert store.collect_garbage() == 0
+    collected.set()
+    placing.join(5)
+
+    with open(os.path.join(workspace, "g.txt"), "rb") as f:
+        assert f.read() == b"old upload"
+    # Placing counts as use
+    assert os.stat(blob).st_mtime > old
+
+
+def test_missing_content_raises(store, workspace):
+    with pytest.raises(ValueError):
+        store_upload(store, workspace, "empty.txt")
@@ -0,0 +1,62 @@
+import threading
+
+from src.sandbox.warmup import FAILED, PENDING, READY, WARMING, Warmup
+
+
+def test_runs_once_while_in_flight():
+    release = threading.Event()
+    calls = []
+
+    def fn():
+        calls.append(1)
+        release.wait(5)
+
+    warmup = Warmup(fn, name="test warm-up")
+    assert warmup.state == PENDING
+    assert not warmup.wait(0)
+    warmup.start()
+    warmup.start()
+    assert warmup.state == WARMING
+    assert warmup.in_flight
+    assert "warming up" in warmup.describe()
+
+    release.set()
+    assert warmup.wait(5)
+    warmup.start()
+    assert calls == [1]
+    assert warmup.state == READY
+    assert warmup.describe().startswith("ready")
+
+
+def test_waiters_share_the_in_flight_run():
+    release = threading.Event()
+    calls = []
+    warmup = Warmup(lambda: (calls.append(1), release.wait(5)), name="test warm-up").start()
+    results = []
+    waiters = [threading.Thread(target=lambda: results.append(warmup.wait(5))) for _ in range(3)]
+    for waiter in waiters:
+        waiter.start()
+    release.set()
+    for waiter in waiters:
+        waiter.join(5)
+    assert results == [True, True, True]
+    assert calls == [1]
+
+
+def test_failure_is_recorded_and_retried_on_start():
+    attempts = []
+
+    def fn():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise RuntimeError("no docker")
+
+    warmup = Warmup(fn, name="test warm-up").start()
+    assert not warmup.wait(5)
+    assert warmup.state == FAILED
+    assert "no docker" in warmup.describe()
+
+    warmup.start()
+    assert warmup.wait(5)
+    assert len(attempts) == 2
+    assert warmup.error is None
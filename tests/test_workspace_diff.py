@@ -0,0 +1,127 @@
+import os
+import pytest
+from src.agent.tools.workspace_diff import WorkspaceDiffer
+from src.agent.tools.workspace_index import OUTPUTS_DIR, WorkspaceIndex
+from src.sandbox.capture import OutputCapture
+
+
+@pytest.fixture
+def differ(tmp_path):
+    index = WorkspaceIndex(str(tmp_path), use_inotify=True)
+    differ = WorkspaceDiffer(index)
+    # Files written during an earlier turn, so their content has been hashed
+    token = differ.baseline()
+    (tmp_path / "data.csv").write_text("a,b\n1,2\n")
+    (tmp_path / "notes.txt").write_text("hello")
+    (tmp_path / "old.log").write_text("log")
+    assert differ.diff(token).added == ["data.csv", "notes.txt", "old.log"]
+    yield differ
+    index.close()
+
+
+def _baseline(differ):
+    return differ.baseline()
+
+
+def test_classifies_added_modified_deleted_and_renamed(differ, tmp_path):
+    token = _baseline(differ)
+    (tmp_path / "report.md").write_text("# new")
+    (tmp_path / "data.csv").write_text("a,b\n1,2\n3,4\n")
+    os.remove(tmp_path / "old.log")
+    os.rename(tmp_path / "notes.txt", tmp_path / "notes-2024.txt")
+
+    changes = differ.diff(token)
+    assert changes.added == ["report.md"]
+    assert changes.modified == ["data.csv"]
+    assert changes.deleted == ["old.log"]
+    assert changes.renamed == [("notes.txt", "notes-2024.txt")]
+    assert changes.changed_files == ["data.csv", "notes-2024.txt", "report.md"]
+
+
+def test_touch_is_not_a_modification(differ, tmp_path):
+    token = _baseline(differ)
+    os.utime(tmp_path / "data.csv", ns=(1, 1))
+    assert not differ.diff(token)
+
+
+def test_rewrite_with_preserved_mtime_is_detected(differ, tmp_path):
+    path = tmp_path / "notes.txt"
+    st = os.stat(path)
+    token = _baseline(differ)
+    path.write_text("HELLO")  # same size
+    os.utime(path, ns=(st.st_atime_ns, st.st_mtime_ns))
+    assert differ.diff(token).modified == ["notes.txt"]
+
+
+def test_copy_then_delete_is_a_rename(differ, tmp_path):
+    token = _baseline(differ)
+    (tmp_path / "archive").mkdir()
+    (tmp_path / "archive" / "data.csv").write_bytes((tmp_path / "data.csv").read_bytes())
+    os.remove(tmp_path / "data.csv")
+    changes = differ.diff(token)
+    assert changes.renamed == [("data.csv", "archive/data.csv")]
+    assert not changes.added and not changes.deleted
+
+
+def test_unchanged_files_are_hashed_once(differ, tmp_path, monkeypatch):
+    import src.agent.tools.workspace_diff as workspace_diff
+    _baseline(differ)
+    calls = []
+    real_hash = workspace_diff.hash_file
+    monkeypatch.setattr(workspace_diff, "hash_file", lambda p: calls.append(p) or real_hash(p))
+
+    token = _baseline(differ)
+    (tmp_path / "notes.txt").write_text("changed")
+    differ.diff(token)
+    assert [os.path.basename(p) for p in calls] == ["notes.txt"]
+
+
+def test_spilled_output_is_not_a_workspace_change(differ, tmp_path):
+    token = _baseline(differ)
+    capture = OutputCapture(
+        head_chars=10, tail_chars=10,
+        spill_path=str(tmp_path / OUTPUTS_DIR / "run-1.log"),
+    )
+    capture.write("x" * 1000)
+    capture.close()
+    (tmp_path / "result.txt").write_text("done")
+
+    assert capture.spilled and (tmp_path / OUTPUTS_DIR / "run-1.log").exists()
+    changes = differ.diff(token)
+    assert changes.added == ["result.txt"]
+    differ.index.rescan()
+    assert OUTPUTS_DIR + "/run-1.log" not in differ.index.files()
+
+
+def test_baseline_reads_no_files(tmp_path, monkeypatch):
+    import src.agent.tools.workspace_diff as workspace_diff
+    (tmp_path / "big.bin").write_bytes(b"x" * 4096)
+    calls = []
+    monkeypatch.setattr(workspace_diff, "hash_file", lambda p: calls.append(p) or "")
+    index = WorkspaceIndex(str(tmp_path), use_inotify=True)
+    try:
+        WorkspaceDiffer(index).baseline()
+    finally:
+        index.close()
+    assert calls == []
+
+
+def test_never_hashed_files_fall_back_to_the_signature(tmp_path):
+    (tmp_path / "preexisting.txt").write_text("hello")
+    (tmp_path / "script.sh").write_text("echo hi")
+    index = WorkspaceIndex(str(tmp_path), use_inotify=True)
+    try:
+        differ = WorkspaceDiffer(index)
+        token = differ.baseline()
+        # No hash from before the change: a touch looks like an edit...
+        os.utime(tmp_path / "preexisting.txt", ns=(1, 1))
+        # ...but a ctime-only change (chmod) does not
+        os.chmod(tmp_path / "script.sh", 0o755)
+        assert differ.diff(token).modified == ["preexisting.txt"]
+
+        # Its content was hashed by that diff, so the next touch is recognised
+        token = differ.baseline()
+        os.utime(tmp_path / "preexisting.txt", ns=(2, 2))
+        assert not differ.diff(token)
+    finally:
+        index.close()
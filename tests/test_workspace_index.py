@@ -0,0 +1,107 @@
+import os
+import pytest
+from src.agent.tools.workspace_index import WorkspaceIndex
+
+
+@pytest.fixture(params=[True, False], ids=["inotify", "polling"])
+def index(request, tmp_path):
+    (tmp_path / "keep.txt").write_text("x")
+    idx = WorkspaceIndex(str(tmp_path), use_inotify=request.param)
+    yield idx
+    idx.close()
+
+
+def test_initial_scan_is_recursive(tmp_path):
+    (tmp_path / "a.txt").write_text("a")
+    (tmp_path / "sub" / "deep").mkdir(parents=True)
+    (tmp_path / "sub" / "deep" / "b.csv").write_text("bb")
+    idx = WorkspaceIndex(str(tmp_path), use_inotify=False)
+    assert idx.files() == ["a.txt", "sub/deep/b.csv"]
+    entry = idx.get("sub/deep/b.csv")
+    st = os.stat(tmp_path / "sub" / "deep" / "b.csv")
+    assert (entry.size, entry.mtime_ns, entry.inode) == (2, st.st_mtime_ns, st.st_ino)
+    idx.close()
+
+
+def test_changes_since_reports_adds_modifications_and_deletes(index, tmp_path):
+    token = index.token()
+    (tmp_path / "new.txt").write_text("n")
+    (tmp_path / "keep.txt").write_text("longer")
+    (tmp_path / "nested").mkdir()
+    (tmp_path / "nested" / "inner.txt").write_text("i")
+
+    token2, changes = index.changes_since(token)
+    assert set(changes) == {"new.txt", "keep.txt", "nested/inner.txt"}
+    assert changes["keep.txt"].size == 6
+
+    os.remove(tmp_path / "new.txt")
+    _, changes = index.changes_since(token2)
+    assert changes == {"new.txt": None}
+    assert index.changes_since(index.token())[1] == {}
+
+
+def test_changes_between_reports_previous_entries(index, tmp_path):
+    before = index.get("keep.txt")
+    token = index.token()
+    (tmp_path / "new.txt").write_text("n")
+    os.remove(tmp_path / "keep.txt")
+    _, changes = index.changes_between(token)
+    assert changes["keep.txt"] == (before, None)
+    assert changes["new.txt"][0] is None
+
+
+def test_directory_moves_and_removal(index, tmp_path):
+    outside = tmp_path.parent / f"{tmp_path.name}-outside"
+    (outside / "d").mkdir(parents=True)
+    (outside / "d" / "f.txt").write_text("f")
+    token = index.token()
+
+    os.rename(outside / "d", tmp_path / "d")
+    assert "d/f.txt" in index.files()
+    (tmp_path / "d" / "g.txt").write_text("g")
+    assert "d/g.txt" in index.files()
+
+    os.rename(tmp_path / "d", outside / "d")
+    assert index.files() == ["keep.txt"]
+    assert index.changes_since(token)[1] == {}
+
+
+def test_replaced_root_is_rewatched(tmp_path):
+    root = tmp_path / "ws"
+    root.mkdir()
+    (root / "a.txt").write_text("a")
+    idx = WorkspaceIndex(str(root), use_inotify=True)
+    token = idx.token()
+
+    # How the sandbox pool binds a slot directory to a session workspace
+    slot = tmp_path / "slot"
+    slot.mkdir()
+    os.rename(root / "a.txt", slot / "a.txt")
+    os.rmdir(root)
+    os.rename(slot, root)
+
+    assert idx.files() == ["a.txt"]
+    (root / "b.txt").write_text("b")
+    assert idx.files() == ["a.txt", "b.txt"]
+    assert idx.watching
+    idx.close()
+
+
+def test_old_tokens_fall_back_to_full_listing(tmp_path):
+    idx = WorkspaceIndex(str(tmp_path), use_inotify=False, max_log=4)
+    for i in range(10):
+        (tmp_path / f"{i}.txt").write_text(str(i))
+        idx.sync()
+    _, changes = idx.changes_since(0)
+    assert len(changes) == 10
+    idx.close()
+
+
+def test_close_stops_the_thread_without_waiting_for_its_poll(tmp_path):
+    import time
+    index = WorkspaceIndex(str(tmp_path), use_inotify=True)
+    index.start()
+    started = time.monotonic()
+    index.close()
+    assert time.monotonic() - started < 0.5
+    assert not index._thread.is_alive()
@@ -9,6 +9,9 @@ if _project_root not in sys.path:
 from src.sandbox.manager import SandboxManager
 from src.sandbox.languages import DockerShell
 
+def _output(chunks):
+    return "".join(c["content"] for c in chunks if c.get("format") == "output")
+
 def verify_sandbox():
     print("Starting Sandbox Isolation Verification...")
     sm = SandboxManager()
@@ -18,12 +21,12 @@ def verify_sandbox():
     try:
         # 1. Run whoami
         print("Check 1: whoami")
-        whoami_res = list(shell.run("whoami"))[0]["content"].strip()
+        whoami_res = _output(shell.run("whoami")).strip()
         print(f"  Container user: {whoami_res}")
         
         # 2. List files in /
         print("Check 2: / directory contents")
-        ls_res = list(shell.run("ls /"))[0]["content"]
+        ls_res = _output(shell.run("ls /"))
         # Standard linux root should have these
         required_dirs = ["bin", "etc", "proc", "sys", "var", "workspace"]
         for d in required_dirs:
@@ -32,7 +35,7 @@ def verify_sandbox():
 
         # 3. Isolation check
         print("Check 3: Isolation from host filesystem")
-        home_res = list(shell.run("ls /home"))[0]["content"].strip()
+        home_res = _output(shell.run("ls /home")).strip()
         print(f"  Container /home: '{home_res}'")
         
         # 4. Workspace volume mount